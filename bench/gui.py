@@ -0,0 +1,99 @@
+import time
+import wx
+from res.hsk import HSKPanel
+from res.lexicon import ALL_BANDS, TRADITIONAL
+from res.vocab_selection_dialog import VocabSelectionDialog
+
+
+def _pump():
+    # let pending layout/paint events run so they count towards the timing
+    wx.GetApp().Yield(True)
+
+
+def run_gui_benchmarks(results, repeat):
+    app = wx.App(False)
+    frame = wx.Frame(None, size=(800, 1000))
+    frame.Show()
+
+    samples = []
+    panel = None
+    for _ in range(repeat):
+        if panel:
+            panel.Destroy()
+        start = time.perf_counter()
+        panel = HSKPanel(frame, 1, 'vocab', 'random')
+        _pump()
+        samples.append(time.perf_counter() - start)
+    results.record('gui_panel_init', samples)
+
+    count = 200
+
+    def questions():
+        for _ in range(count):
+            panel.NewQuestion()
+        _pump()
+    results.time('gui_new_question', questions, repeat, items=count)
+
+    # what the user waits for after the clip: the next card was built during feedback
+    def swaps():
+        for _ in range(count):
+            panel.prepare_next()
+            start = time.perf_counter()
+            panel.NewQuestion()
+            swap_samples.append(time.perf_counter() - start)
+    swap_samples = []
+    for _ in range(repeat):
+        swaps()
+    results.record('gui_swap_prepared', swap_samples)
+
+    # the hanzi prompt on its own: rendering a label the first time, then
+    # swapping to one pre-rendered, which shouldn't care how rare it is
+    display = panel.char_display
+    for name, band in (('band1', 1), ('band7', 7)):
+        texts = [row[TRADITIONAL] for row in panel.engine.lexicon.rows(band, 'vocab')[:count] if row is not None]
+        render_samples = []
+        swap_samples = []
+        for _ in range(repeat):
+            display.cache.bitmaps.clear()
+            for text in texts:
+                start = time.perf_counter()
+                display.prerender(text)
+                render_samples.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                display.SetLabel(text)
+                swap_samples.append(time.perf_counter() - start)
+        results.record(f'gui_glyph_render_{name}', render_samples)
+        results.record(f'gui_glyph_swap_{name}', swap_samples)
+
+    for name, band in (('band1', 1), ('band7', 7), ('all_bands', (1, 7))):
+        panel.update_content(band, 'vocab')
+        results.time(f'gui_switch_{name}', lambda: (panel.update_content(band, 'vocab'), _pump()), repeat)
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        dlg = VocabSelectionDialog(frame, 1, 'vocab')
+        _pump()
+        samples.append(time.perf_counter() - start)
+        dlg.Destroy()
+    results.record('gui_dialog_open', samples)
+
+    dlg = VocabSelectionDialog(frame, 1, 'vocab')
+    dlg.Show()
+
+    def show_all():
+        dlg.band_choice.SetStringSelection(ALL_BANDS)
+        dlg.load_data_for_display()
+        _pump()
+
+    def show_band1():
+        dlg.band_choice.SetSelection(0)
+        dlg.load_data_for_display()
+
+    results.time('gui_dialog_all_bands', show_all, repeat, setup=show_band1)
+    show_all()
+    results.time('gui_dialog_select_all', lambda: (dlg.on_select_all(None), _pump()), repeat)
+    dlg.Destroy()
+
+    frame.Destroy()
+    app.Destroy()
@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from res.websocket import connect, ConnectionClosed
+
+# Simulated classroom: N learners on WebSockets answering as fast as the
+# server lets them (or with --think delay), optionally fetching each clip the
+# way a browser would, with If-None-Match after the first time.
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.answers = 0
+        self.correct = 0
+        self.clips = 0
+        self.clips_not_modified = 0
+        self.errors = 0
+
+
+async def fetch_clip(host, port, path, etags, stats, conn):
+    # One keep-alive HTTP connection per learner, like a browser tab
+    if conn[0] is None:
+        conn[0] = await asyncio.open_connection(host, port)
+    reader, writer = conn[0]
+    request = f"GET /{quote(path)} HTTP/1.1\r\nHost: {host}\r\n"
+    if path in etags:
+        request += f"If-None-Match: {etags[path]}\r\n"
+    writer.write((request + "\r\n").encode('ascii'))
+    await writer.drain()
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+    status = int(head.split(' ', 2)[1])
+    headers = dict(line.split(': ', 1) for line in head.split('\r\n')[1:] if ': ' in line)
+    if status == 200:
+        await reader.readexactly(int(headers.get('Content-Length', 0)))
+        etags[path] = headers.get('ETag')
+        stats.clips += 1
+    elif status == 304:
+        stats.clips_not_modified += 1
+    else:
+        stats.errors += 1
+
+
+async def learner(host, port, args, deadline, stats, rng):
+    ws = await connect(host, port)
+    etags = {}
+    conn = [None]
+    try:
+        band = rng.choice(args.bands)
+        await ws.send(json.dumps({'op': 'start', 'band': band, 'type': args.type, 'distractors': args.distractors}))
+        reply = json.loads(await ws.recv())
+        if 'error' in reply:
+            stats.errors += 1
+            return
+        question = reply['question']
+        remaining = list(question['choices'])
+        while time.monotonic() < deadline:
+            if args.think:
+                await asyncio.sleep(rng.random() * 2 * args.think)
+            choice = remaining.pop(int(rng.random() * len(remaining)))
+            start = time.perf_counter()
+            await ws.send(json.dumps({'op': 'answer', 'choice': choice}))
+            reply = json.loads(await ws.recv())
+            stats.latencies.append(time.perf_counter() - start)
+            stats.answers += 1
+            if 'error' in reply:
+                stats.errors += 1
+                return
+            if reply['correct']:
+                stats.correct += 1
+                if args.audio:
+                    await fetch_clip(host, port, question['audio'], etags, stats, conn)
+                question = reply['question']
+                remaining = list(question['choices'])
+    except (ConnectionClosed, ConnectionError, asyncio.IncompleteReadError):
+        stats.errors += 1
+    finally:
+        await ws.close()
+        if conn[0] is not None:
+            conn[0][1].close()
+
+
+async def server_bands(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /stats HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode('ascii'))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b'\r\n\r\n', 1)[1])['bands']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port):
+    proc = subprocess.Popen([sys.executable, '-m', 'res.server', '--host', '127.0.0.1', '--port', str(port)],
+                            cwd=REPO_ROOT)
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise SystemExit("server exited during startup")
+            time.sleep(0.1)
+    proc.terminate()
+    raise SystemExit("server didn't start listening")
+
+
+async def run(host, port, args):
+    if not args.bands:
+        args.bands = await server_bands(host, port)
+    stats = Stats()
+    rng = random.Random(args.seed)
+    deadline = time.monotonic() + args.ramp + args.duration
+    tasks = []
+    for i in range(args.clients):
+        tasks.append(asyncio.ensure_future(learner(host, port, args, deadline, stats, random.Random(rng.random()))))
+        # spread the connects over the ramp so we measure steady state, not a thundering herd
+        if args.ramp:
+            await asyncio.sleep(args.ramp / args.clients)
+    measured_from = stats.answers
+    start = time.perf_counter()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    return stats, stats.answers - measured_from, elapsed
+
+
+def report(stats, steady_answers, elapsed, clients):
+    lat = sorted(stats.latencies)
+
+    def pct(p):
+        return lat[min(len(lat) - 1, int(p / 100 * len(lat)))] * 1000 if lat else 0.0
+
+    print(f"{clients} learners, {stats.answers} answers ({stats.correct} correct), {stats.errors} errors")
+    print(f"steady state: {steady_answers / elapsed:,.0f} answers/s over {elapsed:.1f}s")
+    if lat:
+        print(f"round trip ms: p50 {pct(50):.2f}  p95 {pct(95):.2f}  p99 {pct(99):.2f}  "
+              f"mean {statistics.fmean(lat) * 1000:.2f}")
+    if stats.clips or stats.clips_not_modified:
+        print(f"clips: {stats.clips} downloaded, {stats.clips_not_modified} not modified (304)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the classroom server with simulated learners")
+    parser.add_argument('--clients', '-c', type=int, default=300)
+    parser.add_argument('--duration', '-d', type=float, default=20.0, help="seconds to measure for")
+    parser.add_argument('--ramp', type=float, default=2.0, help="seconds to spread the connects over")
+    parser.add_argument('--think', type=float, default=0.0, help="mean seconds a learner waits before clicking")
+    parser.add_argument('--bands', type=int, nargs='+', help="bands to spread learners over (default: all)")
+    parser.add_argument('--type', choices=['char', 'vocab'], default='vocab')
+    parser.add_argument('--distractors', choices=['random', 'confusable'], default='random')
+    parser.add_argument('--audio', action='store_true', help="fetch the clip after every right answer")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--host', help="use a running server instead of starting one")
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    proc = None
+    host, port = args.host, args.port
+    if host is None:
+        host, port = '127.0.0.1', free_port()
+        proc = start_server(port)
+    try:
+        stats, steady, elapsed = asyncio.run(run(host, port, args))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+    report(stats, steady, elapsed, args.clients)
+
+
+if __name__ == "__main__":
+    main()
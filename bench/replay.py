@@ -0,0 +1,59 @@
+import argparse
+import glob
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from res.session_log import replay
+
+# Re-run recorded sessions (python main.py --record, or res.cli --record)
+# against the current code: the same seed and the same clicks have to bring
+# up the same questions, and the time each engine call takes is reported.
+# The synthetic ones kept in bench/sessions (see bench.synth_sessions) also
+# run as macro-benchmarks in bench.run.
+
+SESSIONS_DIR = os.path.join(REPO_ROOT, 'bench', 'sessions')
+
+
+def session_paths(paths):
+    if not paths:
+        return sorted(glob.glob(os.path.join(SESSIONS_DIR, '*.jsonl')))
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(sorted(glob.glob(os.path.join(path, '*.jsonl'))))
+        else:
+            found.append(path)
+    return [os.path.abspath(path) for path in found]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded sessions and check they still play the same")
+    parser.add_argument('sessions', nargs='*', help="recordings or directories of them (default bench/sessions)")
+    parser.add_argument('--repeat', type=int, default=1, help="replay each this many times, report the fastest")
+    args = parser.parse_args(argv)
+
+    paths = session_paths(args.sessions)
+    if not paths:
+        raise SystemExit("no session recordings found")
+    # recordings refer to the lexicon by entry id, so run against the repo's data
+    os.chdir(REPO_ROOT)
+    failed = 0
+    for path in paths:
+        try:
+            runs = [replay(path) for _ in range(max(1, args.repeat))]
+        except ValueError as e:
+            print(e)
+            failed += 1
+            continue
+        result = min(runs, key=lambda r: r.elapsed)
+        print(result.summary())
+        failed += not result.ok
+    if failed:
+        raise SystemExit(f"{failed} of {len(paths)} sessions didn't replay the same")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The benchmarks chdir into the synthetic tree, keep importing code from here
+sys.path.insert(0, REPO_ROOT)
+
+from bench.synth import generate
+
+
+class Results:
+    def __init__(self):
+        self.stages = {}
+
+    def time(self, name, fn, repeat=5, items=1, setup=None):
+        samples = []
+        for _ in range(repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) / items)
+        self.record(name, samples, items)
+        return samples
+
+    def record(self, name, samples, items=1):
+        self.stages[name] = {
+            'runs': len(samples),
+            'items': items,
+            'min': min(samples),
+            'median': statistics.median(samples),
+            'mean': statistics.fmean(samples),
+            'unit': 's' if items == 1 else 's/item',
+        }
+        print(f"  {name:<32} median {self.stages[name]['median'] * 1e3:10.4f} ms", flush=True)
+
+    def skip(self, name, reason):
+        self.stages[name] = {'skipped': reason}
+        print(f"  {name:<32} skipped ({reason})", flush=True)
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except Exception:
+        return None
+
+
+def bench_data(results, repeat):
+    from res import resources
+    from res.lexicon import Lexicon, CACHE_PATH, PINYIN
+    from res.pinyin import to_numeric
+    from res.quiz_engine import QuizEngine
+    from res.scheduler import Scheduler
+    from res.search_index import SearchIndex
+
+    def drop_cache():
+        if os.path.exists(resources.user_path(CACHE_PATH)):
+            os.remove(resources.user_path(CACHE_PATH))
+
+    results.time('lexicon_parse_cold', Lexicon, repeat, setup=drop_cache)
+    results.time('lexicon_load_cached', Lexicon, repeat)
+
+    lexicon = Lexicon()
+    all_bands = (min(lexicon.bands()), max(lexicon.bands()))
+    results.time('pool_all_vocab', lambda: lexicon.ids(all_bands, 'vocab'), repeat, setup=lexicon.pools.clear)
+    results.time('rows_all_vocab', lambda: lexicon.rows(all_bands, 'vocab'), repeat)
+
+    all_vocab = []
+    for band in lexicon.bands():
+        all_vocab.extend(lexicon.rows(band, 'vocab'))
+
+    engine = QuizEngine(lexicon=lexicon, scheduler=Scheduler(path=None))
+    results.time('set_data_all_vocab', lambda: engine.set_data(all_vocab), repeat)
+    engine.set_data(all_vocab)
+
+    def switch_readings():
+        engine.set_config({'readings': 'zhuyin'})
+        engine.refresh_question()
+        engine.set_config({'readings': 'pinyin'})
+        engine.refresh_question()
+    results.time('switch_readings', switch_readings, repeat)
+
+    count = 20000
+    for distractors in ('random', 'confusable'):
+        engine.set_config({'distractors': distractors})
+        engine.next_question()   # confusable neighbours are built on first use
+        results.time(f'next_question_{distractors}', lambda: [engine.next_question() for _ in range(count)],
+                     repeat, items=count)
+
+    engine.set_config({'distractors': 'random'})
+    for direction in ('hanzi_meaning', 'meaning_hanzi', 'listening'):
+        engine.set_direction(direction)
+        results.time(f'candidate_index_{direction}', lambda: engine.set_data(all_vocab) or engine.candidates,
+                     max(1, repeat // 2))
+        engine.next_question()
+        results.time(f'next_question_{direction}', lambda: [engine.next_question() for _ in range(count)],
+                     repeat, items=count)
+    engine.set_direction('hanzi_reading')
+
+    # typed answers: every prefix of the numeric-tone reading, as it would be typed
+    engine.set_config({'answer_mode': 'typed'})
+    cards = [engine.next_question() for _ in range(2000)]
+    typing = [(card, to_numeric(card.row[PINYIN]).replace(' ', '')) for card in cards]
+    keystrokes = sum(len(text) for _, text in typing)
+
+    def type_answers():
+        for card, text in typing:
+            engine.question = card
+            for i in range(1, len(text) + 1):
+                engine.typed_progress(text[:i])
+            engine.answer_typed(text)
+    results.time('typed_keystroke', type_answers, repeat, items=keystrokes)
+    engine.set_config({'answer_mode': 'choices'})
+
+    ids = [i for band in lexicon.bands() for i in lexicon.ids(band, 'vocab')]
+    results.time('search_index_build', lambda: SearchIndex(lexicon, ids), max(1, repeat // 2))
+    index = SearchIndex(lexicon, ids)
+    queries = ['a', 'ai', 'hao', 'shuo4', 'ㄓㄨㄥ', 'water', 'to go', all_vocab[len(all_vocab) // 2][0]]
+    results.time('search_query', lambda: [index.search(q) for q in queries], repeat, items=len(queries))
+
+    # live reload of a one-row edit into an engine drilling everything, on a
+    # copy of the data so the tree itself isn't touched
+    import shutil
+    from res.lexicon import BAND_FILE_RE, MEANING
+    live_dir = tempfile.mkdtemp(prefix='hsk-live-')
+    data_dir = resources.path(lexicon.data_dir)
+    for name in os.listdir(data_dir):
+        if BAND_FILE_RE.match(name):
+            shutil.copy(os.path.join(data_dir, name), live_dir)
+    live = Lexicon(data_dir=live_dir, cache_path=os.path.join(live_dir, 'lexicon.cache'))
+    engine = QuizEngine(all_bands, 'vocab', lexicon=live, scheduler=Scheduler(path=None))
+    engine.load_data()
+    engine.next_question()
+    edited = max(live.files, key=lambda name: live.files[name]['size'])
+    path = os.path.join(live_dir, edited)
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().splitlines(True)
+    edits = iter(range(1 << 30))
+
+    def edit_row():
+        row = lines[len(lines) // 2].rstrip('\n').split(',')
+        row[MEANING] = f'"edit {next(edits)}"'
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(lines[:len(lines) // 2] + [','.join(row) + '\n'] + lines[len(lines) // 2 + 1:])
+
+    edit_row()
+    engine.apply_change(live.refresh())   # first change also indexes pair positions
+    results.time('live_reload_one_row', lambda: engine.apply_change(live.refresh()), repeat, setup=edit_row)
+    shutil.rmtree(live_dir, ignore_errors=True)
+
+
+def bench_audio(results, repeat):
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    try:
+        import pygame.mixer
+    except ImportError:
+        results.skip('sound_decode', 'pygame not installed')
+        return
+    from res.lexicon import Lexicon
+    from res.sound_cache import SoundCache
+
+    pygame.mixer.init()
+    lexicon = Lexicon()
+    clips = sorted({row[5] for band in lexicon.bands() for row in lexicon.rows(band, 'vocab')})[:200]
+    cache = SoundCache()
+    results.time('sound_decode', lambda: [cache._decode(c) for c in clips], repeat,
+                 items=len(clips), setup=cache.clear)
+    results.time('sound_cached_get', lambda: [cache.get(c) for c in clips], repeat, items=len(clips))
+    pygame.mixer.quit()
+
+    # what a click costs the UI thread now that playing is queued to the audio thread
+    from res.audio_service import AudioService
+    ready = threading.Event()
+    service = AudioService(backend='null', on_ready=lambda s: ready.set())
+    ready.wait()
+    results.time('audio_play_enqueue', lambda: [service.play(c) for c in clips], repeat, items=len(clips))
+    service.close()
+
+
+def bench_replay(results, repeat):
+    # The scripted sessions as macro-benchmarks. They point into the repo's own
+    # lexicon by entry id, so these run there rather than on the synthetic tree.
+    from bench.replay import session_paths
+    from res import resources
+    from res.lexicon import Lexicon
+    from res.session_log import replay
+
+    cwd = os.getcwd()
+    os.chdir(REPO_ROOT)
+    resources.set_root(REPO_ROOT)
+    try:
+        lexicon = Lexicon()
+        for path in session_paths([]):
+            name = 'replay_' + os.path.splitext(os.path.basename(path))[0]
+            try:
+                runs = [replay(path, lexicon) for _ in range(repeat)]
+            except ValueError as e:
+                results.skip(name, str(e))
+                continue
+            if not all(run.ok for run in runs):
+                results.skip(name, f"replays differently, {len(runs[0].mismatches)} mismatches")
+                continue
+            results.record(name, [run.elapsed for run in runs])
+    finally:
+        os.chdir(cwd)
+        resources.set_root(cwd)
+
+
+START_SCRIPT = '''
+import time
+start = time.perf_counter()
+from res.lexicon import get_lexicon
+from res.config import get_config
+get_lexicon()
+get_config()
+print(time.perf_counter() - start)
+'''
+
+
+def bench_bundle(results, repeat):
+    # Start-up in a fresh interpreter, imports through to a loaded lexicon
+    # and config, from the loose tree and from a zipapp of it. First starts
+    # have nothing in the user dir yet, later ones have their lexicon cache.
+    import shutil
+    from res import bundle, resources
+    work = tempfile.mkdtemp(prefix='hsk-bundle-')
+    target = os.path.join(work, 'hsk.pyz')
+    results.time('bundle_build', lambda: bundle.build(target), max(1, repeat // 5))
+    for name, code, root in (('loose', REPO_ROOT, resources.root()), ('bundle', target, target)):
+        def start(user_dir):
+            env = dict(os.environ, PYTHONPATH=code, HSK_ROOT=root, HSK_USER_DIR=user_dir)
+            out = subprocess.run([sys.executable, '-c', START_SCRIPT], env=env, cwd=work,
+                                 capture_output=True, text=True, check=True)
+            return float(out.stdout.split()[-1])
+        results.record(f'first_start_{name}', [start(tempfile.mkdtemp(dir=work)) for _ in range(repeat)])
+        user_dir = os.path.join(work, name)
+        start(user_dir)
+        results.record(f'start_{name}', [start(user_dir) for _ in range(repeat)])
+    shutil.rmtree(work, ignore_errors=True)
+
+
+def start_virtual_display():
+    # GUI stages need an X server; spin up Xvfb on a headless box
+    if os.environ.get('DISPLAY') or sys.platform != 'linux':
+        return None
+    display = ':97'
+    try:
+        proc = subprocess.Popen(['Xvfb', display, '-screen', '0', '1280x1024x24', '-nolisten', 'tcp'],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except FileNotFoundError:
+        return None
+    time.sleep(0.5)
+    os.environ['DISPLAY'] = display
+    return proc
+
+
+def bench_gui(results, repeat):
+    try:
+        import wx
+    except ImportError:
+        results.skip('gui', 'wxPython not installed')
+        return
+
+    xvfb = start_virtual_display()
+    if not os.environ.get('DISPLAY') and sys.platform == 'linux':
+        results.skip('gui', 'no display and Xvfb not found')
+        return
+    try:
+        from bench.gui import run_gui_benchmarks
+        run_gui_benchmarks(results, repeat)
+    finally:
+        if xvfb:
+            xvfb.terminate()
+
+
+def compare(old_path, new_path):
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"{'stage':<32} {old.get('commit') or 'old':>12} {new.get('commit') or 'new':>12}  ratio")
+    for name, stage in new['stages'].items():
+        before = old['stages'].get(name, {})
+        if 'median' not in stage or 'median' not in before:
+            continue
+        ratio = stage['median'] / before['median'] if before['median'] else float('inf')
+        print(f"{name:<32} {before['median'] * 1e3:10.4f}ms {stage['median'] * 1e3:10.4f}ms  {ratio:5.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the hot paths against full-size synthetic data")
+    parser.add_argument('--scale', type=float, default=1.0, help="fraction of the real HSK 3.0 sizes")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--data', help="reuse a synthetic tree instead of generating a fresh one")
+    parser.add_argument('--only', choices=['data', 'audio', 'bundle', 'gui', 'replay'], action='append')
+    parser.add_argument('--output', '-o', default=os.path.join(REPO_ROOT, 'bench_results.json'))
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two result files and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    root = args.data or tempfile.mkdtemp(prefix='hsk-bench-')
+    if not args.data:
+        sample = os.path.join(REPO_ROOT, 'audio', 'ㄞˋ.wav')
+        info = generate(root, args.scale, audio_sample=sample if os.path.exists(sample) else None)
+        print(f"Synthetic data: {info['words']} entries, {info['clips']} clips in {root}")
+
+    from res import resources
+    results = Results()
+    cwd = os.getcwd()
+    os.chdir(root)
+    resources.set_root(root)
+    try:
+        stages = args.only or ['data', 'audio', 'bundle', 'gui', 'replay']
+        if 'data' in stages:
+            bench_data(results, args.repeat)
+        if 'audio' in stages:
+            bench_audio(results, args.repeat)
+        if 'bundle' in stages:
+            bench_bundle(results, args.repeat)
+        if 'gui' in stages:
+            bench_gui(results, args.repeat)
+        if 'replay' in stages:
+            bench_replay(results, args.repeat)
+    finally:
+        os.chdir(cwd)
+        resources.set_root(REPO_ROOT)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': git_commit(),
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': args.scale,
+            'stages': results.stages,
+        }, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import csv
+import os
+import random
+import shutil
+import wave
+
+# Official HSK 3.0 list sizes per band. Band 7 stands in for the 7-9 block.
+CHAR_SIZES = {1: 300, 2: 300, 3: 300, 4: 300, 5: 300, 6: 300, 7: 1200}
+VOCAB_SIZES = {1: 500, 2: 772, 3: 973, 4: 1000, 5: 1071, 6: 1140, 7: 5636}
+
+FALLBACK_SYLLABLES = [
+    ('ài', 'ㄞˋ'), ('bā', 'ㄅㄚ'), ('bái', 'ㄅㄞˊ'), ('běn', 'ㄅㄣˇ'), ('chá', 'ㄔㄚˊ'),
+    ('dà', 'ㄉㄚˋ'), ('de', 'ㄉㄜ˙'), ('fēi', 'ㄈㄟ'), ('gāo', 'ㄍㄠ'), ('hǎo', 'ㄏㄠˇ'),
+    ('jiā', 'ㄐㄧㄚ'), ('kàn', 'ㄎㄢˋ'), ('lái', 'ㄌㄞˊ'), ('mǎi', 'ㄇㄞˇ'), ('nǐ', 'ㄋㄧˇ'),
+    ('qù', 'ㄑㄩˋ'), ('rén', 'ㄖㄣˊ'), ('shuō', 'ㄕㄨㄛ'), ('tā', 'ㄊㄚ'), ('wǒ', 'ㄨㄛˇ'),
+    ('xué', 'ㄒㄩㄝˊ'), ('yī', 'ㄧ'), ('zài', 'ㄗㄞˋ'), ('zhōng', 'ㄓㄨㄥ'),
+]
+GLOSS_WORDS = ('to', 'go', 'big', 'small', 'water', 'person', 'study', 'book', 'eat', 'see',
+               'time', 'day', 'good', 'home', 'money', 'friend', 'school', 'work', 'car', 'tea',
+               'read', 'write', 'speak', 'hear', 'buy', 'sell', 'open', 'close', 'old', 'new')
+
+
+def real_syllables(res_dir='res'):
+    # Single syllable rows from the shipped band 1 list, so tone and
+    # initial/final statistics look like the real thing
+    pairs = set()
+    path = os.path.join(res_dir, 'band1_char.csv')
+    try:
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if len(row) >= 6 and ' ' not in row[2]:
+                    pairs.add((row[2], row[3]))
+    except FileNotFoundError:
+        pass
+    return sorted(pairs) or FALLBACK_SYLLABLES
+
+
+def write_silent_wav(path, seconds=0.6, rate=24000):
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(bytes(int(seconds * rate) * 2))
+
+
+def make_rows(rng, count, syllable_pool, min_sylls, max_sylls, used_hanzi):
+    rows = []
+    while len(rows) < count:
+        n = rng.randint(min_sylls, max_sylls)
+        hanzi = ''.join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(n))
+        if hanzi in used_hanzi:
+            continue
+        used_hanzi.add(hanzi)
+        sylls = [rng.choice(syllable_pool) for _ in range(n)]
+        pinyin = ' '.join(p for p, _ in sylls)
+        zhuyin = ''.join(z for _, z in sylls)
+        meaning = ' '.join(rng.sample(GLOSS_WORDS, rng.randint(1, 4)))
+        # traditional is just a shifted code point, good enough for sizes
+        traditional = ''.join(chr(min(ord(c) + 1, 0x9FA5)) for c in hanzi)
+        rows.append((hanzi, traditional, pinyin, zhuyin, meaning, f'audio/{zhuyin}.wav'))
+    return rows
+
+
+def generate(root, scale=1.0, seed=1234, audio_sample=None, bands=None):
+    rng = random.Random(seed)
+    res_dir = os.path.join(root, 'res')
+    audio_dir = os.path.join(root, 'audio')
+    os.makedirs(res_dir, exist_ok=True)
+    os.makedirs(audio_dir, exist_ok=True)
+
+    pool = real_syllables()
+    used = set()
+    clips = set()
+    bands = bands or sorted(CHAR_SIZES)
+    for band in bands:
+        for content_type, sizes, lo, hi in (('char', CHAR_SIZES, 1, 1), ('vocab', VOCAB_SIZES, 1, 4)):
+            rows = make_rows(rng, max(1, int(sizes[band] * scale)), pool, lo, hi, used)
+            with open(os.path.join(res_dir, f'band{band}_{content_type}.csv'), 'w', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerows(rows)
+            clips.update(row[5] for row in rows)
+
+    # Audio stubs - a copy of a real clip when we have one so decode timings mean something
+    for clip in clips:
+        dest = os.path.join(root, clip)
+        if os.path.exists(dest):
+            continue
+        if audio_sample:
+            try:
+                os.link(audio_sample, dest)
+            except OSError:
+                shutil.copyfile(audio_sample, dest)
+        else:
+            write_silent_wav(dest)
+
+    wrong = os.path.join(res_dir, 'wrong.wav')
+    if os.path.exists(os.path.join('res', 'wrong.wav')):
+        shutil.copyfile(os.path.join('res', 'wrong.wav'), wrong)
+    else:
+        write_silent_wav(wrong)
+    return {'bands': bands, 'scale': scale, 'clips': len(clips), 'words': len(used)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic HSK 3.0 sized data")
+    parser.add_argument('root', help="directory to write res/ and audio/ into")
+    parser.add_argument('--scale', type=float, default=1.0, help="fraction of the real list sizes")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--audio-sample', help="clip to copy for every audio stub (default: silent wav)")
+    args = parser.parse_args(argv)
+    info = generate(args.root, args.scale, args.seed, args.audio_sample)
+    print(f"Wrote {info['words']} entries and {info['clips']} clips to {args.root}")
+
+
+if __name__ == "__main__":
+    main()
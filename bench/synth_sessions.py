@@ -0,0 +1,110 @@
+import argparse
+import os
+import random
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from res.lexicon import PINYIN
+from res.pinyin import strip_tones, to_numeric
+from res.quiz_engine import QuizEngine
+from res.scheduler import Scheduler
+from res.session_log import SessionRecorder
+from bench.replay import SESSIONS_DIR
+
+# The sessions kept in bench/sessions aren't anyone studying: they're
+# scripted here against the real engine and recorder, hence synthetic_*.
+# The clock is made up too, a few seconds to think before each click so SRS
+# grading sees plausible answer times. Run this again when an engine change
+# rightly changes which cards come up, then check bench.replay passes.
+
+
+def _session(name, seed, band, content_type, order, config):
+    recorder = SessionRecorder(os.path.join(SESSIONS_DIR, f'synthetic_{name}.jsonl'))
+    engine = QuizEngine(band, content_type, order, config, scheduler=Scheduler(path=None), seed=seed,
+                        recorder=recorder)
+    now = [engine.clock(), engine.wall_clock()]
+    engine.clock = lambda: now[0]
+    engine.wall_clock = lambda: now[1]
+    rng = random.Random(seed)
+
+    def wait(low, high):
+        seconds = rng.uniform(low, high)
+        now[0] += seconds
+        now[1] += seconds
+    return engine, recorder, rng, wait
+
+
+def _click_until_right(engine, question, rng, wait):
+    # a guess at a time, the same wrong one again now and then
+    while True:
+        wait(1.5, 9)
+        if engine.answer(rng.choice(question.choices)):
+            return
+
+
+def vocab_srs():
+    engine, recorder, rng, wait = _session('band1_vocab_srs', 11, 1, 'vocab', 'srs', {})
+    engine.load_data()
+    for _ in range(230):
+        _click_until_right(engine, engine.next_question(), rng, wait)
+    recorder.close()
+    return recorder
+
+
+def char_mixed():
+    # typed pinyin (every way of writing it, and misses), typed zhuyin, then
+    # picking the hanzi for a meaning
+    engine, recorder, rng, wait = _session('band1_char_mixed', 12, 1, 'char', 'random', {'answer_mode': 'typed'})
+    engine.load_data()
+    question = engine.next_question()
+    for i in range(300):
+        if i == 100:
+            engine.set_config({'answer_mode': 'typed', 'readings': 'zhuyin'})
+            question = engine.refresh_question()
+        elif i == 200:
+            engine.set_config({'answer_mode': 'choices'})
+            engine.set_direction('meaning_hanzi')
+            question = engine.refresh_question()
+        if engine.typed:
+            pinyin = question.row[PINYIN]
+            forms = [question.answer] if i >= 100 else [pinyin, to_numeric(pinyin), strip_tones(pinyin)]
+            while True:
+                wait(2, 12)
+                if rng.random() < 0.25:
+                    engine.answer_typed('zzz')
+                    continue
+                engine.answer_typed(rng.choice(forms))
+                break
+        else:
+            _click_until_right(engine, question, rng, wait)
+        # built while the feedback plays, then swapped in
+        wait(0.2, 0.5)
+        engine.prepare_next()
+        wait(0.5, 1)
+        question = engine.next_question()
+    recorder.close()
+    return recorder
+
+
+SESSIONS = {'band1_vocab_srs': vocab_srs, 'band1_char_mixed': char_mixed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Script the synthetic sessions in bench/sessions")
+    parser.add_argument('names', nargs='*', help=f"any of {', '.join(sorted(SESSIONS))} (default all)")
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(SESSIONS)
+    if unknown:
+        parser.error(f"no session called {', '.join(sorted(unknown))}")
+
+    # they refer to the lexicon by entry id, so script them against the repo's data
+    os.chdir(REPO_ROOT)
+    for name in args.names or sorted(SESSIONS):
+        recorder = SESSIONS[name]()
+        print(f"{recorder.path}: {recorder.events} events")
+
+
+if __name__ == "__main__":
+    main()
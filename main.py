@@ -1,22 +1,61 @@
+import time
+_start = time.perf_counter()
+
+import io
+import os
+import sys
 import wx
-from res.hsk import HSKPanel
-from res.config_dialog import ConfigDialog
-from res.vocab_selection_dialog import VocabSelectionDialog
+from res import startup, metrics, resources
+startup.begin(_start, '--startup-profile' in sys.argv, wait_for=('first question', 'audio ready'))
+# --metrics turns on the timers, --metrics=out.json (or .prom) also dumps them on exit
+# --record[=path] saves the session for bench.replay, --seed=N repeats one
+record_path = None
+seed = None
+for arg in sys.argv[1:]:
+    if arg == '--metrics' or arg.startswith('--metrics='):
+        metrics.enable(arg.partition('=')[2] or None)
+    elif arg == '--record' or arg.startswith('--record='):
+        record_path = arg.partition('=')[2]
+    elif arg.startswith('--seed='):
+        seed = int(arg.partition('=')[2])
+startup.mark('import wx')
+from res.hsk import HSKPanel, ORDER_MODES
+from res.directions import DIRECTIONS, DIRECTION_LABELS
+from res.search_index import warm_search_indexes, apply_change as reindex_search
+from res.history import History
+from res.lexicon import band_choices, get_lexicon, BAND_FILE_RE, DATA_DIR
+from res.file_watcher import FileWatcher
+startup.mark('import app')
+
+AUDIO_DIR = 'audio'
 
 class MainFrame(wx.Frame):
     def __init__(self):
         super().__init__(None, title="HSK 3.0 Practice", size=(800, 1000))
-        self.SetIcon(wx.Icon('res/icon.xpm'))
+        # through the resource layer, it may be inside the bundle
+        image = wx.Image(io.BytesIO(resources.read_bytes('res/icon.xpm')), wx.BITMAP_TYPE_XPM)
+        icon = wx.Icon()
+        icon.CopyFromBitmap(image.ConvertToBitmap())
+        self.SetIcon(icon)
         self.current_band = 1
         self.content_type = 'char'
-        self.random_mode = True
+        self.order_mode = 'random'
+        self.direction = DIRECTIONS[0]
         self.custom_study_mode = False
+        self.history = History()
+        self.recorder = None
+        if record_path is not None:
+            from res.session_log import SessionRecorder
+            self.recorder = SessionRecorder(record_path or None)
 
         self.control_panel = wx.Panel(self)
         control_sizer = wx.BoxSizer(wx.HORIZONTAL)
 
         # Band and Content type selection stuff
-        self.band_choice = wx.Choice(self.control_panel, choices=[str(i) for i in range(1, 7)])
+        # 1-6, 7-9, then cumulative pools and all bands
+        choices = band_choices()
+        self.band_values = [band for _, band in choices]
+        self.band_choice = wx.Choice(self.control_panel, choices=[label for label, _ in choices])
         self.band_choice.SetSelection(0)
         self.band_choice.Bind(wx.EVT_CHOICE, self.on_band_change)
 
@@ -24,10 +63,15 @@ class MainFrame(wx.Frame):
         self.type_choice.SetSelection(0)
         self.type_choice.Bind(wx.EVT_CHOICE, self.on_type_change)
 
-        # Random mode toggle
-        self.random_toggle = wx.CheckBox(self.control_panel, label="Random")
-        self.random_toggle.SetValue(True)
-        self.random_toggle.Bind(wx.EVT_CHECKBOX, self.on_random_toggle)
+        # Card order - random, in file order or spaced repetition
+        self.order_choice = wx.Choice(self.control_panel, choices=['Random', 'Sequential', 'Spaced Repetition'])
+        self.order_choice.SetSelection(0)
+        self.order_choice.Bind(wx.EVT_CHOICE, self.on_order_change)
+
+        # Which way round the cards are asked, can change any time
+        self.direction_choice = wx.Choice(self.control_panel, choices=list(DIRECTION_LABELS))
+        self.direction_choice.SetSelection(0)
+        self.direction_choice.Bind(wx.EVT_CHOICE, self.on_direction_change)
 
         # Custom Study mode button thingy
         self.custom_study_btn = wx.Button(self.control_panel, label="Custom Study")
@@ -38,20 +82,37 @@ class MainFrame(wx.Frame):
         self.reset_custom_study_btn.Bind(wx.EVT_BUTTON, self.on_reset_custom_study)
         self.reset_custom_study_btn.Enable(False)
 
+        # Saved sets start a custom session without going through the grid
+        self.study_sets_btn = wx.Button(self.control_panel, label="Study Sets")
+        self.study_sets_btn.Bind(wx.EVT_BUTTON, self.on_study_sets)
+
+        self.stats_btn = wx.Button(self.control_panel, label="Statistics")
         self.options_btn = wx.Button(self.control_panel, label="Options")
+        self.debug_btn = wx.Button(self.control_panel, label="Debug")
+        self.debug_frame = None
+        self.vocab_dialog = None
+        self.watcher = None
 
         control_sizer.Add(wx.StaticText(self.control_panel, label="Band:"), 0, wx.ALIGN_CENTER_VERTICAL|wx.RIGHT, 5)
         control_sizer.Add(self.band_choice, 0, wx.RIGHT, 10)
         control_sizer.Add(wx.StaticText(self.control_panel, label="Content:"), 0, wx.ALIGN_CENTER_VERTICAL|wx.RIGHT, 5)
         control_sizer.Add(self.type_choice, 0, wx.RIGHT, 10)
-        control_sizer.Add(self.random_toggle, 0, wx.ALIGN_CENTER_VERTICAL|wx.RIGHT, 10)
+        control_sizer.Add(wx.StaticText(self.control_panel, label="Order:"), 0, wx.ALIGN_CENTER_VERTICAL|wx.RIGHT, 5)
+        control_sizer.Add(self.order_choice, 0, wx.RIGHT, 10)
+        control_sizer.Add(wx.StaticText(self.control_panel, label="Mode:"), 0, wx.ALIGN_CENTER_VERTICAL|wx.RIGHT, 5)
+        control_sizer.Add(self.direction_choice, 0, wx.RIGHT, 10)
         control_sizer.AddStretchSpacer(1)
         control_sizer.Add(self.custom_study_btn, 0, wx.ALL, 5)
+        control_sizer.Add(self.study_sets_btn, 0, wx.ALL, 5)
         control_sizer.Add(self.reset_custom_study_btn, 0, wx.ALL, 5)
+        control_sizer.Add(self.stats_btn, 0, wx.ALL, 5)
         control_sizer.Add(self.options_btn, 0, wx.ALL, 5)
+        control_sizer.Add(self.debug_btn, 0, wx.ALL, 5)
 
         main_panel = wx.Panel(self)
-        self.hsk_panel = HSKPanel(main_panel, self.current_band, self.content_type, self.random_mode)
+        self.hsk_panel = HSKPanel(main_panel, self.current_band, self.content_type, self.order_mode,
+                                  history=self.history, direction=self.direction, seed=seed,
+                                  recorder=self.recorder)
 
         main_sizer = wx.BoxSizer(wx.VERTICAL)
         main_sizer.Add(self.control_panel, 0, wx.EXPAND|wx.ALL, 5)
@@ -66,9 +127,40 @@ class MainFrame(wx.Frame):
         self.control_panel.SetSizer(control_sizer)
         self.SetSizer(main_sizer)
 
+        self.stats_btn.Bind(wx.EVT_BUTTON, self.on_stats)
         self.options_btn.Bind(wx.EVT_BUTTON, self.on_options)
+        self.debug_btn.Bind(wx.EVT_BUTTON, self.on_debug)
+        self.Bind(wx.EVT_CLOSE, self.on_close)
         self.Center()
         self.Show()
+        wx.CallAfter(self.on_first_question)
+
+    def on_first_question(self):
+        # runs once the first card has been painted
+        startup.mark('first question')
+        warm_search_indexes()
+        # edits to the csvs or clips show up without a restart, nothing to
+        # watch when they're inside a bundle
+        if not resources.bundled():
+            self.watcher = FileWatcher([resources.path(DATA_DIR), resources.path(AUDIO_DIR)],
+                                       lambda paths: wx.CallAfter(self.on_files_changed, paths))
+
+    def on_files_changed(self, paths):
+        audio_dir = resources.path(AUDIO_DIR)
+        clips = [AUDIO_DIR + '/' + os.path.basename(path) for path in paths
+                 if os.path.dirname(path) == audio_dir]
+        if clips:
+            self.hsk_panel.audio.forget(clips)
+        if not any(BAND_FILE_RE.match(os.path.basename(path)) for path in paths):
+            return
+        change = get_lexicon().refresh()
+        if not change:
+            return
+        metrics.count('reloaded_rows', len(change))
+        reindex_search(change)
+        self.hsk_panel.apply_change(change)
+        if self.vocab_dialog:
+            self.vocab_dialog.apply_change(change)
 
     def update_control_states(self):
         enable_choices = not self.custom_study_mode
@@ -81,7 +173,7 @@ class MainFrame(wx.Frame):
             self.custom_study_mode = False
             self.hsk_panel.clear_custom_vocab()
         self.update_control_states()
-        self.current_band = int(self.band_choice.GetStringSelection())
+        self.current_band = self.band_values[self.band_choice.GetSelection()]
         self.hsk_panel.update_content(self.current_band, self.content_type)
 
     def on_type_change(self, event):
@@ -92,22 +184,41 @@ class MainFrame(wx.Frame):
         self.content_type = 'char' if self.type_choice.GetSelection() == 0 else 'vocab'
         self.hsk_panel.update_content(self.current_band, self.content_type)
 
-    def on_random_toggle(self, event):
-        self.random_mode = self.random_toggle.GetValue()
-        self.hsk_panel.set_random_mode(self.random_mode)
+    def on_order_change(self, event):
+        self.order_mode = ORDER_MODES[self.order_choice.GetSelection()]
+        self.hsk_panel.set_order_mode(self.order_mode)
+
+    def on_direction_change(self, event):
+        self.direction = DIRECTIONS[self.direction_choice.GetSelection()]
+        self.hsk_panel.set_direction(self.direction)
 
     def on_custom_study(self, event):
+        # dialogs (and wx.grid) are only imported when first used
+        from res.vocab_selection_dialog import VocabSelectionDialog
         dlg = VocabSelectionDialog(self, self.current_band, self.content_type)
-        if dlg.ShowModal() == wx.ID_OK:
+        self.vocab_dialog = dlg
+        result = dlg.ShowModal()
+        self.vocab_dialog = None
+        if result == wx.ID_OK:
             selected_vocab = dlg.GetSelectedVocab()
             if selected_vocab:
-                self.custom_study_mode = True
-                self.update_control_states()
-                self.hsk_panel.set_custom_vocab(selected_vocab)
+                self.start_custom_study(selected_vocab)
             else:
                 wx.MessageBox("No vocabulary selected for custom study.", "Info", wx.OK | wx.ICON_INFORMATION)
         dlg.Destroy()
 
+    def on_study_sets(self, event):
+        from res.study_sets_dialog import StudySetsDialog
+        dlg = StudySetsDialog(self, self.history)
+        if dlg.ShowModal() == wx.ID_OK:
+            self.start_custom_study(dlg.GetSelectedVocab())
+        dlg.Destroy()
+
+    def start_custom_study(self, vocab):
+        self.custom_study_mode = True
+        self.update_control_states()
+        self.hsk_panel.set_custom_vocab(vocab)
+
     def on_reset_custom_study(self, event):
         self.custom_study_mode = False
         self.hsk_panel.clear_custom_vocab()
@@ -116,13 +227,41 @@ class MainFrame(wx.Frame):
         wx.MessageBox("Custom study mode has been reset.", "Info", wx.OK | wx.ICON_INFORMATION)
 
     def on_options(self, event):
+        from res.config_dialog import ConfigDialog
+        # Saving goes through the config service, which tells the panel
         dlg = ConfigDialog(self)
-        if dlg.ShowModal() == wx.ID_OK:
-            if dlg.SaveConfig():
-                self.hsk_panel.reload_config()
+        dlg.ShowModal()
         dlg.Destroy()
 
+    def on_stats(self, event):
+        from res.stats_dialog import StatsDialog
+        dlg = StatsDialog(self, self.history)
+        dlg.ShowModal()
+        dlg.Destroy()
+
+    def on_debug(self, event):
+        from res.debug_panel import DebugFrame
+        if self.debug_frame:
+            self.debug_frame.Raise()
+            return
+        self.debug_frame = DebugFrame(self)
+        self.debug_frame.Show()
+
+    def on_close(self, event):
+        if self.watcher:
+            self.watcher.close()
+        self.hsk_panel.save_progress()
+        # live reloads only patched memory, keep them for next start
+        get_lexicon().save()
+        # writes whatever answers are still queued
+        self.history.close()
+        if self.recorder:
+            self.recorder.close()
+        event.Skip()
+
 if __name__ == "__main__":
     app = wx.App()
+    startup.mark('wx.App')
     frame = MainFrame()
+    startup.mark('build frame')
     app.MainLoop()
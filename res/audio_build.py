@@ -0,0 +1,233 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from res import resources
+from res.audio_pack import PACK_PATH, DEFAULT_FORMAT, write_pack
+from res.lexicon import get_lexicon, AUDIO
+
+# Offline audio pipeline: decode every clip the band CSVs point at to the
+# mixer's PCM format, trim the silence gTTS leaves at both ends, level the
+# loudness and pack the result. Outputs are cached by input hash + settings
+# so a rerun only touches clips that changed.
+
+BUILD_DIR = 'build/audio'     # in the checkout, like the pack
+MANIFEST = 'manifest.json'
+WRONG_SOUND = 'res/wrong.wav'
+
+SILENCE_THRESHOLD = 500     # 16-bit sample magnitude that counts as sound
+EDGE_PADDING = 0.03         # seconds of silence kept either side
+TARGET_RMS = 3000           # roughly -20 dBFS
+MAX_GAIN = 4.0
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _init_worker(mixer_format):
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    import pygame.mixer
+    pygame.mixer.init(*mixer_format, allowedchanges=0)
+
+
+def trim_silence(samples, channels, frequency, threshold=SILENCE_THRESHOLD):
+    n = len(samples)
+    start = 0
+    while start < n and abs(samples[start]) < threshold:
+        start += 1
+    end = n
+    while end > start and abs(samples[end - 1]) < threshold:
+        end -= 1
+    pad = int(EDGE_PADDING * frequency) * channels
+    # keep whole frames
+    start = max(0, start - pad) // channels * channels
+    end = min(n, end + pad + channels - 1) // channels * channels
+    return samples[start:end]
+
+
+def normalise(samples):
+    if not samples:
+        return samples
+    rms = (sum(x * x for x in samples) / len(samples)) ** 0.5
+    if rms < 1:
+        return samples
+    gain = min(MAX_GAIN, TARGET_RMS / rms)
+    peak = max(max(samples), -min(samples))
+    # never push the loudest sample into clipping
+    if peak * gain > 32767:
+        gain = 32767 / peak
+    if abs(gain - 1.0) < 0.05:
+        return samples
+    return array('h', (int(x * gain) for x in samples))
+
+
+def process_clip(src, dest, mixer_format):
+    # Runs in a worker process. Returns (src, error or None)
+    import pygame.mixer
+    frequency, _, channels = mixer_format
+    try:
+        raw = pygame.mixer.Sound(src).get_raw()
+    except Exception as e:
+        return src, str(e)
+    samples = array('h')
+    samples.frombytes(raw)
+    if sys.byteorder != 'little':
+        samples.byteswap()
+    samples = normalise(trim_silence(samples, channels, frequency))
+    if not samples:
+        return src, "clip is silent"
+    if sys.byteorder != 'little':
+        samples.byteswap()
+    tmp = dest + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(samples.tobytes())
+    os.replace(tmp, dest)
+    return src, None
+
+
+class AudioBuild:
+    def __init__(self, build_dir=BUILD_DIR, mixer_format=DEFAULT_FORMAT, jobs=None):
+        self.build_dir = resources.path(build_dir)
+        self.mixer_format = tuple(mixer_format)
+        self.jobs = jobs
+        self.settings = f"{self.mixer_format}|{SILENCE_THRESHOLD}|{EDGE_PADDING}|{TARGET_RMS}|{MAX_GAIN}"
+        self.manifest_path = os.path.join(self.build_dir, MANIFEST)
+        # outputs depend on the settings as much as the input, so each set of
+        # settings gets its own directory and switching back is free
+        self.pcm_dir = os.path.join(self.build_dir, hashlib.sha1(self.settings.encode('utf-8')).hexdigest()[:12])
+        self.manifest = self._load_manifest()
+        self.missing = {}    # clip path -> [rows that use it]
+        self.broken = {}     # clip path -> error
+        self.outputs = {}    # clip path -> processed pcm file
+        self.rebuilt = 0
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'settings': None, 'inputs': {}}
+        return manifest
+
+    def _save_manifest(self):
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    def collect(self, lexicon):
+        clips = {WRONG_SOUND: ['res/wrong.wav']}
+        for entry in lexicon.entries:
+            if entry is not None:
+                clips.setdefault(entry[AUDIO], []).append(entry[0])
+        return clips
+
+    def _input_hash(self, path, st):
+        # Cheap mtime/size check first, hash only when that changed
+        known = self.manifest['inputs'].get(path)
+        if known and known['mtime'] == st.st_mtime_ns and known['size'] == st.st_size:
+            return known['sha1']
+        return file_sha1(resources.path(path))
+
+    def _output(self, sha1):
+        return os.path.join(self.pcm_dir, sha1 + '.pcm')
+
+    def run(self, lexicon):
+        os.makedirs(self.pcm_dir, exist_ok=True)
+        if self.manifest.get('settings') != self.settings:
+            self.manifest = {'settings': self.settings, 'inputs': {}}
+
+        clips = self.collect(lexicon)
+        todo = {}           # content hash -> source path, identical files get processed once
+        hashes = {}
+        inputs = {}
+        for path, users in sorted(clips.items()):
+            try:
+                st = os.stat(resources.path(path))
+            except OSError:
+                self.missing[path] = users
+                continue
+            sha1 = self._input_hash(path, st)
+            hashes[path] = sha1
+            inputs[path] = {'mtime': st.st_mtime_ns, 'size': st.st_size, 'sha1': sha1}
+            dest = self._output(sha1)
+            if not os.path.exists(dest):
+                todo.setdefault(sha1, path)
+
+        if todo:
+            with ProcessPoolExecutor(self.jobs, initializer=_init_worker, initargs=(self.mixer_format,)) as pool:
+                futures = {pool.submit(process_clip, resources.path(src), self._output(sha1), self.mixer_format): src
+                           for sha1, src in todo.items()}
+                for future, src in futures.items():
+                    error = future.result()[1]
+                    if error:
+                        self.broken[src] = error
+                    else:
+                        self.rebuilt += 1
+
+        bad_hashes = {hashes[p] for p in self.broken}
+        for path, sha1 in hashes.items():
+            if sha1 in bad_hashes:
+                self.broken.setdefault(path, "same content as a broken clip")
+                inputs.pop(path, None)
+                continue
+            self.outputs[path] = self._output(sha1)
+
+        self.manifest['inputs'] = inputs
+        self._save_manifest()
+        return self.outputs
+
+    def pack(self, out_path=PACK_PATH):
+        out_path = resources.path(out_path)
+
+        def clips():
+            for path, pcm_path in sorted(self.outputs.items()):
+                with open(pcm_path, 'rb') as f:
+                    yield path, f.read()
+        return write_pack(out_path, clips(), self.mixer_format)
+
+    def report(self, out=sys.stdout):
+        for path, users in sorted(self.missing.items()):
+            shown = ', '.join(users[:3]) + (' ...' if len(users) > 3 else '')
+            print(f"MISSING {path} (used by {shown})", file=out)
+        for path, error in sorted(self.broken.items()):
+            print(f"BROKEN  {path}: {error}", file=out)
+        unique = len(set(self.outputs.values()))
+        print(f"{len(self.outputs)} clips ok ({unique} unique), {self.rebuilt} rebuilt, "
+              f"{len(self.missing)} missing, {len(self.broken)} broken", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcode, trim, level and pack the clips used by the band CSVs")
+    parser.add_argument('--jobs', '-j', type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument('--build-dir', help=f"default: {BUILD_DIR} in the checkout")
+    parser.add_argument('--output', '-o', help=f"default: {PACK_PATH} in the checkout")
+    parser.add_argument('--frequency', type=int, default=DEFAULT_FORMAT[0])
+    parser.add_argument('--channels', type=int, default=DEFAULT_FORMAT[2])
+    parser.add_argument('--no-pack', action='store_true', help="only build and check the clips")
+    args = parser.parse_args(argv)
+    if resources.bundled():
+        raise SystemExit("the audio build runs from a checkout, not from a bundle")
+
+    # paths given on the command line are from where we're run, the defaults from the checkout
+    build_dir = os.path.abspath(args.build_dir) if args.build_dir else BUILD_DIR
+    output = os.path.abspath(args.output) if args.output else resources.path(PACK_PATH)
+    build = AudioBuild(build_dir, (args.frequency, DEFAULT_FORMAT[1], args.channels), args.jobs)
+    build.run(get_lexicon())
+    if not args.no_pack:
+        count, size = build.pack(output)
+        print(f"Packed {count} clips ({size / 1e6:.1f} MB PCM) into {output}")
+    build.report()
+    return 1 if build.missing or build.broken else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+from res import resources
+
+# Pack layout:
+#   magic (8 bytes) | header length (uint32 LE) | JSON header | PCM data
+# The header holds the mixer format the PCM was decoded at and an index of
+# clip path -> [offset, length] into the data section.
+
+PACK_PATH = 'res/audio.pack'
+MAGIC = b'HSKAPAK1'
+DEFAULT_FORMAT = (24000, -16, 1)   # the gTTS clips are 24kHz mono anyway
+ALIGN = 8
+
+
+class AudioPack:
+    def __init__(self, path=PACK_PATH):
+        # path is a resource, so this maps it straight out of a bundle too
+        self.path = path
+        self._map, base = resources.map_resource(path)
+        try:
+            with memoryview(self._map) as whole:
+                self._view = whole[base:]
+            if self._view[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not an audio pack")
+            (header_len,) = struct.unpack_from('<I', self._view, len(MAGIC))
+            start = len(MAGIC) + 4
+            header = json.loads(bytes(self._view[start:start + header_len]).decode('utf-8'))
+        except Exception:
+            self.close()
+            raise
+        self.frequency = header['frequency']
+        self.size = header['size']
+        self.channels = header['channels']
+        self.data_start = header['data_start']
+        self.index = header['clips']
+
+    @property
+    def mixer_format(self):
+        return (self.frequency, self.size, self.channels)
+
+    def __contains__(self, path):
+        return path in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, path):
+        # Zero copy slice of the mapped file
+        offset, length = self.index[path]
+        start = self.data_start + offset
+        return self._view[start:start + length]
+
+    def sound(self, path):
+        import pygame.mixer
+        return pygame.mixer.Sound(buffer=self.get(path))
+
+    def close(self):
+        view = getattr(self, '_view', None)
+        if view is not None:
+            view.release()
+            self._view = None
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+
+
+def open_pack(path=PACK_PATH):
+    if not resources.exists(path):
+        return None
+    try:
+        return AudioPack(path)
+    except Exception as e:
+        print(f"Ignoring audio pack {path}: {e}")
+        return None
+
+
+def write_pack(out_path, clips, mixer_format):
+    # clips: iterable of (path key, raw PCM bytes at mixer_format). Keys
+    # whose PCM is byte-identical share one copy in the data section.
+    frequency, size, channels = mixer_format
+    index = {}
+    stored = {}
+    chunks = []
+    offset = 0
+    for key, pcm in clips:
+        digest = hashlib.sha1(pcm).digest()
+        if digest in stored:
+            index[key] = stored[digest]
+            continue
+        index[key] = stored[digest] = [offset, len(pcm)]
+        pad = -len(pcm) % ALIGN
+        chunks.append(pcm + bytes(pad))
+        offset += len(pcm) + pad
+
+    header = {'frequency': frequency, 'size': size, 'channels': channels, 'clips': index, 'data_start': 0}
+    # data_start depends on the header length, which depends on data_start
+    for _ in range(2):
+        raw = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        start = len(MAGIC) + 4 + len(raw)
+        start += -start % ALIGN
+        header['data_start'] = start
+    raw = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    raw += b' ' * (start - len(MAGIC) - 4 - len(raw))
+
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(raw)))
+        f.write(raw)
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp_path, out_path)
+    return len(index), offset
+
+
+def decode_clips(paths, mixer_format):
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    import pygame.mixer
+    frequency, size, channels = mixer_format
+    pygame.mixer.init(frequency=frequency, size=size, channels=channels, allowedchanges=0)
+    try:
+        for path in paths:
+            try:
+                yield path, pygame.mixer.Sound(resources.path(path)).get_raw()
+            except Exception as e:
+                print(f"Skipping {path}: {e}", file=sys.stderr)
+    finally:
+        pygame.mixer.quit()
+
+
+def collect_clip_paths(lexicon):
+    paths = {'res/wrong.wav'}
+    for entry in lexicon.entries:
+        if entry is not None:
+            paths.add(entry[5])
+    return sorted(paths)
+
+
+def main(argv=None):
+    from res.lexicon import get_lexicon
+
+    parser = argparse.ArgumentParser(description="Pack every clip the band CSVs use into one pre-decoded file")
+    parser.add_argument('--output', '-o', help=f"default: {PACK_PATH} in the checkout")
+    parser.add_argument('--frequency', type=int, default=DEFAULT_FORMAT[0])
+    parser.add_argument('--channels', type=int, default=DEFAULT_FORMAT[2])
+    args = parser.parse_args(argv)
+    if resources.bundled():
+        raise SystemExit("audio packs are built from a checkout, not from a bundle")
+
+    mixer_format = (args.frequency, DEFAULT_FORMAT[1], args.channels)
+    paths = collect_clip_paths(get_lexicon())
+    # a path given on the command line is from where we're run, the default from the checkout
+    output = os.path.abspath(args.output) if args.output else resources.path(PACK_PATH)
+    count, size = write_pack(output, decode_clips(paths, mixer_format), mixer_format)
+    print(f"Packed {count}/{len(paths)} clips ({size / 1e6:.1f} MB PCM) into {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from res import metrics
+
+# All sound goes through one thread with a command queue, so nothing on the
+# UI thread ever touches the mixer. Pronunciation clips and feedback blips
+# each get a reserved mixer channel: a new clip cuts off the one before it on
+# the same channel instead of talking over it, and when a clip finishes the
+# callback is handed to `post` (wx.CallAfter in the app).
+#
+# Without a sound device (or with HSK_AUDIO=null) the null backend stands in:
+# nothing is heard but clips still "finish" on time.
+
+PRONUNCIATION = 0
+FEEDBACK = 1
+CHANNELS = (PRONUNCIATION, FEEDBACK)
+NULL_LENGTH = 0.5       # how long a clip lasts when there's nothing to measure it by
+POLL_INTERVAL = 0.01    # how often playing channels are checked for the end
+
+
+class PygameBackend:
+    name = 'pygame'
+
+    def __init__(self):
+        import pygame.mixer
+        from res.sound_cache import SoundCache
+        from res.audio_pack import open_pack
+        # The pack is only usable if the mixer runs at the format it was built for
+        pack = open_pack()
+        if pack:
+            pygame.mixer.init(*pack.mixer_format, allowedchanges=0)
+        else:
+            pygame.mixer.init()
+        # keep the channels we hand out away from Sound.play()'s own picking
+        pygame.mixer.set_reserved(len(CHANNELS))
+        self.channels = [pygame.mixer.Channel(channel) for channel in CHANNELS]
+        self.sounds = SoundCache(pack=pack)
+
+    def prefetch(self, path):
+        self.sounds.prefetch(path)
+
+    def play(self, path, channel):
+        sound = self.sounds.get(path)
+        self.channels[channel].play(sound)
+        return sound.get_length()
+
+    def stop(self, channel):
+        self.channels[channel].stop()
+
+    def forget(self, path):
+        self.sounds.discard(path)
+
+    def busy(self, channel, deadline):
+        return self.channels[channel].get_busy()
+
+    def stats(self):
+        return self.sounds.stats()
+
+    def close(self):
+        for channel in self.channels:
+            channel.stop()
+        self.sounds.close()
+
+
+class NullBackend:
+    name = 'null'
+
+    def prefetch(self, path):
+        pass
+
+    def play(self, path, channel):
+        return NULL_LENGTH
+
+    def stop(self, channel):
+        pass
+
+    def forget(self, path):
+        pass
+
+    def busy(self, channel, deadline):
+        return time.monotonic() < deadline
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+def open_backend(name=None):
+    name = name or os.environ.get('HSK_AUDIO', 'pygame')
+    if name == 'null':
+        return NullBackend()
+    try:
+        return PygameBackend()
+    except Exception as e:
+        metrics.error('audio_init', f"Error initialising audio, continuing without sound: {e}")
+        return NullBackend()
+
+
+class AudioService:
+    def __init__(self, backend=None, post=None, on_ready=None):
+        # backend is a name ('pygame'/'null'), a backend object, or None for the default
+        self.backend_choice = backend
+        self.backend = None
+        self.post = post
+        self.on_ready = on_ready
+        self.ready_at = None
+        self.playing = {}       # channel -> (play id, on_done, deadline)
+        self._ids = itertools.count(1)
+        self._queue = queue.Queue()
+        # Mixer init and pygame import are slow, that happens on the thread too
+        self._thread = threading.Thread(target=self._run, name='audio', daemon=True)
+        self._thread.start()
+
+    @property
+    def ready(self):
+        return self.ready_at is not None
+
+    # Everything below is safe to call from any thread and only queues
+
+    def play(self, path, channel=PRONUNCIATION, on_done=None):
+        # -> play id, passed to on_done when the clip ends. Cut off or
+        # cancelled clips don't call back.
+        play_id = next(self._ids)
+        self._queue.put(('play', play_id, path, channel, on_done, time.monotonic()))
+        return play_id
+
+    def cancel(self, channel=None):
+        # None stops every channel
+        self._queue.put(('cancel', channel))
+
+    def prefetch(self, path):
+        self._queue.put(('prefetch', path))
+
+    def forget(self, paths):
+        # clips edited on disk
+        self._queue.put(('forget', paths))
+
+    def close(self):
+        self._queue.put(None)
+
+    def stats(self):
+        stats = {'backend': self.backend.name if self.backend else None, 'playing': len(self.playing)}
+        if self.backend:
+            stats.update(self.backend.stats())
+        return stats
+
+    # Audio thread
+
+    def _run(self):
+        backend = self.backend_choice
+        self.backend = backend if hasattr(backend, 'play') else open_backend(backend)
+        self.ready_at = time.monotonic()
+        if self.on_ready:
+            self._post(self.on_ready, self)
+        while True:
+            try:
+                command = self._queue.get(timeout=POLL_INTERVAL if self.playing else None)
+            except queue.Empty:
+                command = ()
+            if command is None:
+                break
+            if command:
+                try:
+                    getattr(self, '_' + command[0])(*command[1:])
+                except Exception as e:
+                    metrics.error('sound_play', f"Error in audio {command[0]}: {e}")
+            self._reap()
+        try:
+            self.backend.close()
+        except Exception as e:
+            metrics.error('sound_play', f"Error closing audio: {e}")
+
+    def _post(self, fn, *args):
+        if self.post is None:
+            fn(*args)
+        else:
+            self.post(fn, *args)
+
+    def _play(self, play_id, path, channel, on_done, queued_at):
+        self.playing.pop(channel, None)
+        if queued_at < self.ready_at:
+            # asked for before there was a mixer, it's not wanted any more
+            length = 0.0
+        else:
+            metrics.observe('audio_queue_delay', time.monotonic() - queued_at)
+            try:
+                with metrics.timer('sound_start'):
+                    length = self.backend.play(path, channel)
+            except Exception as e:
+                metrics.error('sound_play', f"Error playing sound {path}: {e}")
+                length = 0.0
+        if on_done is not None:
+            self.playing[channel] = (play_id, on_done, time.monotonic() + length)
+
+    def _cancel(self, channel):
+        for channel in (CHANNELS if channel is None else (channel,)):
+            self.playing.pop(channel, None)
+            self.backend.stop(channel)
+
+    def _prefetch(self, path):
+        self.backend.prefetch(path)
+
+    def _forget(self, paths):
+        for path in paths:
+            self.backend.forget(path)
+
+    def _reap(self):
+        now = time.monotonic()
+        for channel, (play_id, on_done, deadline) in list(self.playing.items()):
+            if now >= deadline or not self.backend.busy(channel, deadline):
+                del self.playing[channel]
+                self._post(on_done, play_id)
@@ -0,0 +1,98 @@
+class Bitset:
+    # Fixed-size set of small ints (lexicon entry ids) packed into a bytearray
+
+    __slots__ = ('size', 'bits')
+
+    def __init__(self, size=0, ids=()):
+        self.size = size
+        self.bits = bytearray((size + 7) // 8)
+        self.update(ids)
+
+    def resize(self, size):
+        nbytes = (size + 7) // 8
+        if nbytes > len(self.bits):
+            self.bits.extend(bytes(nbytes - len(self.bits)))
+        else:
+            del self.bits[nbytes:]
+            # clear the spare bits of the last byte
+            if size % 8 and self.bits:
+                self.bits[-1] &= (1 << (size % 8)) - 1
+        self.size = size
+
+    def add(self, i):
+        self.bits[i >> 3] |= 1 << (i & 7)
+
+    def discard(self, i):
+        self.bits[i >> 3] &= ~(1 << (i & 7)) & 0xff
+
+    def toggle(self, i):
+        self.bits[i >> 3] ^= 1 << (i & 7)
+
+    def __contains__(self, i):
+        return 0 <= i < self.size and bool(self.bits[i >> 3] & (1 << (i & 7)))
+
+    def update(self, ids):
+        bits = self.bits
+        for i in ids:
+            bits[i >> 3] |= 1 << (i & 7)
+
+    def difference_update(self, ids):
+        bits = self.bits
+        for i in ids:
+            bits[i >> 3] &= ~(1 << (i & 7)) & 0xff
+
+    def clear(self):
+        self.bits[:] = bytes(len(self.bits))
+
+    # Set algebra goes through one big int, so it's a few C loops whatever
+    # the size. Sets built against a smaller lexicon just grow.
+    def to_int(self):
+        return int.from_bytes(self.bits, 'little')
+
+    @classmethod
+    def from_int(cls, size, value):
+        bitset = cls(size)
+        bitset.bits[:] = value.to_bytes(len(bitset.bits), 'little')
+        return bitset
+
+    def __or__(self, other):
+        return Bitset.from_int(max(self.size, other.size), self.to_int() | other.to_int())
+
+    def __and__(self, other):
+        return Bitset.from_int(max(self.size, other.size), self.to_int() & other.to_int())
+
+    def __sub__(self, other):
+        return Bitset.from_int(max(self.size, other.size), self.to_int() & ~other.to_int())
+
+    # In place, for a big set updated from another one over and over
+    def __ior__(self, other):
+        if other.size > self.size:
+            self.resize(other.size)
+        self.bits[:] = (self.to_int() | other.to_int()).to_bytes(len(self.bits), 'little')
+        return self
+
+    def __isub__(self, other):
+        self.bits[:] = (self.to_int() & ~other.to_int()).to_bytes(len(self.bits), 'little')
+        return self
+
+    def __eq__(self, other):
+        return isinstance(other, Bitset) and self.to_int() == other.to_int()
+
+    def copy(self):
+        bitset = Bitset(self.size)
+        bitset.bits[:] = self.bits
+        return bitset
+
+    def __len__(self):
+        return int.from_bytes(self.bits, 'little').bit_count()
+
+    def __bool__(self):
+        return any(self.bits)
+
+    def __iter__(self):
+        for byte_index, byte in enumerate(self.bits):
+            if byte:
+                base = byte_index << 3
+                for bit in range(8):
+                    if byte & (1 << bit):
+                        yield base + bit
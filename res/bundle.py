@@ -0,0 +1,129 @@
+import argparse
+import io
+import json
+import os
+import py_compile
+import stat
+import sys
+import tempfile
+import time
+import zipfile
+from res import resources
+from res.lexicon import Lexicon, BAND_FILE_RE, DATA_DIR, SEED_CACHE
+
+# Packs the app into a single zipapp: `python build/hsk.pyz` runs it from
+# anywhere and res.resources reads the csvs and clips straight out of it.
+#
+# Start-up has to be no slower than a checkout, so:
+#  - modules go in with their bytecode, zipimport can't write __pycache__
+#    and compiling everything on each start would cost more than it saves
+#  - data files are stored uncompressed and listed with their offsets in a
+#    manifest, so reading one is a seek, with no zipfile parsing at runtime
+#  - a lexicon cache built from the bundled csvs goes in too, so a first
+#    start doesn't parse them
+#  - the clips go in their own inner zip (audio.zip) with a separate index,
+#    zipimport reads the whole central directory on start and thousands of
+#    clip entries in it would cost more than everything else put together
+
+OUTPUT = os.path.join('build', 'hsk.pyz')
+SHEBANG = b'#!/usr/bin/env python3\n'
+AUDIO_DIR = 'audio'
+CLIP_ARCHIVE = 'audio.zip'
+CLIP_INDEX = 'audio.json'
+# What ships from res/ besides code and csvs, the rest in there is user state
+SHIPPED = ('res/config.txt', 'res/icon.xpm', 'res/wrong.wav', 'res/audio.pack')
+
+
+def _code_files():
+    # (name in the bundle, file), the GUI's main.py is what runs
+    code_dir = os.path.join(resources.CODE_ROOT, 'res')
+    yield '__main__.py', os.path.join(resources.CODE_ROOT, 'main.py')
+    for name in sorted(os.listdir(code_dir)):
+        if name.endswith('.py'):
+            yield 'res/' + name, os.path.join(code_dir, name)
+
+
+def _data_files():
+    for name in sorted(resources.listdir(DATA_DIR)):
+        if BAND_FILE_RE.match(name):
+            yield f'{DATA_DIR}/{name}'
+    for name in SHIPPED:
+        if resources.exists(name):
+            yield name
+
+
+def _store(archive, name, data, mtime=None, compress=False):
+    # -> offset of the data in the file, for the manifest
+    info = zipfile.ZipInfo(name, time.localtime(mtime / 1e9 if mtime else None)[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    info.external_attr = 0o644 << 16
+    archive.writestr(info, data)
+    return archive.fp.tell() - info.compress_size
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read(), os.stat(f.fileno()).st_mtime_ns
+
+
+def build(out_path=OUTPUT):
+    # -> (files, bytes written)
+    if resources.bundled():
+        raise SystemExit("bundles are built from a checkout, not from another bundle")
+    if os.path.dirname(out_path):
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    files = {}
+    clips = {}
+    tmp_path = out_path + '.tmp'
+    with tempfile.TemporaryDirectory(prefix='hsk-bundle-') as tmp, open(tmp_path, 'wb') as f:
+        f.write(SHEBANG)
+        with zipfile.ZipFile(f, 'w') as archive:
+            # res is a namespace package, zipimport only finds it with a directory entry
+            archive.writestr(zipfile.ZipInfo(DATA_DIR + '/'), b'')
+            for name, path in _code_files():
+                _store(archive, name, *_read(path), compress=True)
+                # unchecked hash pycs: nothing to compare against a source mtime
+                compiled = os.path.join(tmp, name + 'c')
+                py_compile.compile(path, cfile=compiled, dfile=name, doraise=True,
+                                   invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+                _store(archive, name + "c", *_read(compiled))
+
+            for name in _data_files():
+                data, mtime = _read(resources.path(name))
+                files[name] = [_store(archive, name, data, mtime), len(data), mtime]
+            # fresh ids, not whatever the checkout's own cache has been through
+            seed = os.path.join(tmp, 'lexicon.cache')
+            Lexicon(cache_path=seed)
+            data, mtime = _read(seed)
+            files[SEED_CACHE] = [_store(archive, SEED_CACHE, data, mtime), len(data), mtime]
+
+            inner = io.BytesIO()
+            with zipfile.ZipFile(inner, 'w') as clip_archive:
+                for name in sorted(resources.listdir(AUDIO_DIR)):
+                    data, mtime = _read(resources.path(f'{AUDIO_DIR}/{name}'))
+                    clips[f'{AUDIO_DIR}/{name}'] = [_store(clip_archive, f'{AUDIO_DIR}/{name}', data, mtime),
+                                                    len(data), mtime]
+            base = _store(archive, CLIP_ARCHIVE, inner.getvalue())
+            for entry in clips.values():
+                entry[0] += base
+
+            _store(archive, CLIP_INDEX, json.dumps(clips, ensure_ascii=False).encode('utf-8'), compress=True)
+            manifest = {'files': files, 'lazy': {AUDIO_DIR: CLIP_INDEX}}
+            _store(archive, resources.MANIFEST, json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+    os.chmod(tmp_path, os.stat(tmp_path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.replace(tmp_path, out_path)
+    return len(files) + len(clips), os.path.getsize(out_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a single-file zipapp of the app and its data")
+    parser.add_argument('--output', '-o', default=OUTPUT)
+    args = parser.parse_args(argv)
+
+    count, size = build(args.output)
+    print(f"Bundled {count} data files ({size / 1e6:.1f} MB) into {args.output}, "
+          f"run it with: {os.path.basename(sys.executable)} {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import json
+import sys
+import time
+from res.quiz_engine import QuizEngine, ORDER_MODES
+from res.lexicon import parse_band
+from res.scheduler import Scheduler
+from res.directions import DIRECTIONS
+from res.session_log import SessionRecorder
+from res.study_sets import StudySets
+from res.typed_answer import EXACT, WRONG_TONE
+
+
+def build_engine(args):
+    config = {
+        'characters': args.characters,
+        'readings': args.readings,
+        'distractors': args.distractors,
+        'answer_mode': 'typed' if args.typed else 'choices',
+    }
+    # batch runs shouldn't touch the saved review state
+    scheduler = Scheduler() if args.batch is None else Scheduler(path=None)
+    recorder = None
+    if args.record is not None:
+        recorder = SessionRecorder(args.record or None)
+    engine = QuizEngine(args.band, args.type, args.order, config, scheduler=scheduler, seed=args.seed,
+                        direction=args.direction, recorder=recorder)
+    if args.set:
+        sets = StudySets()
+        if args.set not in sets:
+            raise SystemExit(f"no study set called {args.set!r}")
+        engine.set_custom_vocab(sets.rows(sets.get(args.set)))
+    else:
+        engine.load_data()
+    return engine
+
+
+def run_batch(engine, count, out):
+    write = out.write
+    start = time.perf_counter()
+    for _ in range(count):
+        question = engine.next_question()
+        if question is None:
+            print("No data loaded", file=sys.stderr)
+            return
+        write(json.dumps(question.to_dict(), ensure_ascii=False))
+        write('\n')
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else float('inf')
+    print(f"{count} questions in {elapsed:.3f}s ({rate:,.0f}/s)", file=sys.stderr)
+
+
+def run_interactive(engine):
+    asked = correct = 0
+    while True:
+        question = engine.next_question()
+        if question is None:
+            print("No data loaded")
+            return
+        print()
+        if question.direction == 'listening':
+            print(f"  (listen: {question.audio})")
+        else:
+            print(f"  {question.prompt}")
+        if question.hint:
+            print(f"  {question.hint}")
+        for i, choice in enumerate(question.choices, 1):
+            print(f"  {i}) {choice}")
+
+        asked += 1
+        first_try = True
+        while True:
+            try:
+                reply = input("> ").strip()
+            except (EOFError, KeyboardInterrupt):
+                print()
+                print(f"{correct}/{asked - 1} right first time")
+                engine.save_progress()
+                return
+            if reply in ('q', 'quit'):
+                print(f"{correct}/{asked - 1} right first time")
+                engine.save_progress()
+                return
+            if engine.typed:
+                if not reply:
+                    continue
+                verdict, reading = engine.answer_typed(reply)
+                if reading is not None:
+                    print("Correct!" if verdict == EXACT else f"Close enough: {reading} ({verdict})")
+                    correct += first_try
+                    break
+                first_try = False
+                print("Right sounds, wrong tones" if verdict == WRONG_TONE else "Wrong, try again")
+                continue
+            if not reply.isdigit() or not 1 <= int(reply) <= len(question.choices):
+                print("Pick 1-4, or q to quit")
+                continue
+            if engine.answer(question.choices[int(reply) - 1]):
+                print("Correct!")
+                correct += first_try
+                break
+            first_try = False
+            print("Wrong, try again")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HSK 3.0 practice without the GUI")
+    parser.add_argument('--band', type=parse_band, default=1, help="1-6, 7-9, a range like 2-4, or all")
+    parser.add_argument('--type', choices=['char', 'vocab'], default='char')
+    parser.add_argument('--set', help="drill a saved study set instead of a band")
+    parser.add_argument('--order', choices=ORDER_MODES, default='random')
+    parser.add_argument('--direction', choices=DIRECTIONS, default=DIRECTIONS[0])
+    parser.add_argument('--characters', choices=['simplified', 'traditional'], default='simplified')
+    parser.add_argument('--readings', choices=['pinyin', 'zhuyin'], default='pinyin')
+    parser.add_argument('--distractors', choices=['random', 'confusable'], default='random')
+    parser.add_argument('--typed', action='store_true', help="type the reading instead of picking it")
+    parser.add_argument('--seed', type=int, help="seed the card picker for repeatable runs")
+    parser.add_argument('--record', nargs='?', const='', metavar='PATH',
+                        help="record the session for replaying (default res/sessions/<time>.jsonl)")
+    parser.add_argument('--batch', type=int, metavar='N', help="write N questions as JSON lines and exit")
+    parser.add_argument('--output', '-o', help="batch output file (default stdout)")
+    args = parser.parse_args(argv)
+
+    engine = build_engine(args)
+    try:
+        if args.batch is None:
+            run_interactive(engine)
+        elif args.output:
+            with open(args.output, 'w', encoding='utf-8') as out:
+                run_batch(engine, args.batch, out)
+        else:
+            run_batch(engine, args.batch, sys.stdout)
+    finally:
+        if engine.recorder is not None:
+            engine.recorder.close()
+            print(f"Session recorded to {engine.recorder.path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
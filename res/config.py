@@ -0,0 +1,97 @@
+import os
+from res import resources
+
+CONFIG_PATH = 'config.txt'            # under the user dir
+SHIPPED_CONFIG = 'res/config.txt'     # read until there's one of our own
+
+DEFAULTS = {
+    'characters': 'simplified',
+    'readings': 'pinyin',
+    'distractors': 'random',
+    'fast_advance': 'off',
+    'answer_mode': 'choices'
+}
+
+# Written above each key when saving
+COMMENTS = {
+    'characters': "simplified or traditional",
+    'readings': "pinyin or zhuyin",
+    'distractors': "random or confusable (similar sounding readings)",
+    'fast_advance': "on or off (click again to skip the rest of the pronunciation)",
+    'answer_mode': "choices or typed (type the reading, tones optional)",
+}
+
+
+class Config:
+    # The one copy of config.txt. Read once, written through update(), and
+    # anyone who cares gets told which keys changed.
+    def __init__(self, path=CONFIG_PATH):
+        self.path = resources.user_path(path)
+        self.values = dict(DEFAULTS)
+        self._subscribers = []
+        self.load()
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def as_dict(self):
+        return dict(self.values)
+
+    def load(self):
+        try:
+            f = open(self.path, 'r') if os.path.exists(self.path) else resources.open_text(SHIPPED_CONFIG)
+            with f:
+                for line in f:
+                    line = line.strip()
+                    if line.startswith('#') or not line:
+                        continue
+                    if '=' in line:
+                        key, value = line.split('=', 1)
+                        key = key.strip().lower()
+                        value = value.strip().strip('"\'')
+                        if key in self.values:
+                            self.values[key] = value.lower()
+        except Exception as e:
+            print(f"Error loading config: {e}, using defaults")
+
+    def save(self):
+        try:
+            with open(self.path, 'w') as f:
+                lines = []
+                for key, value in self.values.items():
+                    lines.append(f"# {COMMENTS.get(key, key)}\n{key} = '{value}'\n")
+                f.write('\n'.join(lines))
+            return True
+        except Exception as e:
+            print(f"Error saving config: {e}")
+            return False
+
+    def update(self, values):
+        changed = {key for key, value in values.items() if key in self.values and self.values[key] != value}
+        for key in changed:
+            self.values[key] = values[key]
+        saved = self.save()
+        if changed:
+            for callback in list(self._subscribers):
+                callback(self, changed)
+        return saved
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+
+_config = None
+
+
+def get_config():
+    global _config
+    if _config is None:
+        _config = Config()
+    return _config
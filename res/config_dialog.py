@@ -1,11 +1,11 @@
 import wx
+from res.config import get_config
 
 class ConfigDialog(wx.Dialog):
     def __init__(self, parent):
-        super().__init__(parent, title="Configuration", size=(300, 200),
+        super().__init__(parent, title="Configuration", size=(300, 340),
                          style=wx.DEFAULT_DIALOG_STYLE & ~wx.RESIZE_BORDER)
-        self.config = {}
-        self.load_current_config()
+        self.config = get_config()
         self.init_ui()
         self.Bind(wx.EVT_BUTTON, self.on_save, id=wx.ID_OK)
         
@@ -29,6 +29,30 @@ class ConfigDialog(wx.Dialog):
         hbox2.Add(lbl_read, 0, wx.ALIGN_CENTER_VERTICAL)
         hbox2.Add(self.read_choice, 1, wx.EXPAND|wx.LEFT, 10)
 
+        # And how wrong answers get picked
+        hbox3 = wx.BoxSizer(wx.HORIZONTAL)
+        lbl_dist = wx.StaticText(panel, label="Distractors:", size=(90, -1))
+        self.dist_choice = wx.Choice(panel, choices=["random", "confusable"])
+        self.dist_choice.SetStringSelection(self.config.get('distractors', 'random'))
+        hbox3.Add(lbl_dist, 0, wx.ALIGN_CENTER_VERTICAL)
+        hbox3.Add(self.dist_choice, 1, wx.EXPAND|wx.LEFT, 10)
+
+        # Whether a second click skips the rest of the pronunciation
+        hbox4 = wx.BoxSizer(wx.HORIZONTAL)
+        lbl_fast = wx.StaticText(panel, label="Fast advance:", size=(90, -1))
+        self.fast_choice = wx.Choice(panel, choices=["off", "on"])
+        self.fast_choice.SetStringSelection(self.config.get('fast_advance', 'off'))
+        hbox4.Add(lbl_fast, 0, wx.ALIGN_CENTER_VERTICAL)
+        hbox4.Add(self.fast_choice, 1, wx.EXPAND|wx.LEFT, 10)
+
+        # Pick from four buttons or type the reading in
+        hbox5 = wx.BoxSizer(wx.HORIZONTAL)
+        lbl_answer = wx.StaticText(panel, label="Answer:", size=(90, -1))
+        self.answer_choice = wx.Choice(panel, choices=["choices", "typed"])
+        self.answer_choice.SetStringSelection(self.config.get('answer_mode', 'choices'))
+        hbox5.Add(lbl_answer, 0, wx.ALIGN_CENTER_VERTICAL)
+        hbox5.Add(self.answer_choice, 1, wx.EXPAND|wx.LEFT, 10)
+
         btn_sizer = wx.StdDialogButtonSizer()
         btn_ok = wx.Button(panel, wx.ID_OK)
         btn_cancel = wx.Button(panel, wx.ID_CANCEL)
@@ -38,6 +62,9 @@ class ConfigDialog(wx.Dialog):
 
         vbox.Add(hbox1, 1, wx.EXPAND|wx.ALL, 10)
         vbox.Add(hbox2, 1, wx.EXPAND|wx.ALL, 10)
+        vbox.Add(hbox3, 1, wx.EXPAND|wx.ALL, 10)
+        vbox.Add(hbox4, 1, wx.EXPAND|wx.ALL, 10)
+        vbox.Add(hbox5, 1, wx.EXPAND|wx.ALL, 10)
         vbox.Add(btn_sizer, 0, wx.ALIGN_CENTER|wx.BOTTOM, 10)
         
         panel.SetSizer(vbox)
@@ -47,36 +74,14 @@ class ConfigDialog(wx.Dialog):
         if self.SaveConfig():
             event.Skip()
 
-    def load_current_config(self):
-        try:
-            with open('res/config.txt', 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line.startswith('#') or not line:
-                        continue
-                    if '=' in line:
-                        key, value = line.split('=', 1)
-                        key = key.strip().lower()
-                        value = value.strip().strip('"\'').lower()
-                        self.config[key] = value
-        except Exception as e:
-            print(f"Error loading config: {e}")
-
     def GetConfig(self):
         return {
             'characters': self.char_choice.GetStringSelection(),
-            'readings': self.read_choice.GetStringSelection()
+            'readings': self.read_choice.GetStringSelection(),
+            'distractors': self.dist_choice.GetStringSelection(),
+            'fast_advance': self.fast_choice.GetStringSelection(),
+            'answer_mode': self.answer_choice.GetStringSelection()
         }
 
     def SaveConfig(self):
-        config = self.GetConfig()
-        try:
-            with open('res/config.txt', 'w') as f:
-                f.write("# simplified or traditional\n")
-                f.write(f"characters = '{config['characters']}'\n\n")
-                f.write("# pinyin or zhuyin\n")
-                f.write(f"readings = '{config['readings']}'\n")
-            return True
-        except Exception as e:
-            print(f"Error saving config: {e}")
-            return False
+        return self.config.update(self.GetConfig())
@@ -0,0 +1,83 @@
+import wx
+from res import metrics
+
+REFRESH_MS = 500
+
+
+class DebugFrame(wx.Frame):
+    def __init__(self, parent):
+        super().__init__(parent, title="Debug", size=(620, 480))
+        # Opening the panel is as good as asking for metrics
+        if not metrics.enabled:
+            metrics.enable()
+
+        panel = wx.Panel(self)
+        vbox = wx.BoxSizer(wx.VERTICAL)
+
+        self.timings = wx.ListCtrl(panel, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
+        for i, (label, width) in enumerate((("Timer", 160), ("Count", 70), ("p50 ms", 80),
+                                            ("p95 ms", 80), ("p99 ms", 80), ("max ms", 80))):
+            self.timings.InsertColumn(i, label, width=width)
+
+        self.counters = wx.ListCtrl(panel, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
+        self.counters.InsertColumn(0, "Counter", width=240)
+        self.counters.InsertColumn(1, "Value", width=100)
+
+        btn_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        reset_btn = wx.Button(panel, label="Reset")
+        json_btn = wx.Button(panel, label="Dump JSON...")
+        prom_btn = wx.Button(panel, label="Dump Prometheus...")
+        reset_btn.Bind(wx.EVT_BUTTON, self.on_reset)
+        json_btn.Bind(wx.EVT_BUTTON, lambda event: self.on_dump("metrics.json", "JSON (*.json)|*.json"))
+        prom_btn.Bind(wx.EVT_BUTTON, lambda event: self.on_dump("metrics.prom", "Prometheus text (*.prom)|*.prom"))
+        btn_sizer.Add(reset_btn, 0, wx.ALL, 5)
+        btn_sizer.AddStretchSpacer(1)
+        btn_sizer.Add(json_btn, 0, wx.ALL, 5)
+        btn_sizer.Add(prom_btn, 0, wx.ALL, 5)
+
+        vbox.Add(self.timings, 3, wx.EXPAND | wx.ALL, 5)
+        vbox.Add(self.counters, 2, wx.EXPAND | wx.ALL, 5)
+        vbox.Add(btn_sizer, 0, wx.EXPAND | wx.ALL, 5)
+        panel.SetSizer(vbox)
+
+        self.timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.refresh, self.timer)
+        self.Bind(wx.EVT_CLOSE, self.on_close)
+        self.timer.Start(REFRESH_MS)
+        self.refresh()
+
+    def refresh(self, event=None):
+        snap = metrics.snapshot()
+        self._fill(self.timings, [
+            (name, str(h['count']), f"{h['p50'] * 1000:.3f}", f"{h['p95'] * 1000:.3f}",
+             f"{h['p99'] * 1000:.3f}", f"{h['max'] * 1000:.3f}")
+            for name, h in snap['histograms'].items()
+        ])
+        self._fill(self.counters, [(name, str(value)) for name, value in snap['counters'].items()])
+
+    def _fill(self, ctrl, rows):
+        # Update in place so the list doesn't flicker every refresh
+        ctrl.Freeze()
+        while ctrl.GetItemCount() > len(rows):
+            ctrl.DeleteItem(ctrl.GetItemCount() - 1)
+        for i, row in enumerate(rows):
+            if i >= ctrl.GetItemCount():
+                ctrl.InsertItem(i, row[0])
+            for col, value in enumerate(row):
+                if ctrl.GetItemText(i, col) != value:
+                    ctrl.SetItem(i, col, value)
+        ctrl.Thaw()
+
+    def on_reset(self, event):
+        metrics.reset()
+        self.refresh()
+
+    def on_dump(self, default_name, wildcard):
+        with wx.FileDialog(self, "Save metrics", defaultFile=default_name, wildcard=wildcard,
+                           style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT) as dlg:
+            if dlg.ShowModal() == wx.ID_OK:
+                metrics.dump(dlg.GetPath())
+
+    def on_close(self, event):
+        self.timer.Stop()
+        event.Skip()
@@ -0,0 +1,138 @@
+from array import array
+from res.lexicon import PINYIN, ZHUYIN, MEANING
+from res.distractors import DistractorIndex
+
+# What a card shows -> what you pick
+DIRECTIONS = ('hanzi_reading', 'hanzi_meaning', 'meaning_hanzi', 'listening')
+DIRECTION_LABELS = ('Hanzi → Reading', 'Hanzi → Meaning', 'Meaning → Hanzi', 'Listening')
+READING_COLUMNS = (PINYIN, ZHUYIN)
+
+
+def direction_columns(direction, char_col, reading_col):
+    # -> (prompt column, answer column). Listening is keyed on pinyin since
+    # that's what you actually hear, whatever the script.
+    if direction == 'hanzi_meaning':
+        return char_col, MEANING
+    if direction == 'meaning_hanzi':
+        return MEANING, char_col
+    if direction == 'listening':
+        return PINYIN, char_col
+    return char_col, reading_col
+
+
+class CandidateIndex:
+    # One direction over one deck: which rows are worth asking (both sides
+    # filled in, duplicate prompt/answer pairs like the 爱 "to love" row in
+    # both char and vocab only once) plus distractors drawn from the answer
+    # column. Answers that would also be right for the prompt - another
+    # reading of the same hanzi, another word glossed the same, a homophone
+    # when listening - are never offered as distractors.
+    def __init__(self, data, prompt_col, answer_col, strategy='random'):
+        self.prompt_col = prompt_col
+        self.answer_col = answer_col
+        # sound-alike neighbours only make sense between readings
+        if answer_col not in READING_COLUMNS:
+            strategy = 'random'
+        self.distractors = DistractorIndex([row[answer_col] if row is not None else None for row in data], strategy)
+        self.rows = array('I')
+        self.data = data
+        self.pairs = None
+        answers_by_prompt = {}
+        for i, row in enumerate(data):
+            if row is None:
+                continue
+            prompt, answer = row[prompt_col], row[answer_col]
+            if not prompt or not answer:
+                continue
+            answers = answers_by_prompt.get(prompt)
+            if answers is None:
+                answers = answers_by_prompt[prompt] = set()
+            elif answer in answers:
+                continue
+            answers.add(answer)
+            self.rows.append(i)
+        # position -> where it sits in rows, for membership and so dropping
+        # one on a live reload doesn't scan them
+        self.slots = {position: slot for slot, position in enumerate(self.rows)}
+        # only the prompts with more than one right answer need remembering
+        self.also_right = {prompt: answers for prompt, answers in answers_by_prompt.items() if len(answers) > 1}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, position):
+        return position in self.slots
+
+    def track(self):
+        # Which positions hold each prompt/answer pair, only needed once rows
+        # start changing under us (live reload). Call before touching data.
+        if self.pairs is not None:
+            return
+        pairs = {}
+        answers = {}
+        for i, row in enumerate(self.data):
+            if row is None:
+                continue
+            prompt, answer = row[self.prompt_col], row[self.answer_col]
+            if prompt and answer:
+                pairs.setdefault((prompt, answer), []).append(i)
+                answers.setdefault(prompt, set()).add(answer)
+        self.pairs = pairs
+        self.answers = answers
+
+    def add(self, position, row):
+        # data[position] is row already
+        prompt, answer = row[self.prompt_col], row[self.answer_col]
+        self.distractors.add(answer, position)
+        if not prompt or not answer:
+            return
+        positions = self.pairs.get((prompt, answer))
+        if positions:
+            positions.append(position)
+            return
+        self.pairs[(prompt, answer)] = [position]
+        self.slots[position] = len(self.rows)
+        self.rows.append(position)
+        self._set_answers(prompt, answer, True)
+
+    def remove(self, position, row):
+        # row is what used to be at data[position]
+        prompt, answer = row[self.prompt_col], row[self.answer_col]
+        self.distractors.remove(answer, position)
+        positions = self.pairs.get((prompt, answer))
+        if not positions or position not in positions:
+            return
+        positions.remove(position)
+        slot = self.slots.pop(position, None)
+        if slot is None:
+            return
+        if positions:
+            # a duplicate of the pair takes over asking it
+            self.rows[slot] = positions[0]
+            self.slots[positions[0]] = slot
+            return
+        del self.pairs[(prompt, answer)]
+        # the last row fills the hole
+        last = self.rows.pop()
+        if last != position:
+            self.rows[slot] = last
+            self.slots[last] = slot
+        self._set_answers(prompt, answer, False)
+
+    def _set_answers(self, prompt, answer, present):
+        answers = self.answers.setdefault(prompt, set())
+        if present:
+            answers.add(answer)
+        else:
+            answers.discard(answer)
+        if len(answers) > 1:
+            self.also_right[prompt] = answers
+        else:
+            self.also_right.pop(prompt, None)
+            if not answers:
+                del self.answers[prompt]
+
+    def choices(self, row, rng):
+        answer = row[self.answer_col]
+        exclude = self.also_right.get(row[self.prompt_col])
+        return self.distractors.answers(answer, rng, exclude)
@@ -0,0 +1,149 @@
+import random
+from array import array
+from res.pinyin import syllables
+
+STRATEGIES = ('random', 'confusable')
+MAX_NEIGHBOURS = 24
+
+
+def _confusable_neighbours(readings):
+    # Bucket every reading under a few "looks like" keys: same syllables
+    # ignoring tone, and for each syllable position the same shape with
+    # either the initial or the final swapped out. Readings that share a
+    # bucket are neighbours; tone-only neighbours go first.
+    parsed = [syllables(r) for r in readings]
+    toneless = {}
+    loose = {}
+    for i, sylls in enumerate(parsed):
+        if not sylls:
+            continue
+        shape = tuple((ini, fin) for ini, fin, _ in sylls)
+        toneless.setdefault(shape, []).append(i)
+        for pos, (ini, fin) in enumerate(shape):
+            before, after = shape[:pos], shape[pos + 1:]
+            loose.setdefault((before, pos, 'i', fin, after), []).append(i)
+            if fin:
+                loose.setdefault((before, pos, 'f', ini, after), []).append(i)
+
+    neighbours = []
+    for i, sylls in enumerate(parsed):
+        found = []
+        if sylls:
+            shape = tuple((ini, fin) for ini, fin, _ in sylls)
+            seen = {i}
+            buckets = [toneless[shape]]
+            for pos, (ini, fin) in enumerate(shape):
+                before, after = shape[:pos], shape[pos + 1:]
+                buckets.append(loose[(before, pos, 'i', fin, after)])
+                if fin:
+                    buckets.append(loose[(before, pos, 'f', ini, after)])
+            for bucket in buckets:
+                for j in bucket:
+                    if j not in seen:
+                        seen.add(j)
+                        found.append(j)
+                if len(found) >= MAX_NEIGHBOURS:
+                    break
+        neighbours.append(array('I', found[:MAX_NEIGHBOURS]))
+    return neighbours
+
+
+class DistractorIndex:
+    def __init__(self, readings, strategy='random'):
+        # readings: the answer string of every row in the dataset (None for
+        # rows that have gone, empty ones are never offered)
+        self.strategy = strategy if strategy in STRATEGIES else 'random'
+        self.readings = []          # unique readings
+        self.reading_ids = {}       # reading -> index into self.readings
+        self.rows_by_reading = []   # index -> array of row ids with that reading
+        for row_id, reading in enumerate(readings):
+            self.add(reading, row_id)
+        self._neighbours = None
+
+    def add(self, reading, row_id):
+        if not reading:
+            # a blank button isn't a distractor
+            return
+        idx = self.reading_ids.get(reading)
+        if idx is None:
+            idx = self.reading_ids[reading] = len(self.readings)
+            self.readings.append(reading)
+            self.rows_by_reading.append(array('I'))
+            self._neighbours = None
+        self.rows_by_reading[idx].append(row_id)
+
+    def remove(self, reading, row_id):
+        idx = self.reading_ids.get(reading)
+        if idx is None:
+            return
+        rows = self.rows_by_reading[idx]
+        rows.remove(row_id)
+        if rows:
+            return
+        # last row with it gone, move the last reading into its slot
+        last = len(self.readings) - 1
+        if idx != last:
+            moved = self.readings[last]
+            self.readings[idx] = moved
+            self.rows_by_reading[idx] = self.rows_by_reading[last]
+            self.reading_ids[moved] = idx
+        self.readings.pop()
+        self.rows_by_reading.pop()
+        del self.reading_ids[reading]
+        # confusable neighbours go by slot, worked out again when next needed
+        self._neighbours = None
+
+    def __len__(self):
+        return len(self.readings)
+
+    def neighbours(self, reading):
+        if self._neighbours is None:
+            self._neighbours = _confusable_neighbours(self.readings)
+        idx = self.reading_ids.get(reading)
+        if idx is None:
+            return []
+        return [self.readings[j] for j in self._neighbours[idx]]
+
+    def pick(self, answer, count=3, rng=random, exclude=None):
+        # exclude: other answers that would be right too, never picked
+        answer_idx = self.reading_ids.get(answer, -1)
+        readings = self.readings
+        total = len(readings)
+        chosen = [answer_idx]
+        if exclude:
+            chosen.extend(self.reading_ids[r] for r in exclude if r in self.reading_ids and r != answer)
+        others = total - (answer_idx >= 0) - (len(chosen) - 1)
+        if others <= count:
+            rest = [r for i, r in enumerate(readings) if i not in chosen]
+            rng.shuffle(rest)
+            return rest
+
+        picked = []
+        if self.strategy == 'confusable' and answer_idx >= 0:
+            close = self.neighbours(answer)
+            if exclude:
+                close = [r for r in close if r not in exclude]
+            picked = rng.sample(close, min(count, len(close)))
+            chosen.extend(self.reading_ids[r] for r in picked)
+
+        # Rejection sampling, the pool is much bigger than count so this
+        # almost never loops more than a couple of times
+        rand = rng.random
+        while len(picked) < count:
+            i = int(rand() * total)
+            if i not in chosen:
+                chosen.append(i)
+                picked.append(readings[i])
+        return picked
+
+    def answers(self, answer, rng=random, exclude=None):
+        answers = self.pick(answer, 3, rng, exclude)
+        if len(answers) < 3:
+            # tiny custom sets, pad with the answer like before
+            answers += [answer] * (4 - len(answers))
+            rng.shuffle(answers)
+            return answers
+        # picks already come out in random order, so dropping the answer in
+        # at a random slot is as good as a full shuffle
+        answers.insert(int(rng.random() * (len(answers) + 1)), answer)
+        return answers
@@ -0,0 +1,132 @@
+from array import array
+
+# Rows handed out by the store are the six csv columns plus the entry id
+COLUMNS = 6
+ENTRY_ID = 6
+CONTENT_TYPES = ('char', 'vocab')
+HOLE = 255
+
+
+class EntryStore:
+    # Every entry as a set of parallel arrays. Text columns hold indexes into
+    # one string table (a utf-8 blob plus offsets), so each reading, gloss or
+    # audio path is stored once and a cell costs 4 bytes. Row tuples only get
+    # built for whoever asks for them.
+    __slots__ = ('blob', 'offsets', 'columns', 'bands', 'types', '_string_ids', '_parts')
+
+    def __init__(self):
+        self.blob = b''
+        self.offsets = array('I', [0])
+        self.columns = tuple(array('I') for _ in range(COLUMNS))
+        self.bands = array('B')
+        self.types = array('B')
+        self._string_ids = {}
+        self._parts = []
+        self.intern('')
+
+    def __getstate__(self):
+        return self.blob, self.offsets, self.columns, self.bands, self.types
+
+    def __setstate__(self, state):
+        self.blob, self.offsets, self.columns, self.bands, self.types = state
+        self._string_ids = None
+        self._parts = None
+
+    def intern(self, text):
+        index = self._string_ids.get(text)
+        if index is None:
+            data = text.encode('utf-8')
+            self._parts.append(data)
+            index = self._string_ids[text] = len(self.offsets) - 1
+            self.offsets.append(self.offsets[-1] + len(data))
+        return index
+
+    def put(self, entry_id, row, band, content_type):
+        # Ids are handed out elsewhere, gaps become holes
+        self.pad(entry_id + 1)
+        for column, text in zip(self.columns, row):
+            column[entry_id] = self.intern(text)
+        self.bands[entry_id] = band
+        self.types[entry_id] = CONTENT_TYPES.index(content_type)
+
+    def pad(self, size):
+        while len(self.types) < size:
+            for column in self.columns:
+                column.append(0)
+            self.bands.append(0)
+            self.types.append(HOLE)
+
+    def update(self, entry_id, row, band, content_type):
+        # put() for a frozen store (live reloads): cells that didn't change
+        # keep their string, new text goes on the end of the table
+        self.pad(entry_id + 1)
+        live = self.types[entry_id] != HOLE
+        for column, text in zip(self.columns, row):
+            if not live or self.string(column[entry_id]) != text:
+                column[entry_id] = self.append(text)
+        self.bands[entry_id] = band
+        self.types[entry_id] = CONTENT_TYPES.index(content_type)
+
+    def remove(self, entry_id):
+        self.types[entry_id] = HOLE
+
+    def append(self, text):
+        if self._parts is not None:
+            return self.intern(text)
+        if not isinstance(self.blob, bytearray):
+            # copied once, after that strings are appended in place
+            self.blob = bytearray(self.blob)
+        self.blob += text.encode('utf-8')
+        self.offsets.append(len(self.blob))
+        return len(self.offsets) - 2
+
+    def freeze(self):
+        # the lookup table is only needed while filling
+        self.blob = b''.join(self._parts)
+        self._parts = None
+        self._string_ids = None
+
+    def string(self, index):
+        offsets = self.offsets
+        return self.blob[offsets[index]:offsets[index + 1]].decode('utf-8')
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, entry_id):
+        if self.types[entry_id] == HOLE:
+            return None
+        string = self.string
+        return tuple([string(column[entry_id]) for column in self.columns] + [entry_id])
+
+    def __iter__(self):
+        for entry_id in range(len(self.types)):
+            yield self[entry_id]
+
+    def rows(self, ids):
+        # Decode a batch, each distinct string once, so rows share them
+        decoded = {}
+        string = self.string
+        columns = self.columns
+        types = self.types
+        rows = []
+        for entry_id in ids:
+            if types[entry_id] == HOLE:
+                continue
+            row = []
+            for column in columns:
+                index = column[entry_id]
+                text = decoded.get(index)
+                if text is None:
+                    text = decoded[index] = string(index)
+                row.append(text)
+            row.append(entry_id)
+            rows.append(tuple(row))
+        return rows
+
+    def location(self, entry_id):
+        return self.bands[entry_id], CONTENT_TYPES[self.types[entry_id]]
+
+    def nbytes(self):
+        return (len(self.blob) + self.offsets.itemsize * len(self.offsets) + len(self.bands) + len(self.types)
+                + sum(column.itemsize * len(column) for column in self.columns))
@@ -0,0 +1,142 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+from res import metrics
+
+# Tells us when files in a few directories change, from a background
+# thread. Uses inotify on Linux (through ctypes, no extra packages) and
+# falls back to comparing mtimes every so often anywhere else. Bursts of
+# events (an editor's save is usually several) are gathered up and handed
+# to the callback as one set of paths once things go quiet.
+
+DEBOUNCE = 0.3
+POLL_INTERVAL = 2.0
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+EVENT = struct.Struct('iIII')    # wd, mask, cookie, name length
+
+
+class _Inotify:
+    def __init__(self, dirs):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}   # watch descriptor -> directory
+        for directory in dirs:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"can't watch {directory}")
+            self.dirs[wd] = directory
+
+    def wait(self, timeout):
+        # -> paths changed within timeout seconds (maybe none)
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return set()
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name and wd in self.dirs:
+                paths.add(os.path.join(self.dirs[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _Poller:
+    def __init__(self, dirs, interval=POLL_INTERVAL):
+        self.dirs = dirs
+        self.interval = interval
+        self.stop = threading.Event()
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = {}
+        for directory in self.dirs:
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_file():
+                            st = entry.stat()
+                            snapshot[os.path.join(directory, entry.name)] = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                pass
+        return snapshot
+
+    def wait(self, timeout):
+        # the timeout is for inotify, scans just go at their own pace
+        if self.stop.wait(self.interval):
+            return set()
+        snapshot = self.scan()
+        old = self.snapshot
+        self.snapshot = snapshot
+        return {path for path in snapshot.keys() | old.keys() if snapshot.get(path) != old.get(path)}
+
+    def close(self):
+        self.stop.set()
+
+
+class FileWatcher:
+    def __init__(self, dirs, callback, debounce=DEBOUNCE, polling=False, interval=POLL_INTERVAL):
+        # callback(paths) runs on the watcher thread, hop to the UI from there
+        self.dirs = [d for d in dirs if os.path.isdir(d)]
+        self.callback = callback
+        self.debounce = debounce
+        self.source = None
+        if not polling:
+            try:
+                self.source = _Inotify(self.dirs)
+            except (OSError, AttributeError) as e:
+                # not Linux, or out of watches
+                print(f"inotify unavailable ({e}), polling for changes instead")
+        if self.source is None:
+            self.source = _Poller(self.dirs, interval)
+        self.method = 'inotify' if isinstance(self.source, _Inotify) else 'polling'
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name='file-watcher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        pending = set()
+        while self.running:
+            # block until something happens, then keep collecting until it's been quiet a while
+            paths = self.source.wait(self.debounce if pending else 1.0)
+            if not self.running:
+                break
+            if paths:
+                pending |= paths
+                continue
+            if pending:
+                changed, pending = pending, set()
+                metrics.count('file_changes', len(changed))
+                try:
+                    self.callback(changed)
+                except Exception as e:
+                    metrics.error('file_watcher', f"Error handling changed files: {e}")
+
+    def close(self):
+        self.running = False
+        if isinstance(self.source, _Poller):
+            self.source.close()
+        self._thread.join(timeout=2)
+        if isinstance(self.source, _Inotify):
+            self.source.close()
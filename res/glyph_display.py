@@ -0,0 +1,131 @@
+from collections import OrderedDict
+import wx
+from res import metrics
+
+# The big hanzi prompt, drawn from pre-rendered bitmaps. A StaticText with
+# the default font sends every new label through fontconfig fallback and
+# glyph rasterisation (slower the rarer the character), so instead a CJK
+# face is picked once and each label is rendered to a bitmap once, ahead of
+# time where we can. Showing a card is then a blit whatever the character.
+
+# Tried in order, first one installed wins
+CJK_FACES = (
+    'Noto Sans CJK SC', 'Noto Sans SC', 'Source Han Sans SC', 'Source Han Sans CN',
+    'Noto Sans CJK TC', 'Source Han Sans TC', 'WenQuanYi Zen Hei', 'WenQuanYi Micro Hei',
+    'Droid Sans Fallback', 'AR PL UMing CN', 'AR PL UKai CN',
+    'Microsoft YaHei', 'Microsoft JhengHei', 'SimHei', 'SimSun',
+    'PingFang SC', 'Hiragino Sans GB', 'Heiti SC', 'STHeiti',
+)
+# otherwise anything that sounds like it
+CJK_FACE_HINTS = ('CJK', 'Han Sans', 'Han Serif', 'Hei', 'Song', 'Ming', 'Kai')
+GLYPH_CACHE_SIZE = 128
+
+_face = None
+
+
+def cjk_face():
+    # Enumerating faces is slow, so once per process. '' means use the default.
+    global _face
+    if _face is None:
+        with metrics.timer('cjk_font_resolve'):
+            faces = set(wx.FontEnumerator.GetFacenames())
+            _face = next((face for face in CJK_FACES if face in faces), None)
+            if _face is None:
+                _face = next((face for face in sorted(faces) if any(hint in face for hint in CJK_FACE_HINTS)), '')
+        if not _face:
+            metrics.error('cjk_font', "No CJK font found, hanzi may render slowly or as boxes")
+    return _face
+
+
+def cjk_font(size, bold=False):
+    info = wx.FontInfo(size).FaceName(cjk_face())
+    return wx.Font(info.Bold() if bold else info)
+
+
+class GlyphCache:
+    def __init__(self, size=GLYPH_CACHE_SIZE):
+        self.size = size
+        self.bitmaps = OrderedDict()    # (text, font, colours, scale) -> wx.Bitmap
+
+    def get(self, text, font, foreground, background, scale=1.0):
+        key = (text, font.GetNativeFontInfoDesc(), foreground.GetRGBA(), background.GetRGBA(), scale)
+        bitmap = self.bitmaps.get(key)
+        if bitmap is not None:
+            self.bitmaps.move_to_end(key)
+            metrics.count('glyph_cache_hits')
+            return bitmap
+        metrics.count('glyph_cache_misses')
+        with metrics.timer('glyph_render'):
+            bitmap = self.render(text, font, foreground, background, scale)
+        self.bitmaps[key] = bitmap
+        if len(self.bitmaps) > self.size:
+            self.bitmaps.popitem(last=False)
+        return bitmap
+
+    def render(self, text, font, foreground, background, scale):
+        dc = wx.MemoryDC(wx.Bitmap(1, 1))
+        dc.SetFont(font)
+        width, height = dc.GetMultiLineTextExtent(text or ' ')[:2]
+        bitmap = wx.Bitmap()
+        # on HiDPI screens render at device resolution so it isn't upscaled
+        bitmap.CreateScaled(max(width, 1), max(height, 1), -1, scale)
+        dc.SelectObject(bitmap)
+        dc.SetFont(font)
+        dc.SetBackground(wx.Brush(background))
+        dc.Clear()
+        dc.SetTextForeground(foreground)
+        dc.DrawLabel(text, wx.Rect(0, 0, width, height), wx.ALIGN_CENTER)
+        dc.SelectObject(wx.NullBitmap)
+        return bitmap
+
+
+class GlyphDisplay(wx.Window):
+    # Stands in for the prompt StaticText: SetLabel/GetLabel/SetFont work the same
+    def __init__(self, parent, cache=None):
+        super().__init__(parent, style=wx.BORDER_NONE)
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.cache = cache or GlyphCache()
+        self.label = ""
+        self.bitmap = None
+        self.Bind(wx.EVT_PAINT, self.on_paint)
+
+    def bitmap_for(self, text):
+        return self.cache.get(text, self.GetFont(), self.GetForegroundColour(),
+                              self.GetParent().GetBackgroundColour(), self.GetContentScaleFactor())
+
+    def prerender(self, text):
+        # For the next card, while the current one is still up
+        self.bitmap_for(text)
+
+    def SetLabel(self, text):
+        if text == self.label and self.bitmap is not None:
+            return
+        with metrics.timer('glyph_swap'):
+            self.label = text
+            bitmap = self.bitmap_for(text)
+            size = bitmap.GetLogicalSize()
+            if self.bitmap is None or size != self.bitmap.GetLogicalSize():
+                # the parent lays out again after a card change anyway
+                self.SetMinSize(size)
+                self.InvalidateBestSize()
+            self.bitmap = bitmap
+            self.Refresh(eraseBackground=False)
+
+    def GetLabel(self):
+        return self.label
+
+    def SetFont(self, font):
+        result = super().SetFont(font)
+        if self.bitmap is not None:
+            self.bitmap = None
+            self.SetLabel(self.label)
+        return result
+
+    def on_paint(self, event):
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.Brush(self.GetParent().GetBackgroundColour()))
+        dc.Clear()
+        if self.bitmap is not None:
+            width, height = self.GetClientSize()
+            bitmap_width, bitmap_height = self.bitmap.GetLogicalSize()
+            dc.DrawBitmap(self.bitmap, (width - bitmap_width) // 2, (height - bitmap_height) // 2)
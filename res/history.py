@@ -0,0 +1,299 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+from res import metrics, resources
+
+# Every answered card goes into an append-only log in SQLite. The UI only
+# ever puts events on a queue; one writer thread owns the connection, writes
+# them in batches and keeps the per-entry/per-band/confusion tables up to
+# date in the same transaction, so stats never have to scan the log.
+
+HISTORY_PATH = 'history.db'     # under the user dir
+SCHEMA_VERSION = 1
+BATCH_SIZE = 500
+FLUSH_DELAY = 1.0     # seconds an event may wait for company before being written
+WEAKEST_MIN_SEEN = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    entry_id INTEGER NOT NULL,
+    band INTEGER NOT NULL,
+    content_type TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    correct INTEGER NOT NULL,
+    wrong_picks TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entry_stats (
+    entry_id INTEGER PRIMARY KEY,
+    band INTEGER NOT NULL,
+    content_type TEXT NOT NULL,
+    seen INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    wrong INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    last_ts REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS band_stats (
+    band INTEGER NOT NULL,
+    content_type TEXT NOT NULL,
+    seen INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    wrong INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (band, content_type)
+);
+CREATE TABLE IF NOT EXISTS confusions (
+    answer TEXT NOT NULL,
+    picked TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (answer, picked)
+) WITHOUT ROWID;
+"""
+
+_STOP = object()
+
+
+def _aggregate(events):
+    # Fold a batch down to one upsert per row of each summary table
+    entries = {}
+    bands = {}
+    confusions = {}
+    for e in events:
+        correct = 0 if e['wrong_picks'] else 1
+        wrong = len(e['wrong_picks'])
+        stat = entries.get(e['entry_id'])
+        if stat is None:
+            stat = entries[e['entry_id']] = [e['band'], e['content_type'], 0, 0, 0, 0.0, 0.0]
+        stat[2] += 1
+        stat[3] += correct
+        stat[4] += wrong
+        stat[5] += e['seconds']
+        stat[6] = max(stat[6], e['ts'])
+
+        key = (e['band'], e['content_type'])
+        stat = bands.get(key)
+        if stat is None:
+            stat = bands[key] = [0, 0, 0, 0.0]
+        stat[0] += 1
+        stat[1] += correct
+        stat[2] += wrong
+        stat[3] += e['seconds']
+
+        for picked in e['wrong_picks']:
+            pair = (e['answer'], picked)
+            confusions[pair] = confusions.get(pair, 0) + 1
+    return entries, bands, confusions
+
+
+class History:
+    def __init__(self, path=HISTORY_PATH):
+        self.path = resources.user_path(path)
+        self.queue = queue.Queue()
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        # Nothing touches the disk until the first answer
+        with self._lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+                self.thread.start()
+
+    def record(self, entry_id, band, content_type, mode, answer, wrong_picks, seconds, ts=None):
+        self._ensure_thread()
+        self.queue.put({
+            'ts': time.time() if ts is None else ts,
+            'entry_id': entry_id,
+            'band': band,
+            'content_type': content_type,
+            'mode': mode,
+            'answer': answer,
+            'wrong_picks': list(wrong_picks),
+            'seconds': seconds,
+        })
+
+    def request_stats(self, callback, limit=20):
+        # callback(stats) runs on the writer thread after everything queued
+        # before it has been written; GUI callers wrap it in wx.CallAfter
+        self._ensure_thread()
+        self.queue.put(lambda conn: callback(self._stats(conn, limit)))
+
+    def request_entries(self, column, minimum, callback):
+        # callback(entry ids with seen/correct/wrong >= minimum), for building
+        # study sets. Runs on the writer thread like request_stats.
+        if column not in ('seen', 'correct', 'wrong'):
+            raise ValueError(f"can't select entries by {column}")
+
+        def query(conn):
+            found = []
+            try:
+                if conn is not None:
+                    found = [row[0] for row in conn.execute(
+                        f"SELECT entry_id FROM entry_stats WHERE {column} >= ?", (minimum,))]
+            finally:
+                callback(found)
+
+        self._ensure_thread()
+        self.queue.put(query)
+
+    def entries_where(self, column, minimum):
+        # Same, but blocks until the writer thread gets to it - the CLI only,
+        # the UI thread never waits on the disk
+        result = []
+        done = threading.Event()
+
+        def found(ids):
+            result.extend(ids)
+            done.set()
+
+        self.request_entries(column, minimum, found)
+        done.wait()
+        return result
+
+    def flush(self):
+        done = threading.Event()
+        self._ensure_thread()
+        self.queue.put(lambda conn: done.set())
+        done.wait()
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.queue.put(_STOP)
+        self.thread.join()
+        self.thread = None
+
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            conn.executescript(SCHEMA)
+            conn.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+            conn.commit()
+        return conn
+
+    def _run(self):
+        try:
+            conn = self.connect()
+        except Exception as e:
+            metrics.error('history', f"Error opening answer history {self.path}: {e}")
+            conn = None
+        while True:
+            item = self.queue.get()
+            events = []
+            commands = []
+            deadline = time.monotonic() + FLUSH_DELAY
+            while True:
+                if item is _STOP or callable(item):
+                    commands.append(item)
+                    break
+                events.append(item)
+                if len(events) >= BATCH_SIZE:
+                    break
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+
+            if events and conn is not None:
+                self._write(conn, events)
+            for command in commands:
+                if command is _STOP:
+                    if conn is not None:
+                        conn.close()
+                    return
+                try:
+                    command(conn)
+                except Exception as e:
+                    metrics.error('history', f"Error reading answer history: {e}")
+
+    def _write(self, conn, events):
+        entries, bands, confusions = _aggregate(events)
+        try:
+            with metrics.timer('history_write'), conn:
+                conn.executemany(
+                    "INSERT INTO answers (ts, entry_id, band, content_type, mode, answer, correct, wrong_picks, seconds)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(e['ts'], e['entry_id'], e['band'], e['content_type'], e['mode'], e['answer'],
+                      0 if e['wrong_picks'] else 1, json.dumps(e['wrong_picks'], ensure_ascii=False), e['seconds'])
+                     for e in events])
+                self._write_aggregates(conn, entries, bands, confusions)
+            metrics.count('history_events', len(events))
+        except Exception as e:
+            metrics.error('history', f"Error writing answer history: {e}")
+
+    def _write_aggregates(self, conn, entries, bands, confusions):
+        conn.executemany(
+            "INSERT INTO entry_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(entry_id) DO UPDATE SET"
+            " seen = seen + excluded.seen, correct = correct + excluded.correct,"
+            " wrong = wrong + excluded.wrong, seconds = seconds + excluded.seconds,"
+            " last_ts = max(last_ts, excluded.last_ts), band = excluded.band,"
+            " content_type = excluded.content_type",
+            [(entry_id,) + tuple(stat) for entry_id, stat in entries.items()])
+        conn.executemany(
+            "INSERT INTO band_stats VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(band, content_type) DO UPDATE SET"
+            " seen = seen + excluded.seen, correct = correct + excluded.correct,"
+            " wrong = wrong + excluded.wrong, seconds = seconds + excluded.seconds",
+            [key + tuple(stat) for key, stat in bands.items()])
+        conn.executemany(
+            "INSERT INTO confusions VALUES (?, ?, ?) ON CONFLICT(answer, picked) DO UPDATE SET"
+            " count = count + excluded.count",
+            [pair + (n,) for pair, n in confusions.items()])
+
+    def _stats(self, conn, limit):
+        if conn is None:
+            return {'total': 0, 'bands': [], 'weakest': [], 'confusions': []}
+        with metrics.timer('history_stats'):
+            bands = conn.execute(
+                "SELECT band, content_type, seen, correct, wrong, seconds FROM band_stats"
+                " ORDER BY band, content_type").fetchall()
+            # Smoothed accuracy so one unlucky miss doesn't top the list
+            weakest = conn.execute(
+                "SELECT entry_id, band, content_type, seen, correct, wrong, seconds FROM entry_stats"
+                " WHERE seen >= ? ORDER BY (correct + 1.0) / (seen + 2), seconds / seen DESC LIMIT ?",
+                (WEAKEST_MIN_SEEN, limit)).fetchall()
+            confusions = conn.execute(
+                "SELECT answer, picked, count FROM confusions ORDER BY count DESC LIMIT ?", (limit,)).fetchall()
+        return {
+            'total': sum(row[2] for row in bands),
+            'bands': bands,
+            'weakest': weakest,
+            'confusions': confusions,
+        }
+
+    def rebuild(self):
+        # Recompute the summary tables from the log, for when they get out of step
+        done = threading.Event()
+
+        def _rebuild(conn):
+            try:
+                self._rebuild(conn)
+            finally:
+                done.set()
+
+        self.queue.put(_rebuild)
+        self._ensure_thread()
+        done.wait()
+
+    def _rebuild(self, conn):
+        with conn:
+            conn.execute("DELETE FROM entry_stats")
+            conn.execute("DELETE FROM band_stats")
+            conn.execute("DELETE FROM confusions")
+            cursor = conn.execute(
+                "SELECT ts, entry_id, band, content_type, mode, answer, wrong_picks, seconds FROM answers")
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                self._write_aggregates(conn, *_aggregate([
+                    {'ts': r[0], 'entry_id': r[1], 'band': r[2], 'content_type': r[3], 'mode': r[4],
+                     'answer': r[5], 'wrong_picks': json.loads(r[6]), 'seconds': r[7]} for r in rows]))
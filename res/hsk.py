@@ -1,46 +1,83 @@
+import time
+from collections import OrderedDict
 import wx
-import csv
-import random
-import pygame.mixer
-import os
+from res import startup, metrics
+from res.quiz_engine import QuizEngine, ORDER_MODES
+from res.directions import DIRECTIONS
+from res.glyph_display import GlyphDisplay, cjk_font
+from res.config import get_config
+from res.audio_service import AudioService, PRONUNCIATION, FEEDBACK
+from res.typed_answer import EMPTY, ON_TRACK, OFF_TRACK, COMPLETE, TONELESS, NEAR, WRONG_TONE
+
+WRONG_SOUND = 'res/wrong.wav'
+WRAP_CACHE_SIZE = 2048
+MIN_FEEDBACK = 0.5      # seconds a right answer stays up, even if the clip is shorter
+# a gloss won't fit at 72pt, and hanzi answers want bigger buttons
+PROMPT_FONT_SIZES = {'meaning_hanzi': 24}
+BUTTON_FONT_SIZES = {'meaning_hanzi': 28, 'listening': 28}
+LISTEN_LABEL = "♪"
+# answer box background while typing
+PROGRESS_COLOURS = {
+    EMPTY: wx.WHITE,
+    ON_TRACK: wx.WHITE,
+    OFF_TRACK: wx.Colour(255, 220, 220),
+    COMPLETE: wx.Colour(220, 255, 220),
+}
+PARTIAL_NOTES = {
+    TONELESS: "right, but mind the tones",
+    NEAR: "close enough, check the spelling",
+}
 
 class HSKPanel(wx.Panel):
-    def __init__(self, parent, band, content_type, random_mode):
+    def __init__(self, parent, band, content_type, order_mode, history=None, direction=DIRECTIONS[0],
+                 seed=None, recorder=None):
         super().__init__(parent, size=(500, 600))
-        pygame.mixer.init()
-        self.band = band
-        self.content_type = content_type
-        self.random_mode = random_mode
-        self.data = []
-        self.custom_vocab_list = None
-        self.current_index = 0
-        self.current_answer = None
-        self.current_row = None
+        # All sound is played from the audio thread, sounds asked for before
+        # the mixer is up are just skipped
+        self.audio = AudioService(post=wx.CallAfter, on_ready=self._on_audio_ready)
         self.buttons = []
-        self.config = {
-            'characters': 'simplified',
-            'readings': 'pinyin'
-        }
-
-        self.load_config()
+        self.wrapped = OrderedDict()    # (text, width, font size) -> label with line breaks
+        self.feedback_play = None       # id of the clip a right answer is waiting on
+        self.feedback_started = None
+        self.advance_timer = None
+        self.typed_state = None
+        self.config = get_config()
+        self.config.subscribe(self.on_config_changed)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.on_destroy)
+
+        self.engine = QuizEngine(band, content_type, order_mode, self.config.as_dict(), history=history,
+                                 direction=direction, seed=seed, recorder=recorder)
         self.init_ui()
-        self.load_data()
+        self.engine.load_data()
+        startup.mark('load data')
         self.NewQuestion()
 
+    def _on_audio_ready(self, audio):
+        if not self:
+            return
+        audio.prefetch(WRONG_SOUND)
+        if self.engine.question:
+            audio.prefetch(self.engine.question.audio)
+            if self.engine.direction == 'listening':
+                self.play_prompt_sound()
+        startup.mark('audio ready')
+
     def init_ui(self):
         self.SetBackgroundColour(wx.WHITE)
         vbox = wx.BoxSizer(wx.VERTICAL)
 
-        # Hanzi stuff
-        self.char_display = wx.StaticText(self, style=wx.ALIGN_CENTER)
-        font = wx.Font(72, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_BOLD)
-        self.char_display.SetFont(font)
+        # Hanzi stuff, blitted from pre-rendered bitmaps (see glyph_display)
+        self.char_display = GlyphDisplay(self)
 
         # Meaning stuff
         self.meaning_display = wx.StaticText(self, style=wx.ALIGN_CENTER|wx.ST_ELLIPSIZE_END)
         meaning_font = wx.Font(12, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL)
         self.meaning_display.SetFont(meaning_font)
 
+        # with fast advance on, clicking anywhere skips the rest of the clip
+        for window in (self, self.char_display, self.meaning_display):
+            window.Bind(wx.EVT_LEFT_DOWN, self.on_click_anywhere)
+
         # Container shieeet
         text_sizer = wx.BoxSizer(wx.VERTICAL)
         text_sizer.AddStretchSpacer(1)
@@ -56,187 +93,280 @@ class HSKPanel(wx.Panel):
             self.buttons.append(btn)
             grid.Add(btn, 1, wx.EXPAND)
 
+        # Or a box to type the reading into, checked as you go
+        self.answer_entry = wx.TextCtrl(self, style=wx.TE_PROCESS_ENTER|wx.TE_CENTRE)
+        self.answer_entry.SetFont(wx.Font(18, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL))
+        self.answer_entry.Bind(wx.EVT_TEXT, self.on_typing)
+        self.answer_entry.Bind(wx.EVT_TEXT_ENTER, self.on_typed_answer)
+        self.typed_feedback = wx.StaticText(self, style=wx.ALIGN_CENTER)
+        self.typed_feedback.SetFont(meaning_font)
+        typed_sizer = wx.BoxSizer(wx.VERTICAL)
+        typed_sizer.Add(self.answer_entry, 0, wx.EXPAND)
+        typed_sizer.Add(self.typed_feedback, 0, wx.ALIGN_CENTER|wx.TOP, 10)
+
         vbox.Add(text_sizer, 3, wx.EXPAND)
         vbox.Add(grid, 2, wx.EXPAND|wx.ALL, 10)
+        vbox.Add(typed_sizer, 2, wx.EXPAND|wx.ALL, 10)
         self.SetSizer(vbox)
+        self.grid = grid
+        self.typed_sizer = typed_sizer
+        self.apply_direction()
+
+    def apply_direction(self):
+        direction = self.engine.direction
+        self.char_display.SetFont(cjk_font(PROMPT_FONT_SIZES.get(direction, 72), bold=True))
+        size = BUTTON_FONT_SIZES.get(direction)
+        for btn in self.buttons:
+            btn.SetFont(cjk_font(size) if size else wx.NORMAL_FONT)
+        self.apply_answer_mode()
+
+    def apply_answer_mode(self):
+        typed = self.engine.typed
+        sizer = self.GetSizer()
+        sizer.Show(self.grid, not typed)
+        sizer.Show(self.typed_sizer, typed)
+        self.Layout()
 
-    def set_random_mode(self, random_mode):
-        self.random_mode = random_mode
-        self.current_index = 0
+    def set_order_mode(self, order_mode):
+        self.engine.set_order_mode(order_mode)
         self.NewQuestion()
 
+    def set_direction(self, direction):
+        # Keep the card, just ask it the other way round
+        self.cancel_feedback()
+        self.engine.set_direction(direction)
+        self.apply_direction()
+        self.show_question(self.engine.refresh_question())
+
     def update_content(self, band, content_type):
-        self.band = band
-        self.content_type = content_type
-        self.custom_vocab_list = None
-        self.current_index = 0
-        self.load_data()
+        self.engine.set_content(band, content_type)
         self.NewQuestion()
 
     def set_custom_vocab(self, vocab_list):
-        self.custom_vocab_list = vocab_list
-        self.data = vocab_list
-        self.current_index = 0
+        self.engine.set_custom_vocab(vocab_list)
         self.NewQuestion()
 
     def clear_custom_vocab(self):
-        self.custom_vocab_list = None
-        self.current_index = 0
-        self.load_data()
+        self.engine.clear_custom_vocab()
         self.NewQuestion()
 
-    def reload_config(self):
-        self.load_config()
-
-        if self.custom_vocab_list:
-            self.data = self._process_raw_data(self.custom_vocab_list)
+    def apply_change(self, change):
+        # Rows edited on disk, the deck and position carry on
+        if not self.engine.apply_change(change) or self.feedback_play is not None:
+            return
+        if self.engine.question is None:
+            self.NewQuestion()
         else:
-            self.load_data()
-        self.current_index = 0
-        self.NewQuestion()
+            self.show_question(self.engine.question)
+
+    def on_config_changed(self, config, changed):
+        # Settings are just a different view of the same rows, so keep the
+        # deck, custom selection and current card and redraw it
+        self.engine.set_config(config.as_dict())
+        if 'answer_mode' in changed:
+            self.apply_answer_mode()
+        self.show_question(self.engine.refresh_question())
+
+    def on_destroy(self, event):
+        if event.GetEventObject() is self:
+            self.config.unsubscribe(self.on_config_changed)
+            self.audio.close()
+        event.Skip()
 
-    def load_config(self):
-        config_path = 'res/config.txt'
-        try:
-            with open(config_path, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line.startswith('#') or not line:
-                        continue
-                    if '=' in line:
-                        key, value = line.split('=', 1)
-                        key = key.strip().lower()
-                        value = value.strip().strip('"\'')
-                        if key in self.config:
-                            self.config[key] = value.lower()
-        except Exception as e:
-            print(f"Error loading config: {e}, using defaults")
-
-    def load_data(self):
-
-        if self.custom_vocab_list is not None:
-            self.data = self._process_raw_data(self.custom_vocab_list)
-            return
+    def NewQuestion(self):
+        self.cancel_feedback()
+        self.show_question(self.engine.next_question())
 
-        self.data = []
-        filename = os.path.join('res', f'band{self.band}_{self.content_type}.csv')
-
-        try:
-            with open(filename, newline='', encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                raw_csv_data = [row for row in reader]
-
-            self.data = self._process_raw_data(raw_csv_data)
-        except FileNotFoundError:
-            print(f"Data file {filename} not found!")
-            self.data = []
-
-    def _process_raw_data(self, raw_data_rows):
-        processed_entries = []
-        char_col = 0 if self.config['characters'] == 'simplified' else 1
-        reading_col = 2 if self.config['readings'] == 'pinyin' else 3
-
-        for row in raw_data_rows:
-
-            if len(row) >= 6:
-                processed_entries.append((
-                    row[char_col],
-                    row[reading_col],
-                    row[5],
-                    row[4]
-                ))
+    def prepare_next(self):
+        # Runs while the correct clip plays so the swap afterwards is just labels
+        question = self.engine.prepare_next()
+        if question is None:
+            return
+        prompt, hint, labels = self.card_labels(question)
+        self.char_display.prerender(prompt)
+        self.audio.prefetch(question.audio)
+
+    def card_labels(self, question):
+        # -> (prompt, hint, button labels), wrapped to fit
+        direction = question.direction
+        if direction == 'listening':
+            prompt = LISTEN_LABEL
+        elif direction == 'meaning_hanzi':
+            prompt = self.wrap(question.prompt, self.char_display)
+        else:
+            prompt = question.prompt
+        hint = self.wrap(question.hint, self.meaning_display) if question.hint else ""
+        if direction == 'hanzi_meaning':
+            width = self.buttons[0].GetSize().width - 20
+            labels = [self.wrap(choice, self.buttons[0], width) for choice in question.choices]
+        else:
+            labels = question.choices
+        return prompt, hint, labels
+
+    def wrap(self, text, window, width=None):
+        if width is None:
+            width = self.GetSize().width - 40
+        font = window.GetFont()
+        key = (text, width, font.GetPointSize())
+        label = self.wrapped.get(key)
+        if label is not None:
+            self.wrapped.move_to_end(key)
+            metrics.count('wrap_cache_hits')
+            return label
+        metrics.count('wrap_cache_misses')
+        with metrics.timer('text_wrap'):
+            label = self._wrap(text, width, window)
+        self.wrapped[key] = label
+        if len(self.wrapped) > WRAP_CACHE_SIZE:
+            self.wrapped.popitem(last=False)
+        return label
+
+    def _wrap(self, text, width, window):
+        # Same greedy breaking at spaces StaticText.Wrap does, but we keep the result
+        if width <= 0:
+            return text
+        dc = wx.ClientDC(window)
+        dc.SetFont(window.GetFont())
+        lines = []
+        line = ''
+        for word in text.split(' '):
+            candidate = f"{line} {word}" if line else word
+            if line and dc.GetTextExtent(candidate)[0] > width:
+                lines.append(line)
+                line = word
             else:
-                print(f"Warning: Skipping malformed data entry: {row}")
-        return processed_entries
-
+                line = candidate
+        lines.append(line)
+        return '\n'.join(lines)
 
-    def NewQuestion(self):
-        if not self.data:
+    def show_question(self, question):
+        if question is None:
             self.char_display.SetLabel("No data loaded")
             self.meaning_display.SetLabel("")
             for btn in self.buttons:
                 btn.SetLabel("")
                 btn.Disable()
+            self.answer_entry.Disable()
             return
 
-        for btn in self.buttons:
-            btn.SetBackgroundColour(wx.NullColour)
-            btn.Enable()
-
-        if self.random_mode:
-            self.current_row = random.choice(self.data)
-        else:
-            self.current_row = self.data[self.current_index]
-            self.current_index = (self.current_index + 1) % len(self.data)
-
-        self.current_answer = self.current_row[1]
-        self.char_display.SetLabel(self.current_row[0])
-        self.meaning_display.SetLabel(self.current_row[3])
-
-        self.Freeze()
-        max_width = self.GetSize().width - 40
-        self.meaning_display.Wrap(max_width)
-        self.Layout()
-        self.Thaw()
-
-        all_readings = [row[1] for row in self.data]
-
-        if self.random_mode:
-            wrong_answers_pool = list(set(all_readings) - {self.current_answer})
-            if len(wrong_answers_pool) >= 3:
-                answers = random.sample(wrong_answers_pool, 3) + [self.current_answer]
-            else:
-                answers = random.sample(all_readings, min(len(all_readings), 3)) + [self.current_answer]
-                answers = list(set(answers))
-
-            while len(answers) < 4:
-                answers.append(self.current_answer)
-            random.shuffle(answers)
-            answers = answers[:4]
-        else:
-            wrong_answers_pool = list(set(all_readings) - {self.current_answer})
-            if len(wrong_answers_pool) >= 3:
-                answers = random.sample(wrong_answers_pool, 3) + [self.current_answer]
-            else:
-                answers = random.sample(all_readings, min(len(all_readings), 3)) + [self.current_answer]
-                answers = list(set(answers))
-            while len(answers) < 4:
-                answers.append(self.current_answer)
-            random.shuffle(answers)
-            answers = answers[:4]
-
-        for btn, answer in zip(self.buttons, answers):
-            btn.SetLabel(answer)
+        # decode the clip while the user is still thinking
+        self.audio.prefetch(question.audio)
+
+        prompt, hint, labels = self.card_labels(question)
+        with metrics.timer('label_layout'):
+            self.Freeze()
+            self.char_display.SetLabel(prompt)
+            self.meaning_display.SetLabel(hint)
+            for btn, label in zip(self.buttons, labels):
+                btn.SetLabel(label)
+                btn.SetBackgroundColour(wx.NullColour)
+                btn.Enable()
+            if self.engine.typed:
+                self.reset_answer_entry()
+            self.Layout()
+            self.Thaw()
+        if question.direction == 'listening':
+            self.play_prompt_sound()
+
+    def reset_answer_entry(self):
+        # ChangeValue doesn't fire EVT_TEXT
+        self.answer_entry.ChangeValue("")
+        self.answer_entry.SetEditable(True)
+        self.answer_entry.Enable()
+        self.typed_feedback.SetLabel("")
+        self.set_typed_state(EMPTY)
+        self.answer_entry.SetFocus()
+
+    def set_typed_state(self, state):
+        if state == self.typed_state:
+            return
+        self.typed_state = state
+        self.answer_entry.SetBackgroundColour(PROGRESS_COLOURS[state])
+        self.answer_entry.Refresh()
 
     def OnButtonClick(self, event):
+        if self.feedback_play is not None:
+            # only reachable with fast advance, the buttons stay enabled then
+            self.NewQuestion()
+            return
         btn = event.GetEventObject()
-        if btn.GetLabel() == self.current_answer:
+        # labels may be wrapped, go by position
+        choice = self.engine.question.choices[self.buttons.index(btn)]
+        if self.engine.answer(choice):
             btn.SetBackgroundColour(wx.Colour(0, 255, 0))
-            for b in self.buttons:
-                b.Disable()
-
-            sound = self.play_correct_sound()
-            if sound:
-                length = int(sound.get_length() * 1000)
-                wx.CallLater(length, self.NewQuestion)
-            else:
-                wx.CallLater(500, self.NewQuestion)
+            if self.config.get('fast_advance') != 'on':
+                for b in self.buttons:
+                    b.Disable()
+            self.start_feedback()
         else:
             btn.SetBackgroundColour(wx.Colour(255, 0, 0))
             self.play_wrong_sound()
 
-    def play_correct_sound(self):
-        try:
-            sound = pygame.mixer.Sound(self.current_row[2])
-            sound.play()
-            return sound
-        except Exception as e:
-            print(f"Error playing sound: {e}")
-            return None
+    def on_typing(self, event):
+        if self.feedback_play is None:
+            self.set_typed_state(self.engine.typed_progress(self.answer_entry.GetValue()))
+
+    def on_typed_answer(self, event):
+        if self.feedback_play is not None:
+            if self.config.get('fast_advance') == 'on':
+                self.NewQuestion()
+            return
+        text = self.answer_entry.GetValue()
+        if not text.strip():
+            return
+        verdict, reading = self.engine.answer_typed(text)
+        if reading is not None:
+            note = PARTIAL_NOTES.get(verdict)
+            self.typed_feedback.SetLabel(f"{reading} - {note}" if note else reading)
+            self.set_typed_state(COMPLETE)
+            self.answer_entry.SetEditable(False)
+            self.start_feedback()
+        else:
+            self.typed_feedback.SetLabel("Right sounds, wrong tones" if verdict == WRONG_TONE else "Not quite, try again")
+            self.set_typed_state(OFF_TRACK)
+            self.answer_entry.SelectAll()
+            self.play_wrong_sound()
+        self.Layout()
+
+    def start_feedback(self):
+        # Let the clip play out, then move on; the next card gets built meanwhile
+        self.feedback_started = time.monotonic()
+        self.feedback_play = self.audio.play(self.engine.question.audio, PRONUNCIATION, self.on_feedback_done)
+        self.prepare_next()
+
+    def on_feedback_done(self, play_id):
+        if not self or play_id != self.feedback_play or self.advance_timer is not None:
+            return
+        wait = MIN_FEEDBACK - (time.monotonic() - self.feedback_started)
+        if wait > 0:
+            self.advance_timer = wx.CallLater(int(wait * 1000), self.NewQuestion)
+        else:
+            self.NewQuestion()
+
+    def on_click_anywhere(self, event):
+        if self.feedback_play is not None:
+            if self.config.get('fast_advance') == 'on':
+                self.NewQuestion()
+        elif event.GetEventObject() is self.char_display and self.engine.direction == 'listening':
+            # hear it again
+            self.play_prompt_sound()
+        event.Skip()
+
+    def cancel_feedback(self):
+        # The card's changing, so whatever's still playing belongs to the old
+        # one. A late on_feedback_done is ignored by id.
+        self.audio.cancel(PRONUNCIATION)
+        if self.advance_timer is not None:
+            self.advance_timer.Stop()
+        self.advance_timer = None
+        self.feedback_play = None
+
+    def save_progress(self):
+        self.engine.save_progress()
+
+    def play_prompt_sound(self):
+        if self.engine.question is not None:
+            self.audio.play(self.engine.question.audio, PRONUNCIATION)
 
     def play_wrong_sound(self):
-        try:
-            sound = pygame.mixer.Sound('res/wrong.wav')
-            sound.play()
-        except Exception as e:
-            print(f"Error playing wrong sound: {e}")
+        self.audio.play(WRONG_SOUND, FEEDBACK)
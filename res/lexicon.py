@@ -0,0 +1,449 @@
+import csv
+import hashlib
+import os
+import pickle
+import re
+import zlib
+from array import array
+from res import metrics, resources
+from res.entry_store import EntryStore, ENTRY_ID, HOLE  # re-exported, rows carry their id there
+
+DATA_DIR = 'res'              # a resource, see res.resources
+CACHE_PATH = 'lexicon.cache'  # under the user dir
+SEED_CACHE = 'res/lexicon.cache'   # a resource, bundles ship one built from their csvs
+CACHE_VERSION = 3
+# band7_vocab.csv or band7-9_vocab.csv, 7-9 is one block in HSK 3.0
+BAND_FILE_RE = re.compile(r'^band(\d+)(?:-\d+)?_(char|vocab)\.csv$')
+
+# Column layout of every band csv
+SIMPLIFIED, TRADITIONAL, PINYIN, ZHUYIN, MEANING, AUDIO = range(6)
+
+HSK_BANDS = (1, 2, 3, 4, 5, 6, 7)
+ADVANCED_BAND = 7
+ALL_BANDS = 'All bands'
+
+
+def band_label(band):
+    # band is a single band number or a (first, last) pool
+    if isinstance(band, tuple):
+        first, last = band
+        if band == (HSK_BANDS[0], HSK_BANDS[-1]):
+            return ALL_BANDS
+        return f"Bands {first}-{band_label(last).split('-')[-1]}"
+    return '7-9' if band == ADVANCED_BAND else str(band)
+
+
+def band_name(band):
+    # for messages: 'band 3', 'band 7-9', 'Bands 1-6', 'All bands'
+    return band_label(band) if isinstance(band, tuple) else f"band {band_label(band)}"
+
+
+def parse_band(text):
+    # '3', '7-9', '2-4', 'Bands 1-6' or 'All bands' -> 3, 7, (2, 4), (1, 6), (1, 7)
+    text = str(text).strip().lower().replace('\u2013', '-')
+    if text in ('all', ALL_BANDS.lower()):
+        return (HSK_BANDS[0], HSK_BANDS[-1])
+    if text.startswith('bands '):
+        text = text[6:]
+    if text == '7-9':
+        return ADVANCED_BAND
+    first, sep, last = text.partition('-')
+    first = min(int(first), ADVANCED_BAND)
+    if not sep:
+        return first
+    last = min(int(last), ADVANCED_BAND)
+    first, last = min(first, last), max(first, last)
+    return first if first == last else (first, last)
+
+
+def band_choices():
+    # What the band pickers offer: every band, the cumulative pools, everything
+    choices = [(band_label(band), band) for band in HSK_BANDS]
+    for last in HSK_BANDS[1:-1]:
+        choices.append((band_label((HSK_BANDS[0], last)), (HSK_BANDS[0], last)))
+    choices.append((ALL_BANDS, (HSK_BANDS[0], HSK_BANDS[-1])))
+    return choices
+
+
+def _file_hash(path):
+    h = hashlib.sha1()
+    with resources.open_binary(path) as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _parse_csv(path):
+    rows = []
+    with resources.open_text(path) as csvfile:
+        for row in csv.reader(csvfile):
+            if len(row) > 6 and row[-1].startswith('audio/'):
+                # unquoted commas in the meaning, the audio path is still last
+                row = row[:4] + [','.join(row[4:-1]), row[-1]]
+            if len(row) >= 6:
+                rows.append(tuple(row[:6]))
+            else:
+                print(f"Warning: Skipping malformed data entry in {path}: {row}")
+                metrics.count('malformed_rows')
+    return rows
+
+
+def _row_crcs(rows):
+    # a checksum per row, so a reload can tell which rows are untouched
+    # without decoding the old ones
+    return array('I', [zlib.crc32('\x1f'.join(row).encode('utf-8')) for row in rows])
+
+
+class LexiconChange:
+    # What a refresh() did, by entry id. Updated rows kept their id (same
+    # hanzi and reading, something else in the row changed).
+    def __init__(self):
+        self.files = []
+        self.added = array('I')
+        self.updated = array('I')
+        self.removed = array('I')
+
+    def __bool__(self):
+        return bool(self.added or self.updated or self.removed)
+
+    def __len__(self):
+        return len(self.added) + len(self.updated) + len(self.removed)
+
+
+class Lexicon:
+    def __init__(self, data_dir=DATA_DIR, cache_path=CACHE_PATH):
+        self.data_dir = data_dir
+        self.cache_path = resources.user_path(cache_path)
+        self.entries = EntryStore()   # entry id -> row tuple (None for ids whose row went away)
+        self.lists = {}     # (band, content_type) -> array of entry ids
+        self.pools = {}     # ((first, last), content_type) -> deduped array of entry ids
+        self.files = {}     # csv filename -> {'mtime', 'size', 'sha1', 'ids', 'crcs'}
+        self.key_ids = {}   # (type, simplified, pinyin, occurrence) -> entry id, what keeps ids stable
+        self.unsaved = False
+        self.load()
+
+    def load(self):
+        with metrics.timer('data_load'):
+            self._load()
+
+    def _load(self):
+        cached = self._read_cache()
+        dirty = not cached
+        if not cached and len(self.entries):
+            # cache went missing, carry on from what we have so ids don't move
+            cached = {'files': self.files, 'store': self.entries, 'key_ids': self._current_key_ids()}
+        old_files = cached.get('files', {})
+        old_store = cached.get('store')
+        key_ids = cached.get('key_ids', {})
+
+        files = {}
+        parsed = {}
+        for name in self._band_files():
+            path = os.path.join(self.data_dir, name)
+            mtime, size = resources.stat(path)
+            info = old_files.get(name)
+            if info and info['mtime'] == mtime and info['size'] == size:
+                files[name] = info
+                metrics.count('lexicon_cache_hits')
+                continue
+            metrics.count('lexicon_cache_misses')
+
+            # mtime changed, only reparse if the content actually did
+            sha1 = _file_hash(path)
+            if info and info['sha1'] == sha1:
+                info = dict(info, mtime=mtime, size=size)
+            else:
+                info = {'sha1': sha1, 'mtime': mtime, 'size': size}
+                parsed[name] = _parse_csv(path)
+            files[name] = info
+            dirty = True
+
+        if set(files) != set(old_files):
+            dirty = True
+
+        self.key_ids = key_ids
+        if dirty:
+            self._assemble(files, parsed, old_store, key_ids)
+            self._write_cache(key_ids)
+        else:
+            # nothing changed, the cached store is the lexicon
+            self.files = files
+            self.entries = old_store
+            self._index_lists()
+            if cached.get('seed'):
+                self._write_cache(key_ids)
+
+    def refresh(self):
+        # Live reload: only files whose content changed get parsed, and each
+        # is diffed against the rows loaded from it so the cost follows the
+        # edit, not the dataset. -> LexiconChange (false if nothing changed)
+        with metrics.timer('data_refresh'):
+            change = LexiconChange()
+            names = self._band_files()
+            for name in sorted(set(names) | set(self.files)):
+                info = self.files.get(name)
+                if name not in names:
+                    self._apply_file(name, [], None, change)
+                    continue
+                path = os.path.join(self.data_dir, name)
+                try:
+                    mtime, size = resources.stat(path)
+                except FileNotFoundError:
+                    continue
+                if info and info['mtime'] == mtime and info['size'] == size:
+                    continue
+                sha1 = _file_hash(path)
+                info = {'sha1': sha1, 'mtime': mtime, 'size': size}
+                self.unsaved = True
+                if name in self.files and self.files[name]['sha1'] == sha1:
+                    self.files[name] = dict(self.files[name], **info)
+                    continue
+                self._apply_file(name, _parse_csv(path), info, change)
+        return change
+
+    def _apply_file(self, name, rows, info, change):
+        band, content_type = BAND_FILE_RE.match(name).groups()
+        band = int(band)
+        store = self.entries
+        old = self.files.get(name) or {'ids': array('I'), 'crcs': array('I')}
+        old_ids = old['ids']
+        old_crcs = old.get('crcs')
+        crcs = _row_crcs(rows)
+        # Rows before and after the edited stretch are the same as last time,
+        # keep their ids without looking at them
+        start = end = 0
+        if old_crcs is not None:
+            shortest = min(len(crcs), len(old_crcs))
+            while start < shortest and crcs[start] == old_crcs[start]:
+                start += 1
+            while end < shortest - start and crcs[-1 - end] == old_crcs[-1 - end]:
+                end += 1
+        # then pair up the rest by hanzi + reading, in order, the same way ids are keyed
+        old_rows = {}
+        for row in store.rows(old_ids[start:len(old_ids) - end]):
+            old_rows.setdefault((row[SIMPLIFIED], row[PINYIN]), []).append(row)
+        ids = old_ids[:start]
+        for row in rows[start:len(rows) - end]:
+            matches = old_rows.get((row[SIMPLIFIED], row[PINYIN]))
+            if matches:
+                previous = matches.pop(0)
+                entry_id = previous[ENTRY_ID]
+                if previous[:ENTRY_ID] != row:
+                    store.update(entry_id, row, band, content_type)
+                    change.updated.append(entry_id)
+            else:
+                entry_id = self._new_id(content_type, row)
+                store.update(entry_id, row, band, content_type)
+                change.added.append(entry_id)
+            ids.append(entry_id)
+        ids.extend(old_ids[len(old_ids) - end:])
+        for matches in old_rows.values():
+            for row in matches:
+                store.remove(row[ENTRY_ID])
+                change.removed.append(row[ENTRY_ID])
+
+        if info is None:
+            del self.files[name]
+        else:
+            self.files[name] = dict(info, ids=ids, crcs=crcs)
+        change.files.append(name)
+        self.unsaved = True
+        # only the lists this file feeds into
+        lists = [self.files[n]['ids'] for n in sorted(self.files)
+                 if BAND_FILE_RE.match(n).groups() == (str(band), content_type)]
+        if lists:
+            self.lists[(band, content_type)] = array('I', [i for ids in lists for i in ids]) if len(lists) > 1 else lists[0]
+        else:
+            self.lists.pop((band, content_type), None)
+        for key in [key for key in self.pools if key[1] == content_type and key[0][0] <= band <= key[0][1]]:
+            del self.pools[key]
+
+    def _new_id(self, content_type, row):
+        # A row that was here before (deleted, then put back) gets its old id
+        # back, anything else the next free one
+        base = (content_type, row[SIMPLIFIED], row[PINYIN])
+        occurrence = 0
+        while True:
+            key = base + (occurrence,)
+            entry_id = self.key_ids.get(key)
+            if entry_id is None:
+                entry_id = self.key_ids[key] = len(self.entries)
+                return entry_id
+            if entry_id >= len(self.entries) or self.entries.types[entry_id] == HOLE:
+                return entry_id
+            occurrence += 1
+
+    def save(self):
+        # refresh() only patches memory, the cache is written when asked (on exit)
+        if self.unsaved:
+            self._write_cache(self.key_ids)
+            self.unsaved = False
+
+    def _band_files(self):
+        try:
+            names = resources.listdir(self.data_dir)
+        except FileNotFoundError:
+            print(f"Data directory {self.data_dir} not found!")
+            return []
+        return sorted(name for name in names if BAND_FILE_RE.match(name))
+
+    def _assemble(self, files, parsed, old_store, key_ids):
+        # Ids are handed out through key_ids so they stay the same across
+        # rebuilds as long as the row itself is still there
+        next_id = max(key_ids.values(), default=-1) + 1
+        store = EntryStore()
+        store.pad(next_id)
+        seen = {}
+
+        for name, info in files.items():
+            band, content_type = BAND_FILE_RE.match(name).groups()
+            rows = parsed.get(name)
+            if rows is None:
+                # unchanged file, its rows come out of the old store
+                rows = old_store.rows(info['ids'])
+            ids = array('I')
+            for row in rows:
+                # repeated rows get their own id, told apart by occurrence
+                base = (content_type, row[SIMPLIFIED], row[PINYIN])
+                occurrence = seen.get(base, 0)
+                seen[base] = occurrence + 1
+                key = base + (occurrence,)
+
+                entry_id = key_ids.get(key)
+                if entry_id is None:
+                    entry_id = key_ids[key] = next_id
+                    next_id += 1
+                store.put(entry_id, row, int(band), content_type)
+                ids.append(entry_id)
+            files[name] = dict(info, ids=ids, crcs=_row_crcs(rows))
+
+        store.freeze()
+        self.files = files
+        self.entries = store
+        self._index_lists()
+
+    def _index_lists(self):
+        lists = {}
+        for name, info in self.files.items():
+            band, content_type = BAND_FILE_RE.match(name).groups()
+            lists.setdefault((int(band), content_type), array('I')).extend(info['ids'])
+        self.lists = lists
+        self.pools = {}
+
+    def _current_key_ids(self):
+        # Same keys _assemble hands out, rebuilt from the store
+        key_ids = {}
+        seen = {}
+        entry = self.entries.__getitem__
+        for name, info in self.files.items():
+            content_type = BAND_FILE_RE.match(name).group(2)
+            for entry_id in info['ids']:
+                row = entry(entry_id)
+                base = (content_type, row[SIMPLIFIED], row[PINYIN])
+                occurrence = seen.get(base, 0)
+                seen[base] = occurrence + 1
+                key_ids[base + (occurrence,)] = entry_id
+        return key_ids
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path, 'rb') as f:
+                cached = pickle.load(f)
+        except FileNotFoundError:
+            return self._read_seed()
+        except Exception as e:
+            print(f"Ignoring unreadable lexicon cache: {e}")
+            return {}
+
+        if cached.get('version') != CACHE_VERSION or cached.get('data_dir') != resources.locate(self.data_dir):
+            return {}
+        return cached
+
+    def _read_seed(self):
+        # First start from a bundle, which comes with a cache of its own
+        # csvs so nothing has to be parsed. It's copied to the user dir
+        # right away so the next bundle builds on this user's ids.
+        if not resources.bundled() or self.data_dir != DATA_DIR or not resources.exists(SEED_CACHE):
+            return {}
+        try:
+            cached = pickle.loads(resources.read_bytes(SEED_CACHE))
+        except Exception as e:
+            print(f"Ignoring unreadable lexicon cache: {e}")
+            return {}
+        if cached.get('version') != CACHE_VERSION:
+            return {}
+        cached['seed'] = True
+        return cached
+
+    def _write_cache(self, key_ids):
+        # key_ids only lives in the cache, it's just needed to rebuild
+        tmp_path = self.cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({
+                    'version': CACHE_VERSION,
+                    'data_dir': resources.locate(self.data_dir),
+                    'files': self.files,
+                    'store': self.entries,
+                    'key_ids': key_ids,
+                }, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print(f"Error writing lexicon cache: {e}")
+
+    def has(self, band, content_type):
+        if isinstance(band, tuple):
+            first, last = band
+            return any((b, content_type) in self.lists for b in range(first, last + 1))
+        return (band, content_type) in self.lists
+
+    def bands(self):
+        return sorted({band for band, _ in self.lists})
+
+    def ids(self, band, content_type):
+        if isinstance(band, tuple):
+            return self.pool_ids(band, content_type)
+        return self.lists.get((band, content_type), array('I'))
+
+    def pool_ids(self, band_range, content_type):
+        # Every band in the range, each hanzi + reading only once. Built from
+        # the string table indexes, no text compared, and kept for next time.
+        key = (band_range, content_type)
+        ids = self.pools.get(key)
+        if ids is None:
+            first, last = band_range
+            simplified = self.entries.columns[SIMPLIFIED]
+            pinyin = self.entries.columns[PINYIN]
+            seen = set()
+            ids = array('I')
+            for band in range(first, last + 1):
+                for entry_id in self.lists.get((band, content_type), ()):
+                    word = (simplified[entry_id], pinyin[entry_id])
+                    if word not in seen:
+                        seen.add(word)
+                        ids.append(entry_id)
+            self.pools[key] = ids
+        return ids
+
+    def entry(self, entry_id):
+        return self.entries[entry_id]
+
+    def entry_id(self, row):
+        return row[ENTRY_ID]
+
+    def location(self, entry_id):
+        # the band and list an entry came from
+        return self.entries.location(entry_id)
+
+    def rows(self, band, content_type):
+        return self.entries.rows(self.ids(band, content_type))
+
+
+_lexicon = None
+
+
+def get_lexicon():
+    global _lexicon
+    if _lexicon is None:
+        _lexicon = Lexicon()
+    return _lexicon
@@ -0,0 +1,172 @@
+import atexit
+import json
+import threading
+import time
+
+# Opt-in timing and counters for the hot paths. Everything is a no-op until
+# enable() is called, so the instrumented code pays one attribute check.
+
+# Upper bounds in seconds, 1us up to 5s
+BUCKETS = (0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001,
+           0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+enabled = False
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)   # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, value):
+        i = 0
+        for bound in BUCKETS:
+            if value <= bound:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.total += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        # Linear interpolation inside the bucket the rank falls in
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        lower = 0.0
+        for i, n in enumerate(self.counts):
+            upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+            if n and seen + n >= rank:
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+            lower = upper
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'buckets': list(zip(BUCKETS + (float('inf'),), self.counts)),
+        }
+
+
+class _Timer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def enable(dump_path=None):
+    global enabled
+    enabled = True
+    if dump_path:
+        atexit.register(dump, dump_path)
+
+
+def timer(name):
+    return _Timer(name) if enabled else _NULL_TIMER
+
+
+def observe(name, seconds):
+    if not enabled:
+        return
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        hist.record(seconds)
+
+
+def count(name, n=1):
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def error(name, message):
+    # Errors still get printed, but now they are counted too
+    print(message)
+    count(f'errors_{name}')
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def snapshot():
+    with _lock:
+        return {
+            'timestamp': time.time(),
+            'histograms': {name: hist.summary() for name, hist in sorted(_histograms.items())},
+            'counters': dict(sorted(_counters.items())),
+        }
+
+
+def to_json(snap=None):
+    return json.dumps(snap or snapshot(), indent=2, default=str)
+
+
+def to_prometheus(snap=None):
+    snap = snap or snapshot()
+    lines = []
+    for name, hist in snap['histograms'].items():
+        metric = f'hsk_{name}_seconds'
+        lines.append(f'# TYPE {metric} histogram')
+        cumulative = 0
+        for bound, n in hist['buckets']:
+            cumulative += n
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{metric}_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f'{metric}_sum {hist["sum"]}')
+        lines.append(f'{metric}_count {hist["count"]}')
+    for name, value in snap['counters'].items():
+        metric = f'hsk_{name}_total'
+        lines.append(f'# TYPE {metric} counter')
+        lines.append(f'{metric} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def dump(path):
+    text = to_prometheus() if path.endswith(('.prom', '.txt')) else to_json()
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    except Exception as e:
+        print(f"Error writing metrics to {path}: {e}")
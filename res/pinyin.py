@@ -0,0 +1,78 @@
+import re
+import unicodedata
+
+# Tone marked vowel -> (plain vowel, tone)
+TONE_MARKS = {}
+for _plain, _marked in (('a', 'āáǎà'), ('e', 'ēéěè'), ('i', 'īíǐì'), ('o', 'ōóǒò'),
+                        ('u', 'ūúǔù'), ('ü', 'ǖǘǚǜ')):
+    for _tone, _ch in enumerate(_marked, 1):
+        TONE_MARKS[_ch] = (_plain, _tone)
+        TONE_MARKS[_ch.upper()] = (_plain.upper(), _tone)
+
+PINYIN_INITIALS = ('zh', 'ch', 'sh', 'b', 'p', 'm', 'f', 'd', 't', 'n', 'l',
+                   'g', 'k', 'h', 'j', 'q', 'x', 'r', 'z', 'c', 's', 'y', 'w')
+
+ZHUYIN_TONES = {'ˊ': 2, 'ˇ': 3, 'ˋ': 4, '˙': 5}
+# initial, medial, final, tone. The neutral tone dot is allowed on either side.
+ZHUYIN_SYLLABLE_RE = re.compile('(˙?)([ㄅ-ㄙ]?)([ㄧ-ㄩ]?)([ㄚ-ㄦ]?)([ˊˇˋ˙]?)')
+PINYIN_SPLIT_RE = re.compile(r"[\s'’\-]+")
+
+
+def is_zhuyin(reading):
+    return any('ㄅ' <= ch <= 'ㄩ' for ch in reading)
+
+
+def split_tone(syllable):
+    # 'hǎo' -> ('hao', 3), 'ma' -> ('ma', 5), 'hao3' -> ('hao', 3)
+    syllable = unicodedata.normalize('NFC', syllable)
+    if syllable and syllable[-1] in '12345':
+        return syllable[:-1].replace('v', 'ü'), int(syllable[-1])
+    tone = 5
+    plain = []
+    for ch in syllable:
+        mark = TONE_MARKS.get(ch)
+        if mark:
+            ch, tone = mark
+        plain.append(ch)
+    return ''.join(plain).replace('v', 'ü'), tone
+
+
+def pinyin_syllables(reading):
+    return [s for s in PINYIN_SPLIT_RE.split(reading.strip()) if s]
+
+
+def zhuyin_syllables(reading):
+    syllables = []
+    for m in ZHUYIN_SYLLABLE_RE.finditer(reading):
+        if not m.group(0):
+            continue
+        lead, initial, medial, final, tone = m.groups()
+        if not (initial or medial or final):
+            continue
+        tone = ZHUYIN_TONES.get(tone or lead, 1)
+        syllables.append((initial, medial + final, tone))
+    return syllables
+
+
+def split_pinyin_syllable(syllable):
+    base, tone = split_tone(syllable.lower())
+    for initial in PINYIN_INITIALS:
+        if base.startswith(initial) and len(base) > len(initial):
+            return initial, base[len(initial):], tone
+    return '', base, tone
+
+
+def syllables(reading):
+    # Reading -> [(initial, final, tone), ...] for either pinyin or zhuyin
+    if is_zhuyin(reading):
+        return zhuyin_syllables(reading)
+    return [split_pinyin_syllable(s) for s in pinyin_syllables(reading)]
+
+
+def strip_tones(reading):
+    return ' '.join(split_tone(s)[0] for s in pinyin_syllables(reading.lower()))
+
+
+def to_numeric(reading):
+    # 'ài hào' -> 'ai4 hao4', neutral tone is written as 5
+    return ' '.join('%s%d' % split_tone(s) for s in pinyin_syllables(reading.lower()))
@@ -0,0 +1,429 @@
+import random
+import time
+from res.lexicon import get_lexicon, band_name, ENTRY_ID, SIMPLIFIED, TRADITIONAL, PINYIN, ZHUYIN, MEANING, AUDIO
+from res.directions import CandidateIndex, DIRECTIONS, direction_columns
+from res.typed_answer import reading_forms, check, progress, ACCEPTED, PARTIAL
+from res.scheduler import Scheduler
+from res.config import DEFAULTS as DEFAULT_CONFIG
+from res import metrics
+
+ORDER_MODES = ('random', 'sequential', 'srs')
+
+
+class Question:
+    # row is the full lexicon row, hanzi/answer are the parts of it the
+    # current settings show
+    __slots__ = ('row', 'hanzi', 'answer', 'choices', 'direction')
+
+    def __init__(self, row, hanzi, answer, choices, direction='hanzi_reading'):
+        self.row = row
+        self.hanzi = hanzi
+        self.answer = answer
+        self.choices = choices
+        self.direction = direction
+
+    @property
+    def audio(self):
+        return self.row[AUDIO]
+
+    @property
+    def meaning(self):
+        return self.row[MEANING]
+
+    @property
+    def prompt(self):
+        # what the card shows; listening cards only have the clip
+        if self.direction == 'meaning_hanzi':
+            return self.row[MEANING]
+        if self.direction == 'listening':
+            return ''
+        return self.hanzi
+
+    @property
+    def hint(self):
+        # the gloss under the hanzi, unless it gives the answer away
+        return self.row[MEANING] if self.direction == 'hanzi_reading' else ''
+
+    def to_dict(self):
+        return {
+            'direction': self.direction,
+            'hanzi': self.hanzi,
+            'answer': self.answer,
+            'audio': self.row[AUDIO],
+            'meaning': self.row[MEANING],
+            'choices': self.choices,
+        }
+
+
+class QuizEngine:
+    # Everything about a quiz that isn't drawing it: which rows are in play,
+    # which card comes next, the wrong answers and checking clicks.
+    def __init__(self, band=1, content_type='char', order_mode='random', config=None,
+                 lexicon=None, scheduler=None, rng=None, shared_indexes=None, history=None,
+                 direction='hanzi_reading', seed=None, recorder=None):
+        self.band = band
+        self.content_type = content_type
+        self.order_mode = order_mode
+        self.direction = direction if direction in DIRECTIONS else DIRECTIONS[0]
+        self.lexicon = lexicon or get_lexicon()
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        # Every session gets its own seed so a recording of it can be replayed
+        self.seed = random.randrange(1 << 32) if seed is None else seed
+        self.rng = rng or random.Random(self.seed)
+        # replays swap these for the recorded times
+        self.clock = time.monotonic
+        self.wall_clock = time.time
+        self.data = []
+        self._candidates = {}
+        self._homographs = None
+        self._typed = {}
+        self._positions = None
+        # Engines that sit on the same band lists (the server) can share one
+        # set of candidate indexes instead of building their own
+        self.shared_indexes = shared_indexes
+        self.history = history
+        self.custom_vocab_list = None
+        self.current_index = 0
+        self.question = None
+        self.pending = None      # next question, built ahead while feedback plays
+        self.question_start = 0
+        self.wrong_clicks = 0
+        self.wrong_picks = []
+        self.recorder = None
+        self.set_config(config or {})
+        if recorder is not None:
+            self.recorder = recorder
+            recorder.start(self)
+
+    def log(self, event, t=None, **fields):
+        if self.recorder is not None:
+            self.recorder.log(event, self.clock() if t is None else t, fields)
+
+    def set_order_mode(self, order_mode):
+        self.log('order', order=order_mode)
+        self.order_mode = order_mode
+        self.current_index = 0
+        self.pending = None
+
+    def set_direction(self, direction):
+        # Same deck, another pair of columns; indexes for each direction are
+        # kept so flipping back and forth costs nothing after the first time
+        if direction not in DIRECTIONS:
+            return
+        self.log('direction', direction=direction)
+        self.direction = direction
+        self.pending = None
+
+    def set_content(self, band, content_type):
+        self.log('content', band=band, type=content_type)
+        self.band = band
+        self.content_type = content_type
+        self.custom_vocab_list = None
+        self.current_index = 0
+        self._load_data()
+
+    def set_custom_vocab(self, vocab_list):
+        self.log('custom', ids=[self.lexicon.entry_id(row) for row in vocab_list])
+        self.custom_vocab_list = vocab_list
+        self.set_data(vocab_list)
+        self.current_index = 0
+
+    def clear_custom_vocab(self):
+        self.log('clear_custom')
+        self.custom_vocab_list = None
+        self.current_index = 0
+        self._load_data()
+
+    def set_config(self, config):
+        # Rows keep every column, so switching script or reading system just
+        # moves which column we look at - no reload, same deck and position
+        self.log('config', config=config)
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self.char_col = SIMPLIFIED if self.config['characters'] == 'simplified' else TRADITIONAL
+        self.reading_col = PINYIN if self.config['readings'] == 'pinyin' else ZHUYIN
+        if self.pending is not None:
+            self.pending = self.make_question(self.pending.row)
+
+    @property
+    def typed(self):
+        # only readings can be typed, the other directions stay multiple choice
+        return self.config['answer_mode'] == 'typed' and self.direction == 'hanzi_reading'
+
+    @property
+    def candidates(self):
+        prompt_col, answer_col = direction_columns(self.direction, self.char_col, self.reading_col)
+        key = (prompt_col, answer_col, self.config['distractors'])
+        index = self._candidates.get(key)
+        if index is None:
+            shared = self.shared_indexes if self.custom_vocab_list is None else None
+            shared_key = (self.band, self.content_type) + key
+            if shared is not None:
+                index = shared.get(shared_key)
+            if index is None:
+                with metrics.timer('candidate_index'):
+                    index = CandidateIndex(self.data, prompt_col, answer_col, key[2])
+                if shared is not None:
+                    shared[shared_key] = index
+            self._candidates[key] = index
+        return index
+
+    def typed_candidates(self, row):
+        # Every reading a typed answer may match: the card's own plus those of
+        # other entries written the same way (多音字), normalised up front so
+        # a keystroke never re-parses an entry
+        key = row[SIMPLIFIED]
+        candidates = self._typed.get(key)
+        if candidates is None:
+            if self._homographs is None:
+                self._homographs = self._shared('homographs', self._build_homographs)
+            rows = self._homographs.get(key) or [row]
+            candidates = [reading_forms(row[PINYIN], row[ZHUYIN])]
+            for r in rows:
+                forms = reading_forms(r[PINYIN], r[ZHUYIN])
+                if forms not in candidates:
+                    candidates.append(forms)
+            self._typed[key] = candidates
+        return candidates
+
+    def _build_homographs(self):
+        homographs = {}
+        for r in self.data:
+            if r is not None:
+                homographs.setdefault(r[SIMPLIFIED], []).append(r)
+        return homographs
+
+    def _shared(self, kind, build):
+        # What engines on the same band list (the server's) can share besides
+        # candidate indexes: the rows, homographs, typed forms. Built once,
+        # read only after. Custom sets and lone engines keep their own.
+        shared = self.shared_indexes if self.custom_vocab_list is None else None
+        if shared is None:
+            return build()
+        key = (kind, self.band, self.content_type)
+        value = shared.get(key)
+        if value is None:
+            value = shared[key] = build()
+        return value
+
+    def load_data(self):
+        self.log('load')
+        self._load_data()
+
+    def _load_data(self):
+        if self.custom_vocab_list is not None:
+            self.set_data(self.custom_vocab_list)
+            return
+
+        if not self.lexicon.has(self.band, self.content_type):
+            print(f"No {self.content_type} data for {band_name(self.band)}!")
+            self.set_data([])
+            return
+
+        if self.shared_indexes is not None:
+            # nothing patches a shared list (apply_change starts over), so
+            # every engine on the band can read the same one
+            self.set_data(self._shared('rows', lambda: self.lexicon.rows(self.band, self.content_type)), copy=False)
+            return
+        self.set_data(self.lexicon.rows(self.band, self.content_type))
+
+    def set_data(self, entries, copy=True):
+        with metrics.timer('projection'):
+            # our own list, live reloads patch it in place
+            self.data = list(entries) if copy else entries
+            self._candidates = {}
+            self._homographs = None
+            self._typed = self._shared('typed', dict) if not copy else {}
+            self._positions = None
+            self.pending = None
+            self.scheduler.set_deck(self.data)
+
+    def apply_change(self, change):
+        # Rows edited on disk (see Lexicon.refresh): patch the deck, every
+        # index built over it and the SRS heap for just those rows. Positions
+        # in data never move, removed rows are left as None.
+        # -> True if the card on screen changed (redrawn from the new row) or
+        # went away (question is None).
+        self.log('reload', added=len(change.added), updated=len(change.updated), removed=len(change.removed))
+        if self.shared_indexes is not None:
+            # the indexes belong to every engine on the band, start over
+            self.shared_indexes.clear()
+            self._load_data()
+            return True
+        with metrics.timer('apply_change'):
+            entries = self.lexicon.entries
+            if self._positions is None:
+                self._positions = {row[ENTRY_ID]: pos for pos, row in enumerate(self.data) if row is not None}
+            positions = self._positions
+            indexes = list(self._candidates.values())
+            for index in indexes:
+                index.track()
+
+            for entry_id in change.removed:
+                pos = positions.pop(entry_id, None)
+                if pos is not None:
+                    self._replace(pos, None, indexes)
+            for entry_id in change.updated:
+                pos = positions.get(entry_id)
+                if pos is not None:
+                    self._replace(pos, entries[entry_id], indexes)
+            if self.custom_vocab_list is None:
+                # new rows join if they're in the band(s) we're drilling
+                first, last = self.band if isinstance(self.band, tuple) else (self.band, self.band)
+                for entry_id in change.added:
+                    band, content_type = self.lexicon.location(entry_id)
+                    if content_type == self.content_type and first <= band <= last:
+                        pos = positions[entry_id] = len(self.data)
+                        self.data.append(None)
+                        self._replace(pos, entries[entry_id], indexes)
+                        self.scheduler.add(pos)
+            else:
+                self.custom_vocab_list = [row for row in self.data if row is not None]
+            # the indexes changed in place, parked cards may be askable now
+            self.scheduler.unpark()
+
+            changed = set(change.updated)
+            changed.update(change.removed)
+            if self.pending is not None and self.pending.row[ENTRY_ID] in changed:
+                self.pending = None
+            if self.question is None or self.question.row[ENTRY_ID] not in changed:
+                return False
+            pos = positions.get(self.question.row[ENTRY_ID])
+            self.question = None if pos is None else self.make_question(self.data[pos])
+            return True
+
+    def _replace(self, pos, row, indexes):
+        old = self.data[pos]
+        self.data[pos] = row
+        for index in indexes:
+            if old is not None:
+                index.remove(pos, old)
+            if row is not None:
+                index.add(pos, row)
+        # typed answers are worked out per hanzi, forget the ones involved
+        for r in (old, row):
+            if r is not None:
+                self._typed.pop(r[SIMPLIFIED], None)
+                if self._homographs is not None:
+                    same = self._homographs.setdefault(r[SIMPLIFIED], [])
+                    if r is old:
+                        same.remove(r)
+                    else:
+                        same.append(r)
+
+    def pick_row(self):
+        if self.order_mode == 'srs':
+            # only what the direction can ask, same as the other orders
+            return self.scheduler.next(self.candidates)
+        rows = self.candidates.rows
+        if not rows:
+            return None
+        if self.order_mode == 'random':
+            return self.data[rows[int(self.rng.random() * len(rows))]]
+        position = self.current_index % len(rows)
+        self.current_index = position + 1
+        return self.data[rows[position]]
+
+    def next_question(self):
+        if not self.data:
+            self.question = None
+            return None
+
+        if self.pending is not None:
+            self.question, self.pending = self.pending, None
+        else:
+            row = self.pick_row()
+            if row is None:
+                self.question = None
+                return None
+            self.question = self.make_question(row)
+        self.wrong_clicks = 0
+        self.wrong_picks = []
+        self.question_start = self.clock()
+        self.log('next', question=self.question)
+        return self.question
+
+    def prepare_next(self):
+        # Build the next question now so next_question() is just a swap
+        if self.pending is None and self.data:
+            row = self.pick_row()
+            if row is not None:
+                self.pending = self.make_question(row)
+                self.log('prepare', question=self.pending)
+        return self.pending
+
+    def make_question(self, row):
+        candidates = self.candidates
+        answer = row[candidates.answer_col]
+        if self.typed:
+            # nothing to pick from, get the typed forms ready instead
+            self.typed_candidates(row)
+            return Question(row, row[self.char_col], answer, [], self.direction)
+        with metrics.timer('distractors'):
+            choices = candidates.choices(row, self.rng)
+        return Question(row, row[self.char_col], answer, choices, self.direction)
+
+    def refresh_question(self):
+        # Same card, redrawn for the current settings
+        if self.question is None:
+            return self.next_question()
+        self.question = self.make_question(self.question.row)
+        self.log('refresh', question=self.question)
+        return self.question
+
+    def answer(self, choice):
+        # True when choice is right; the card only gets graded on the right one
+        if self.question is None:
+            return False
+        now = self.clock()
+        correct = choice == self.question.answer
+        self.log('answer', now, choice=choice, correct=correct)
+        if not correct:
+            self.wrong_clicks += 1
+            self.wrong_picks.append(choice)
+            return False
+        self.grade(now)
+        return True
+
+    def typed_progress(self, text):
+        # Live feedback for the answer box, cheap enough for every keystroke
+        if self.question is None:
+            return None
+        with metrics.timer('typed_progress'):
+            return progress(text, self.typed_candidates(self.question.row))
+
+    def answer_typed(self, text):
+        # -> (verdict, reading it matched). Toneless or near-miss answers pass
+        # with partial credit, anything else counts as a wrong pick.
+        if self.question is None:
+            return None, None
+        now = self.clock()
+        with metrics.timer('typed_check'):
+            verdict, forms = check(text, self.typed_candidates(self.question.row))
+        self.log('typed', now, text=text, verdict=verdict)
+        if verdict not in ACCEPTED:
+            self.wrong_clicks += 1
+            self.wrong_picks.append(text.strip())
+            return verdict, None
+        self.grade(now, partial=verdict in PARTIAL)
+        return verdict, forms.readings[0 if self.reading_col == PINYIN else 1]
+
+    def grade(self, now, partial=False):
+        seconds = now - self.question_start
+        self.scheduler.review(self.question.row, self.wrong_clicks, seconds, now=self.wall_clock(), partial=partial)
+        if self.history is not None:
+            self.record_answer(seconds)
+
+    def record_answer(self, seconds):
+        # Logged under the entry's own band, custom sets mix bands
+        entry_id = self.lexicon.entry_id(self.question.row)
+        band, content_type = self.lexicon.location(entry_id)
+        mode = self.order_mode
+        if self.direction != 'hanzi_reading':
+            mode += '/' + self.direction
+        if self.typed:
+            mode += '/typed'
+        self.history.record(entry_id, band, content_type, mode, self.question.answer,
+                            self.wrong_picks, seconds)
+
+    def save_progress(self):
+        self.scheduler.save()
@@ -0,0 +1,201 @@
+import io
+import json
+import mmap
+import os
+import posixpath
+import sys
+import threading
+import zipimport
+
+# The app's own files (band csvs, clips, icon, the shipped config) found
+# relative to the code instead of the working directory, so it runs from
+# anywhere: a checkout, or a single zipapp built by res.bundle. Inside a
+# bundle nothing gets extracted, a file is read straight out of the archive
+# the first time something asks for it.
+#
+# Names are relative with forward slashes ('res/band1_char.csv', the
+# 'audio/...' paths from the csvs). Absolute paths are plain files and go
+# straight to the filesystem.
+#
+# Anything the app writes (config, progress, history, caches) lives under
+# user_dir(): res/ in a writable checkout like it always has, the usual
+# per-user place otherwise. HSK_ROOT points at another tree to run from,
+# HSK_USER_DIR somewhere else to keep user files.
+
+APP_NAME = 'HSK-3.0'
+# The checkout, or the archive itself when running bundled
+CODE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Written by res.bundle: name -> [offset in the archive, size, mtime in ns]
+# for every data file, all stored uncompressed. Directories listed under
+# 'lazy' have their own index, only read when something in them is.
+MANIFEST = 'bundle.json'
+
+_root = None
+_bundle = None       # zipimporter for the root when it's a bundle
+_files = None        # the manifest's index, plus lazy ones once loaded
+_lazy = None         # directory -> index member not loaded yet
+_lock = threading.Lock()
+_user_dir = None
+
+
+def set_root(path):
+    # Where resources come from from now on, a directory or a bundle
+    global _root, _bundle, _files, _lazy, _user_dir
+    _root = os.path.abspath(path)
+    _bundle = _files = _lazy = _user_dir = None
+    if os.path.isfile(_root):
+        # zipimport already has the archive's directory if the code came from it
+        _bundle = zipimport.zipimporter(_root)
+        try:
+            manifest = json.loads(_bundle.get_data(MANIFEST))
+        except OSError:
+            raise ValueError(f"{_root} wasn't built by res.bundle") from None
+        _files = manifest['files']
+        _lazy = manifest['lazy']
+
+
+def root():
+    if _root is None:
+        set_root(os.environ.get('HSK_ROOT') or CODE_ROOT)
+    return _root
+
+
+def bundled():
+    root()
+    return _bundle is not None
+
+
+def _member(name):
+    return posixpath.normpath(name.replace(os.sep, '/'))
+
+
+def locate(name):
+    # Somewhere to say a resource is, for messages and cache keys
+    if os.path.isabs(name):
+        return name
+    return os.path.join(root(), _member(name))
+
+
+def path(name):
+    # -> a real file path, or None for things only inside the bundle
+    if os.path.isabs(name) or not bundled():
+        return locate(name)
+    return None
+
+
+def _load_lazy(directory):
+    if directory in _lazy:
+        with _lock:
+            index = _lazy.get(directory)
+            if index is not None:
+                _files.update(json.loads(_bundle.get_data(index)))
+                del _lazy[directory]
+
+
+def _entry(name):
+    member = _member(name)
+    if member not in _files:
+        _load_lazy(member.partition('/')[0])
+    entry = _files.get(member)
+    if entry is None:
+        raise FileNotFoundError(f"{name} not in {_root}")
+    return entry
+
+
+def read_bytes(name):
+    local = path(name)
+    if local is not None:
+        with open(local, 'rb') as f:
+            return f.read()
+    offset, size, _ = _entry(name)
+    with open(_root, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def open_binary(name):
+    local = path(name)
+    if local is not None:
+        return open(local, 'rb')
+    return io.BytesIO(read_bytes(name))
+
+
+def open_text(name):
+    return io.TextIOWrapper(open_binary(name), encoding='utf-8', newline='')
+
+
+def exists(name):
+    local = path(name)
+    if local is not None:
+        return os.path.exists(local)
+    try:
+        _entry(name)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def listdir(name):
+    local = path(name)
+    if local is not None:
+        return os.listdir(local)
+    directory = _member(name)
+    _load_lazy(directory)
+    prefix = directory + '/'
+    names = [member[len(prefix):] for member in _files if member.startswith(prefix)]
+    if not names:
+        raise FileNotFoundError(f"{name} not in {_root}")
+    return [base for base in names if '/' not in base]
+
+
+def stat(name):
+    # -> (mtime in ns, size)
+    local = path(name)
+    if local is not None:
+        st = os.stat(local)
+        return st.st_mtime_ns, st.st_size
+    offset, size, mtime = _entry(name)
+    return mtime, size
+
+
+def map_resource(name):
+    # -> (read only mmap, offset of the resource in it), for files that get
+    # read in place (the audio pack)
+    local = path(name)
+    if local is not None:
+        with open(local, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), 0
+    offset, size, _ = _entry(name)
+    # mmap offsets have to be page aligned
+    aligned = offset - offset % mmap.ALLOCATIONGRANULARITY
+    with open(_root, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), offset - aligned + size, access=mmap.ACCESS_READ, offset=aligned)
+    return mapped, offset - aligned
+
+
+def _platform_dir():
+    if sys.platform == 'win32':
+        base = os.environ.get('APPDATA') or os.path.expanduser(os.path.join('~', 'AppData', 'Roaming'))
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser(os.path.join('~', 'Library', 'Application Support'))
+    else:
+        base = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser(os.path.join('~', '.config'))
+    return os.path.join(base, APP_NAME)
+
+
+def user_dir():
+    global _user_dir
+    if _user_dir is None:
+        directory = os.environ.get('HSK_USER_DIR')
+        if not directory:
+            local = path('res')
+            # a bundle can't be written to, neither can a read-only install
+            directory = local if local and os.access(local, os.W_OK) else _platform_dir()
+        os.makedirs(directory, exist_ok=True)
+        _user_dir = directory
+    return _user_dir
+
+
+def user_path(name):
+    # Absolute paths are left alone
+    return os.path.join(user_dir(), name)
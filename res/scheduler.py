@@ -0,0 +1,198 @@
+import heapq
+import json
+import os
+import time
+from res import resources
+from res.lexicon import get_lexicon, AUDIO, MEANING, ENTRY_ID
+
+STATE_PATH = 'srs_state.json'   # under the user dir
+SAVE_EVERY = 10
+DAY = 24 * 60 * 60
+RELEARN_DELAY = 60   # failed cards come back a minute later
+MIN_EASE = 1.3
+
+
+def card_key(row):
+    # The entry id: it survives fixing the row on disk, and char and vocab
+    # rows for the same word are separate cards. Strings, for json.
+    return str(row[ENTRY_ID])
+
+
+def migrate_cards(cards, lexicon=None):
+    # State files from before entry ids keyed cards on audio|meaning, which
+    # char and vocab rows shared. Each old card goes to every row it matched,
+    # ones for rows that are gone are dropped. -> cards, as they were if
+    # there was nothing to do
+    if not any('|' in key for key in cards):
+        return cards
+    old = {key: card for key, card in cards.items() if '|' in key}
+    migrated = {key: card for key, card in cards.items() if '|' not in key}
+    for row in (lexicon or get_lexicon()).entries:
+        if row is not None:
+            card = old.get(f"{row[AUDIO]}|{row[MEANING]}")
+            if card is not None:
+                migrated.setdefault(card_key(row), dict(card))
+    return migrated
+
+
+def answer_quality(wrong_clicks, seconds, partial=False):
+    # Map a multiple choice result onto the SM-2 0-5 grade
+    if wrong_clicks == 0:
+        if partial:
+            # typed without tones or with a typo: a pass, just barely
+            return 3
+        if seconds < 4:
+            return 5
+        return 4 if seconds < 10 else 3
+    return 2 if wrong_clicks == 1 else 1
+
+
+class Scheduler:
+    # SM-2 spaced repetition. Cards of the current deck sit in a heap keyed
+    # by due time so picking the next one is O(log n).
+    def __init__(self, path=STATE_PATH):
+        self.path = path and resources.user_path(path)
+        self.cards = {}     # card key -> {'ease', 'interval', 'reps', 'lapses', 'due'}
+        self.deck = []
+        self.heap = []      # (due, deck position)
+        self.parked = []    # heap entries the current direction can't ask
+        self.usable = None
+        self.current = None
+        self.last = None
+        self.unsaved = 0
+        self.load()
+
+    def set_deck(self, rows):
+        self.deck = rows
+        self.current = None
+        self.last = None
+        self.parked = []
+        self.usable = None
+        # built when a card is first asked for, decks drilled in another
+        # order never need one
+        self.heap = None
+
+    def _build_heap(self):
+        # unseen cards are due now, in deck order
+        self.heap = [(self._due(row), pos) for pos, row in enumerate(self.deck) if row is not None]
+        heapq.heapify(self.heap)
+
+    def unpark(self):
+        # which positions are usable changed, give the parked cards another go
+        if self.parked:
+            self.heap.extend(self.parked)
+            heapq.heapify(self.heap)
+            self.parked = []
+
+    def add(self, pos):
+        # a row appended to the deck (live reload). Removed ones are left as
+        # None in the deck and dropped when they come up.
+        if self.heap is None:
+            return
+        heapq.heappush(self.heap, (self._due(self.deck[pos]), pos))
+
+    def _due(self, row):
+        card = self.cards.get(card_key(row))
+        return card['due'] if card else 0
+
+    def _top(self, usable):
+        # drop gone rows off the top of the heap and park the ones that can't
+        # be asked right now -> False once it's empty
+        deck = self.deck
+        heap = self.heap
+        while heap:
+            pos = heap[0][1]
+            if deck[pos] is None:
+                heapq.heappop(heap)
+            elif usable is not None and pos not in usable:
+                self.parked.append(heapq.heappop(heap))
+            else:
+                return True
+        return False
+
+    def next(self, usable=None):
+        # usable: the deck positions that may be asked (a CandidateIndex),
+        # None for all of them
+        if not self.deck:
+            return None
+        if self.heap is None:
+            self._build_heap()
+        if usable is not self.usable:
+            self.unpark()
+            self.usable = usable
+        # a card that was shown but never answered goes back in
+        if self.current is not None and self.deck[self.current] is not None:
+            heapq.heappush(self.heap, (self._due(self.deck[self.current]), self.current))
+        self.current = None
+
+        heap = self.heap
+        if not self._top(usable):
+            return None
+        due, pos = heapq.heappop(heap)
+        # try not to show the same card twice in a row
+        while pos == self.last and self._top(usable):
+            due, pos = heapq.heapreplace(heap, (due, pos))
+        self.current = pos
+        self.last = pos
+        return self.deck[pos]
+
+    def review(self, row, wrong_clicks, seconds, now=None, partial=False):
+        now = time.time() if now is None else now
+        key = card_key(row)
+        card = self.cards.get(key)
+        if card is None:
+            card = self.cards[key] = {'ease': 2.5, 'interval': 0, 'reps': 0, 'lapses': 0, 'due': 0}
+
+        quality = answer_quality(wrong_clicks, seconds, partial)
+        if quality < 3:
+            card['reps'] = 0
+            card['lapses'] += 1
+            card['interval'] = 0
+            card['due'] = now + RELEARN_DELAY
+        else:
+            card['reps'] += 1
+            if card['reps'] == 1:
+                card['interval'] = 1
+            elif card['reps'] == 2:
+                card['interval'] = 6
+            else:
+                card['interval'] = round(card['interval'] * card['ease'])
+            card['due'] = now + card['interval'] * DAY
+        card['ease'] = max(MIN_EASE, card['ease'] + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+        if self.current is not None and self.deck[self.current] is row:
+            heapq.heappush(self.heap, (card['due'], self.current))
+            self.current = None
+
+        self.unsaved += 1
+        if self.unsaved >= SAVE_EVERY:
+            self.save()
+        return card
+
+    def load(self):
+        # path None keeps everything in memory (batch runs, tests)
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                cards = json.load(f)
+            self.cards = migrate_cards(cards)
+            if self.cards is not cards:
+                self.save()
+        except FileNotFoundError:
+            self.cards = {}
+        except Exception as e:
+            print(f"Error loading scheduler state: {e}, starting fresh")
+            self.cards = {}
+
+    def save(self):
+        if self.path is None:
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.cards, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self.unsaved = 0
+        except Exception as e:
+            print(f"Error saving scheduler state: {e}")
@@ -0,0 +1,143 @@
+import threading
+import unicodedata
+from array import array
+from res.lexicon import get_lexicon, SIMPLIFIED, TRADITIONAL, PINYIN, ZHUYIN, MEANING
+from res.pinyin import strip_tones, to_numeric
+
+GRAM = 3
+SEP = '\x00'
+
+
+def normalise(text):
+    return unicodedata.normalize('NFC', text).lower().strip()
+
+
+def search_keys(entry):
+    pinyin = normalise(entry[PINYIN])
+    toneless = strip_tones(pinyin)
+    numeric = to_numeric(pinyin)
+    return (
+        entry[SIMPLIFIED],
+        entry[TRADITIONAL],
+        pinyin,
+        toneless,
+        toneless.replace(' ', ''),
+        numeric,
+        numeric.replace(' ', ''),
+        entry[ZHUYIN],
+        normalise(entry[MEANING]),
+    )
+
+
+def _grams(haystack):
+    grams = set()
+    for key in haystack.split(SEP):
+        for n in range(1, GRAM + 1):
+            for i in range(len(key) - n + 1):
+                grams.add(key[i:i + n])
+    return grams
+
+
+class SearchIndex:
+    # n-gram index (every 1..3 char gram of every search key) over a set of
+    # lexicon entries. Lookups intersect the rarest grams of the query and
+    # then confirm with a plain substring check.
+    def __init__(self, lexicon, ids):
+        # an ordered set: listing keeps band order, dropping one is O(1)
+        self.ids = dict.fromkeys(ids)
+        self.haystacks = {}
+        self.postings = {}
+        # entry id -> grams whose postings still hold it after it was removed
+        # or changed, see remove()
+        self.stale = {}
+        for entry_id, entry in zip(self.ids, lexicon.entries.rows(list(self.ids))):
+            self.add(entry_id, entry)
+
+    def add(self, entry_id, entry):
+        haystack = SEP.join(search_keys(entry))
+        self.haystacks[entry_id] = haystack
+        postings = self.postings
+        posted = self.stale.get(entry_id, ())
+        for gram in _grams(haystack):
+            if gram in posted:
+                continue
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array('I')
+            posting.append(entry_id)
+
+    def remove(self, entry_id):
+        # Postings of common grams hold most of the index, taking the id out
+        # of each would be a scan per gram. It's left in them instead: with no
+        # haystack search() drops it, and after a change the substring check
+        # does. Remembering where it was keeps it from going in twice.
+        haystack = self.haystacks.pop(entry_id, None)
+        if haystack is None:
+            return
+        self.stale.setdefault(entry_id, set()).update(_grams(haystack))
+
+    def _candidates(self, query):
+        n = min(GRAM, len(query))
+        lists = []
+        for i in range(len(query) - n + 1):
+            posting = self.postings.get(query[i:i + n])
+            if posting is None:
+                return []
+            lists.append(posting)
+        lists.sort(key=len)
+        if len(lists) == 1 or len(lists[0]) < 64:
+            return lists[0]
+        return sorted(set(lists[0]).intersection(lists[1]))
+
+    def search(self, query):
+        query = normalise(query)
+        if not query:
+            return list(self.ids)
+        haystacks = self.haystacks
+        return [i for i in self._candidates(query) if query in haystacks.get(i, '')]
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_search_index(content_type):
+    with _lock:
+        index = _indexes.get(content_type)
+        if index is None:
+            lexicon = get_lexicon()
+            ids = []
+            for band in lexicon.bands():
+                ids.extend(lexicon.ids(band, content_type))
+            index = _indexes[content_type] = SearchIndex(lexicon, ids)
+        return index
+
+
+def apply_change(change):
+    # Live reload: only the entries that changed are re-indexed, and only in
+    # indexes already built (the others will read the new lexicon anyway)
+    lexicon = get_lexicon()
+    with _lock:
+        for entry_id in change.removed:
+            for index in _indexes.values():
+                if entry_id in index.haystacks:
+                    index.remove(entry_id)
+                    del index.ids[entry_id]
+        for entry_id in change.updated:
+            for index in _indexes.values():
+                if entry_id in index.haystacks:
+                    index.remove(entry_id)
+                    index.add(entry_id, lexicon.entry(entry_id))
+        for entry_id in change.added:
+            index = _indexes.get(lexicon.location(entry_id)[1])
+            if index is not None:
+                index.ids[entry_id] = None
+                index.add(entry_id, lexicon.entry(entry_id))
+
+
+def warm_search_indexes():
+    # Build both indexes off the UI thread so the dialog opens straight away
+    def build():
+        for content_type in ('char', 'vocab'):
+            get_search_index(content_type)
+    threading.Thread(target=build, name='search-index', daemon=True).start()
@@ -0,0 +1,554 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import mimetypes
+import secrets
+import struct
+import time
+from urllib.parse import urlsplit, parse_qs, unquote
+from res.lexicon import (get_lexicon, band_choices, parse_band, SIMPLIFIED, TRADITIONAL, PINYIN, ZHUYIN,
+                         MEANING, AUDIO, ENTRY_ID)
+from res.quiz_engine import QuizEngine, ORDER_MODES
+from res.directions import CandidateIndex, DIRECTIONS, DIRECTION_LABELS
+from res.scheduler import Scheduler
+from res.audio_pack import open_pack
+from res.websocket import WebSocket, ConnectionClosed, accept_key
+from res import metrics, resources
+
+# Classroom mode: one process holds the lexicon, the distractor indexes and
+# the audio once, and every learner is just a QuizEngine with an in-memory
+# scheduler. Sessions are driven over a WebSocket (/ws) or plain JSON POSTs
+# (/api/session/...), both go through QuizServer.handle_op.
+
+WRONG_SOUND = 'res/wrong.wav'
+SESSION_TTL = 30 * 60
+EXPIRE_EVERY = 60
+MAX_BODY = 1 << 20
+CLIP_MAX_AGE = 365 * 24 * 3600
+
+CONTENT_TYPES = ('char', 'vocab')
+OPTION_CHOICES = {
+    'characters': ('simplified', 'traditional'),
+    'readings': ('pinyin', 'zhuyin'),
+    'distractors': ('random', 'confusable'),
+    'answer_mode': ('choices', 'typed'),
+}
+
+REASONS = {200: 'OK', 101: 'Switching Protocols', 204: 'No Content', 304: 'Not Modified',
+           400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           431: 'Request Header Fields Too Large', 500: 'Internal Server Error'}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def wav_header(frequency, channels, length):
+    # 16-bit PCM, so the pack's raw samples can go straight to a browser
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + length, b'WAVE', b'fmt ', 16, 1, channels,
+                       frequency, frequency * channels * 2, channels * 2, 16, b'data', length)
+
+
+class ClipStore:
+    # Every clip the lexicon points at, read once and kept. With an audio
+    # pack the PCM stays in the shared mapping and only gets a WAV header.
+    def __init__(self, paths, pack=None):
+        self.paths = paths
+        self.pack = pack
+        self.clips = {}     # path -> (parts, length, etag, content type)
+
+    def get(self, path):
+        clip = self.clips.get(path)
+        if clip is None and path in self.paths:
+            clip = self._load(path)
+            if clip is not None:
+                self.clips[path] = clip
+        return clip
+
+    def _load(self, path):
+        if self.pack is not None and path in self.pack:
+            pcm = self.pack.get(path)
+            header = wav_header(self.pack.frequency, self.pack.channels, len(pcm))
+            etag = hashlib.sha1(pcm).hexdigest()
+            return (header, pcm), len(header) + len(pcm), f'"{etag}"', 'audio/wav'
+        try:
+            data = resources.read_bytes(path)
+        except OSError as e:
+            metrics.error('server_clip', f"Error reading clip {path}: {e}")
+            return None
+        etag = hashlib.sha1(data).hexdigest()
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        return (data,), len(data), f'"{etag}"', content_type
+
+
+class Session:
+    __slots__ = ('id', 'engine', 'last_seen')
+
+    def __init__(self, session_id, engine):
+        self.id = session_id
+        self.engine = engine
+        self.last_seen = time.monotonic()
+
+
+def public_question(question):
+    # Same as Question.to_dict minus the answer, the client has to earn it
+    if question is None:
+        return None
+    return {
+        'direction': question.direction,
+        'prompt': question.prompt,
+        'hint': question.hint,
+        'audio': question.audio,
+        'choices': question.choices,
+    }
+
+
+class QuizServer:
+    def __init__(self, lexicon=None, pack=None, ttl=SESSION_TTL):
+        self.lexicon = lexicon or get_lexicon()
+        self.ttl = ttl
+        self.sessions = {}
+        self.shared_indexes = {}
+        self.listings = {}   # (band, type) -> (json bytes, etag)
+        paths = {entry[AUDIO] for entry in self.lexicon.entries if entry is not None}
+        paths.add(WRONG_SOUND)
+        self.clips = ClipStore(paths, pack)
+        bands = ''.join(f'<option>{label}</option>' for label, band in band_choices()
+                        if self.lexicon.has(band, 'char') or self.lexicon.has(band, 'vocab'))
+        directions = ''.join(f'<option value="{direction}">{label}</option>'
+                             for direction, label in zip(DIRECTIONS, DIRECTION_LABELS))
+        self.index_html = (INDEX_HTML.replace('BAND_OPTIONS', bands)
+                           .replace('DIRECTION_OPTIONS', directions).encode('utf-8'))
+        self.started = time.time()
+        self.answers = 0
+        self.questions = 0
+
+    # Quiz operations, shared by both transports
+
+    def _options(self, msg):
+        config = {}
+        for key, choices in OPTION_CHOICES.items():
+            value = msg.get(key, choices[0])
+            if value not in choices:
+                raise BadRequest(f"{key} must be one of {', '.join(choices)}")
+            config[key] = value
+        return config
+
+    def _direction(self, msg, default=DIRECTIONS[0]):
+        direction = msg.get('direction', default)
+        if direction not in DIRECTIONS:
+            raise BadRequest(f"direction must be one of {', '.join(DIRECTIONS)}")
+        return direction
+
+    def _content(self, msg):
+        try:
+            band = parse_band(msg.get('band', 1))
+        except (TypeError, ValueError):
+            raise BadRequest("band must be a band, a range like 2-4 or all")
+        content_type = msg.get('type', 'char')
+        if content_type not in CONTENT_TYPES:
+            raise BadRequest("type must be char or vocab")
+        if not self.lexicon.has(band, content_type):
+            raise BadRequest(f"no data for band {msg.get('band', 1)} {content_type}")
+        return band, content_type
+
+    def _order(self, msg, default='random'):
+        order = msg.get('order', default)
+        if order not in ORDER_MODES:
+            raise BadRequest(f"order must be one of {', '.join(ORDER_MODES)}")
+        return order
+
+    def new_session(self, msg):
+        band, content_type = self._content(msg)
+        engine = QuizEngine(band, content_type, self._order(msg), self._options(msg), lexicon=self.lexicon,
+                            scheduler=Scheduler(path=None), shared_indexes=self.shared_indexes,
+                            direction=self._direction(msg))
+        engine.load_data()
+        session = Session(secrets.token_urlsafe(12), engine)
+        self.sessions[session.id] = session
+        metrics.count('server_sessions_started')
+        return session
+
+    def get_session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise BadRequest("unknown or expired session")
+        session.last_seen = time.monotonic()
+        return session
+
+    def _next(self, engine):
+        self.questions += 1
+        return public_question(engine.next_question())
+
+    def handle_op(self, session, msg):
+        op = msg.get('op')
+        engine = session.engine
+        if op == 'next':
+            return {'question': self._next(engine)}
+        if op == 'answer':
+            # A right answer comes back with the next card, saves a round trip
+            self.answers += 1
+            if 'typed' in msg:
+                verdict, reading = engine.answer_typed(str(msg['typed']))
+                if reading is None:
+                    return {'correct': False, 'verdict': verdict}
+                return {'correct': True, 'verdict': verdict, 'reading': reading, 'question': self._next(engine)}
+            if engine.answer(msg.get('choice')):
+                return {'correct': True, 'question': self._next(engine)}
+            return {'correct': False}
+        if op == 'progress':
+            # live feedback for an answer box, one small frame per keystroke
+            return {'progress': engine.typed_progress(str(msg.get('typed', '')))}
+        if op == 'content':
+            engine.set_content(*self._content(msg))
+            return {'question': self._next(engine)}
+        if op == 'settings':
+            if 'order' in msg:
+                engine.set_order_mode(self._order(msg))
+            if 'direction' in msg:
+                engine.set_direction(self._direction(msg))
+            engine.set_config(self._options(dict(engine.config, **msg)))
+            return {'question': public_question(engine.refresh_question())}
+        if op == 'custom':
+            ids = msg.get('ids')
+            if ids is None:
+                engine.clear_custom_vocab()
+            else:
+                # a string would iterate into digits, "12" into ids 1 and 2
+                if not isinstance(ids, list) or not all(type(i) is int for i in ids):
+                    raise BadRequest("ids must be a list of lexicon entry ids")
+                entries = self.lexicon.entries
+                rows = [entries[i] for i in ids if 0 <= i < len(entries) and entries[i] is not None]
+                if not rows:
+                    raise BadRequest("no valid ids")
+                engine.set_custom_vocab(rows)
+            return {'question': self._next(engine)}
+        raise BadRequest(f"unknown op {op!r}")
+
+    def listing(self, band, content_type):
+        # Entry ids for building custom sets, same for every learner so built once
+        key = (band, content_type)
+        cached = self.listings.get(key)
+        if cached is None:
+            rows = [{'id': e[ENTRY_ID], 'simplified': e[SIMPLIFIED], 'traditional': e[TRADITIONAL],
+                     'pinyin': e[PINYIN], 'zhuyin': e[ZHUYIN], 'meaning': e[MEANING]}
+                    for e in self.lexicon.rows(band, content_type)]
+            body = json.dumps(rows, ensure_ascii=False).encode('utf-8')
+            cached = self.listings[key] = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+        return cached
+
+    def stats(self):
+        return {
+            'bands': self.lexicon.bands(),
+            'sessions': len(self.sessions),
+            'uptime': time.time() - self.started,
+            'questions': self.questions,
+            'answers': self.answers,
+            'clips_loaded': len(self.clips.clips),
+            'candidate_indexes': sum(isinstance(v, CandidateIndex) for v in self.shared_indexes.values()),
+        }
+
+    def expire(self, now=None):
+        now = time.monotonic() if now is None else now
+        stale = [sid for sid, s in self.sessions.items() if now - s.last_seen > self.ttl]
+        for sid in stale:
+            del self.sessions[sid]
+        return len(stale)
+
+    # HTTP
+
+    def route(self, method, url, headers, body):
+        path = url.path
+        if path == '/' and method in ('GET', 'HEAD'):
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, (self.index_html,)
+        if path == '/stats':
+            return json_response(self.stats())
+        if path == '/lexicon':
+            query = parse_qs(url.query)
+            band, content_type = self._content({'band': query.get('band', ['1'])[0],
+                                                'type': query.get('type', ['char'])[0]})
+            data, etag = self.listing(band, content_type)
+            return cached_response(headers, data, etag, 'application/json', 'public, max-age=300')
+        if path.startswith('/api/session'):
+            return self.route_api(method, path, body)
+        if method in ('GET', 'HEAD'):
+            clip = self.clips.get(unquote(path.lstrip('/')))
+            if clip is not None:
+                parts, length, etag, content_type = clip
+                metrics.count('server_clips')
+                return cached_response(headers, parts, etag, content_type,
+                                       f'public, max-age={CLIP_MAX_AGE}, immutable', length)
+        return json_response({'error': 'not found'}, 404)
+
+    def route_api(self, method, path, body):
+        try:
+            msg = json.loads(body) if body else {}
+        except ValueError:
+            raise BadRequest("body must be JSON")
+        if not isinstance(msg, dict):
+            raise BadRequest("body must be a JSON object")
+        parts = path.strip('/').split('/')
+        if len(parts) == 2 and method == 'POST':
+            session = self.new_session(msg)
+            return json_response({'session': session.id, 'question': self._next(session.engine)})
+        if len(parts) == 3 and method == 'DELETE':
+            self.sessions.pop(parts[2], None)
+            return 204, {}, ()
+        if len(parts) == 4 and method == 'POST':
+            msg['op'] = parts[3]
+            return json_response(self.handle_op(self.get_session(parts[2]), msg))
+        return json_response({'error': 'method not allowed'}, 405)
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    write_response(writer, *json_response({'error': 'headers too large'}, 431), keep_alive=False)
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ', 2)
+                except ValueError:
+                    write_response(writer, *json_response({'error': 'bad request line'}, 400), keep_alive=False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        key, value = line.split(':', 1)
+                        headers[key.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY:
+                    write_response(writer, *json_response({'error': 'body too large'}, 413), keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                url = urlsplit(target)
+                if url.path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                    await self.serve_websocket(reader, writer, headers)
+                    return
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                metrics.count('server_requests')
+                with metrics.timer('server_request'):
+                    try:
+                        response = self.route(method, url, headers, body)
+                    except BadRequest as e:
+                        response = json_response({'error': str(e)}, 400)
+                write_response(writer, *response, keep_alive=keep_alive, head_only=method == 'HEAD')
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            metrics.error('server', f"Error handling request: {e}")
+        finally:
+            writer.close()
+
+    # WebSocket
+
+    async def serve_websocket(self, reader, writer, headers):
+        key = headers.get('sec-websocket-key')
+        if not key:
+            write_response(writer, *json_response({'error': 'missing Sec-WebSocket-Key'}, 400), keep_alive=False)
+            return
+        writer.write((f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept_key(key)}\r\n\r\n").encode('ascii'))
+        await writer.drain()
+        ws = WebSocket(reader, writer)
+        session = None
+        metrics.count('server_websockets')
+        try:
+            while True:
+                text = await ws.recv()
+                msg = None
+                with metrics.timer('server_ws_message'):
+                    try:
+                        msg = json.loads(text)
+                        if not isinstance(msg, dict):
+                            raise BadRequest("messages must be JSON objects")
+                        op = msg.get('op')
+                        if op == 'start':
+                            session = self.new_session(msg)
+                            reply = {'session': session.id, 'question': self._next(session.engine)}
+                        elif op == 'resume':
+                            session = self.get_session(msg.get('session'))
+                            reply = {'session': session.id,
+                                     'question': public_question(session.engine.question)}
+                        elif session is None:
+                            raise BadRequest("send start or resume first")
+                        else:
+                            session.last_seen = time.monotonic()
+                            reply = self.handle_op(session, msg)
+                    except ValueError:
+                        reply = {'error': 'message must be JSON'}
+                    except BadRequest as e:
+                        reply = {'error': str(e)}
+                    # lets a client match replies to requests if it pipelines
+                    if isinstance(msg, dict) and 'id' in msg:
+                        reply['id'] = msg['id']
+                await ws.send(json.dumps(reply, ensure_ascii=False))
+        except ConnectionClosed:
+            pass
+        finally:
+            await ws.close()
+
+    async def expire_sessions(self):
+        while True:
+            await asyncio.sleep(EXPIRE_EVERY)
+            dropped = self.expire()
+            if dropped:
+                metrics.count('server_sessions_expired', dropped)
+
+
+def json_response(obj, status=200):
+    return status, {'Content-Type': 'application/json'}, (json.dumps(obj, ensure_ascii=False).encode('utf-8'),)
+
+
+def cached_response(headers, parts, etag, content_type, cache_control, length=None):
+    if isinstance(parts, bytes):
+        parts = (parts,)
+    response_headers = {'Content-Type': content_type, 'Cache-Control': cache_control, 'ETag': etag}
+    if etag in headers.get('if-none-match', ''):
+        return 304, response_headers, ()
+    if length is not None:
+        response_headers['Content-Length'] = str(length)
+    return 200, response_headers, parts
+
+
+def write_response(writer, status, headers, parts, keep_alive=True, head_only=False):
+    length = headers.get('Content-Length') or str(sum(len(p) for p in parts))
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    lines.extend(f"{key}: {value}" for key, value in headers.items() if key != 'Content-Length')
+    if status not in (204, 304):
+        lines.append(f"Content-Length: {length}")
+    lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+    if not head_only:
+        for part in parts:
+            writer.write(part)
+
+
+async def serve(host, port, ttl=SESSION_TTL, pack=None):
+    server = QuizServer(pack=pack, ttl=ttl)
+    listener = await asyncio.start_server(server.handle_client, host, port, backlog=1024)
+    expiry = asyncio.ensure_future(server.expire_sessions())
+    for sock in listener.sockets:
+        addr = sock.getsockname()
+        print(f"Serving on http://{addr[0]}:{addr[1]}/ ({len(server.clips.paths)} clips, "
+              f"{'audio pack' if pack else 'loose files'})", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        expiry.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve HSK practice to a classroom over HTTP/WebSocket")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--ttl', type=int, default=SESSION_TTL, help="seconds before an idle session is dropped")
+    parser.add_argument('--metrics', metavar='PATH', help="write timings here on exit (.json or .prom)")
+    args = parser.parse_args(argv)
+    if args.metrics:
+        metrics.enable(args.metrics)
+    try:
+        asyncio.run(serve(args.host, args.port, args.ttl, open_pack()))
+    except KeyboardInterrupt:
+        pass
+
+
+INDEX_HTML = """<!doctype html>
+<html><head><meta charset="utf-8"><title>HSK 3.0</title>
+<style>
+body { font-family: sans-serif; max-width: 480px; margin: 2em auto; text-align: center; }
+#hanzi { font-size: 72px; font-weight: bold; margin: 0.3em 0; }
+#choices { display: grid; grid-template-columns: 1fr 1fr; gap: 6px; margin-top: 1em; }
+#choices button { font-size: 20px; padding: 0.8em; }
+#typed { font-size: 24px; margin-top: 1em; text-align: center; display: none; }
+</style></head>
+<body>
+<div>
+  Band <select id="band">BAND_OPTIONS</select>
+  <select id="type"><option value="char">Characters</option><option value="vocab">Vocabulary</option></select>
+  <select id="readings"><option>pinyin</option><option>zhuyin</option></select>
+  <select id="direction">DIRECTION_OPTIONS</select>
+  <select id="answer_mode"><option value="choices">Pick</option><option value="typed">Type</option></select>
+  <button id="start">Start</button>
+</div>
+<div id="hanzi"></div><div id="meaning"></div>
+<div id="choices"></div>
+<input id="typed" autocomplete="off" placeholder="reading, tones as marks or numbers">
+<script>
+let ws, busy = false;
+const $ = id => document.getElementById(id);
+const wrong = new Audio('/res/wrong.wav');
+function show(q) {
+  busy = false;
+  $('hanzi').textContent = q ? (q.direction === 'listening' ? '\u266a' : q.prompt) : 'No data loaded';
+  $('hanzi').style.fontSize = q && q.direction === 'meaning_hanzi' ? '24px' : '';
+  $('meaning').textContent = q ? q.hint : '';
+  $('choices').innerHTML = '';
+  // typed cards come without choices
+  const typed = $('typed');
+  typed.style.display = q && !q.choices.length ? 'inline' : '';
+  typed.value = ''; typed.style.background = '';
+  if (!q) return;
+  if (!q.choices.length) typed.focus();
+  if (q.direction === 'listening') new Audio('/' + encodeURI(q.audio)).play().catch(() => {});
+  for (const c of q.choices) {
+    const b = document.createElement('button');
+    b.textContent = c;
+    b.onclick = () => { if (!busy) { busy = true; b.dataset.picked = 1; ws.send(JSON.stringify({op: 'answer', choice: c})); } };
+    $('choices').appendChild(b);
+  }
+  $('choices').dataset.audio = q.audio;
+}
+function picked() {
+  return $('typed').style.display ? $('typed') : $('choices').querySelector('[data-picked]');
+}
+$('typed').onkeydown = e => {
+  const text = $('typed').value.trim();
+  if (e.key === 'Enter' && text && !busy) { busy = true; ws.send(JSON.stringify({op: 'answer', typed: text})); }
+};
+$('typed').oninput = () => { $('typed').style.background = ''; };
+$('start').onclick = () => {
+  if (ws) ws.close();
+  ws = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws');
+  ws.onopen = () => ws.send(JSON.stringify({op: 'start', band: $('band').value, type: $('type').value,
+                                            readings: $('readings').value, direction: $('direction').value,
+                                            answer_mode: $('answer_mode').value}));
+  ws.onmessage = e => {
+    const m = JSON.parse(e.data);
+    if (m.error) { alert(m.error); busy = false; return; }
+    if (m.correct === false) {
+      const b = picked();
+      b.style.background = '#f00'; b.removeAttribute('data-picked'); busy = false;
+      wrong.play(); return;
+    }
+    if (m.correct) {
+      const b = picked();
+      b.style.background = '#0f0';
+      if (m.reading) b.value = m.reading;
+      const clip = new Audio('/' + encodeURI($('choices').dataset.audio));
+      clip.onended = clip.onerror = () => show(m.question);
+      clip.play().catch(() => show(m.question));
+      return;
+    }
+    show(m.question);
+  };
+};
+</script>
+</body></html>
+"""
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import copy
+import hashlib
+import json
+import os
+import statistics
+import time
+from res import resources
+from res.lexicon import get_lexicon, ENTRY_ID
+from res.scheduler import Scheduler, migrate_cards
+
+# A session recording is JSON lines: a header with everything needed to
+# start the same engine (seed, content, settings, the SRS state), then one
+# line per engine call that changes what comes next, with the questions it
+# produced. Replaying makes the same calls against the current code and
+# checks the same questions come out.
+
+SESSION_DIR = 'sessions'    # under the user dir
+FORMAT_VERSION = 1
+
+
+def question_signature(question):
+    if question is None:
+        return None
+    return [question.row[ENTRY_ID], question.direction, question.answer, question.choices]
+
+
+def lexicon_fingerprint(lexicon):
+    files = sorted((name, info['sha1']) for name, info in lexicon.files.items())
+    return hashlib.sha1(json.dumps(files).encode('utf-8')).hexdigest()[:16]
+
+
+def _band(value):
+    # json turns (first, last) pools into lists
+    return tuple(value) if isinstance(value, list) else value
+
+
+class SessionRecorder:
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(resources.user_path(SESSION_DIR), time.strftime('%Y%m%d-%H%M%S') + '.jsonl')
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+        self.engine = None
+        self.events = 0
+
+    def start(self, engine):
+        self.engine = engine
+        custom = engine.custom_vocab_list
+        self.write({
+            'event': 'session',
+            'version': FORMAT_VERSION,
+            'seed': engine.seed,
+            'band': engine.band,
+            'type': engine.content_type,
+            'order': engine.order_mode,
+            'direction': engine.direction,
+            'config': engine.config,
+            'custom': None if custom is None else [row[ENTRY_ID] for row in custom],
+            'cards': engine.scheduler.cards,
+            'lexicon': lexicon_fingerprint(engine.lexicon),
+            't': engine.clock(),
+            'ts': engine.wall_clock(),
+        })
+
+    def log(self, event, t, fields):
+        record = {'event': event, 't': t, 'ts': self.engine.wall_clock()}
+        for key, value in fields.items():
+            record[key] = question_signature(value) if key == 'question' else value
+        self.write(record)
+        self.events += 1
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False))
+        self.file.write('\n')
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+def read_session(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records or records[0].get('event') != 'session':
+        raise ValueError(f"{path} is not a session recording")
+    if records[0].get('version') != FORMAT_VERSION:
+        raise ValueError(f"{path} is format {records[0].get('version')}, expected {FORMAT_VERSION}")
+    return records[0], records[1:]
+
+
+class ReplayResult:
+    def __init__(self, path, header, lexicon_changed):
+        self.path = path
+        self.header = header
+        self.lexicon_changed = lexicon_changed
+        self.events = 0
+        self.questions = 0
+        self.mismatches = []    # (event number, event, expected, got)
+        self.timings = {}       # event -> [seconds]
+        self.elapsed = 0.0
+
+    @property
+    def ok(self):
+        return not self.mismatches
+
+    def summary(self):
+        lines = [f"{self.path}: {self.events} events, {self.questions} questions in {self.elapsed * 1000:.1f} ms"
+                 f" - {'same questions' if self.ok else f'{len(self.mismatches)} mismatches'}"]
+        if self.lexicon_changed:
+            lines.append("  note: the lexicon has changed since this was recorded")
+        for event, samples in sorted(self.timings.items()):
+            samples = sorted(samples)
+            p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+            lines.append(f"  {event:<12} x{len(samples):<6} median {statistics.median(samples) * 1e6:8.1f} us"
+                         f"  p95 {p95 * 1e6:8.1f} us")
+        for number, event, expected, got in self.mismatches[:5]:
+            lines.append(f"  #{number} {event}: recorded {expected}, got {got}")
+        return '\n'.join(lines)
+
+
+def replay(path, lexicon=None):
+    # Headless: no wx, no audio, no history, SRS state kept in memory
+    from res.quiz_engine import QuizEngine
+
+    header, events = read_session(path)
+    if any(event['event'] == 'reload' for event in events):
+        # only how many rows a live reload changed gets recorded, not what
+        # they changed to, so nothing after one can be played back the same
+        raise ValueError(f"{path} was recorded across a live reload of the word lists, it can't be replayed")
+    lexicon = lexicon or get_lexicon()
+    result = ReplayResult(path, header, header.get('lexicon') != lexicon_fingerprint(lexicon))
+    scheduler = Scheduler(path=None)
+    scheduler.cards = migrate_cards(copy.deepcopy(header['cards']), lexicon)
+    now = [header['t'], header['ts']]
+    engine = QuizEngine(_band(header['band']), header['type'], header['order'], header['config'],
+                        lexicon=lexicon, scheduler=scheduler, seed=header['seed'], direction=header['direction'])
+    engine.clock = lambda: now[0]
+    engine.wall_clock = lambda: now[1]
+    if header['custom'] is not None:
+        engine.custom_vocab_list = [lexicon.entries[i] for i in header['custom']]
+
+    entries = lexicon.entries
+    calls = {
+        'load': lambda e: engine.load_data(),
+        'next': lambda e: question_signature(engine.next_question()),
+        'prepare': lambda e: question_signature(engine.prepare_next()),
+        'refresh': lambda e: question_signature(engine.refresh_question()),
+        'answer': lambda e: engine.answer(e['choice']),
+        'typed': lambda e: engine.answer_typed(e['text'])[0],
+        'order': lambda e: engine.set_order_mode(e['order']),
+        'direction': lambda e: engine.set_direction(e['direction']),
+        'config': lambda e: engine.set_config(e['config']),
+        'content': lambda e: engine.set_content(_band(e['band']), e['type']),
+        'custom': lambda e: engine.set_custom_vocab([entries[i] for i in e['ids']]),
+        'clear_custom': lambda e: engine.clear_custom_vocab(),
+    }
+    # what each call's result is checked against
+    expected = {'next': 'question', 'prepare': 'question', 'refresh': 'question', 'answer': 'correct',
+                'typed': 'verdict'}
+
+    started = time.perf_counter()
+    for number, event in enumerate(events, 1):
+        kind = event['event']
+        call = calls.get(kind)
+        if call is None:
+            continue
+        now[0], now[1] = event['t'], event['ts']
+        start = time.perf_counter()
+        got = call(event)
+        result.timings.setdefault(kind, []).append(time.perf_counter() - start)
+        result.events += 1
+        if kind in ('next', 'prepare', 'refresh'):
+            result.questions += 1
+        field = expected.get(kind)
+        if field is not None and got != event[field]:
+            result.mismatches.append((number, kind, event[field], got))
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,143 @@
+import io
+import threading
+import queue
+from collections import OrderedDict
+import pygame.mixer
+from res import metrics, resources
+
+DEFAULT_BUDGET = 32 * 1024 * 1024
+
+
+def _load(path):
+    # Loose clips by filename, clips inside a bundle read out of it into memory
+    local = resources.path(path)
+    if local is not None:
+        return pygame.mixer.Sound(local)
+    return pygame.mixer.Sound(file=io.BytesIO(resources.read_bytes(path)))
+
+
+def _sound_size(sound):
+    # Decoded size in bytes, worked out from the mixer format so we don't
+    # have to copy the samples out with get_raw()
+    init = pygame.mixer.get_init()
+    if not init:
+        return 0
+    freq, fmt, channels = init
+    return int(sound.get_length() * freq * channels * ((abs(fmt) & 0xff) // 8))
+
+
+class SoundCache:
+    def __init__(self, budget=DEFAULT_BUDGET, pack=None):
+        self.budget = budget
+        self.pack = pack
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sounds = OrderedDict()   # path -> (sound, size)
+        self._pending = {}             # path -> threading.Event while decoding
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def get(self, path):
+        with self._lock:
+            cached = self._sounds.get(path)
+            if cached:
+                self._sounds.move_to_end(path)
+                self.hits += 1
+                metrics.count('sound_cache_hits')
+                return cached[0]
+            pending = self._pending.get(path)
+
+        # Prefetch already working on it, waiting beats decoding twice
+        if pending:
+            pending.wait()
+            with self._lock:
+                cached = self._sounds.get(path)
+                if cached:
+                    self._sounds.move_to_end(path)
+                    self.hits += 1
+                    metrics.count('sound_cache_hits')
+                    return cached[0]
+
+        with self._lock:
+            self.misses += 1
+        metrics.count('sound_cache_misses')
+        return self._decode(path)
+
+    def prefetch(self, path):
+        with self._lock:
+            if path in self._sounds or path in self._pending:
+                return
+            self._pending[path] = threading.Event()
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name='sound-prefetch', daemon=True)
+            self._worker.start()
+        self._queue.put(path)
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            if path is None:
+                break
+            try:
+                self._decode(path)
+            except Exception as e:
+                metrics.error('sound_prefetch', f"Error prefetching sound {path}: {e}")
+            finally:
+                with self._lock:
+                    event = self._pending.pop(path, None)
+                if event:
+                    event.set()
+
+    def _decode(self, path):
+        # Pre-decoded PCM straight out of the mapped pack, clip files otherwise
+        with metrics.timer('sound_decode'):
+            if self.pack is not None and path in self.pack:
+                sound = self.pack.sound(path)
+            else:
+                sound = _load(path)
+        size = _sound_size(sound)
+        with self._lock:
+            if path not in self._sounds:
+                self._sounds[path] = (sound, size)
+                self.size += size
+            self._evict()
+        return sound
+
+    def _evict(self):
+        # Always keep the newest clip even if it alone is over budget
+        while self.size > self.budget and len(self._sounds) > 1:
+            _, (_, size) = self._sounds.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            metrics.count('sound_cache_evictions')
+
+    def discard(self, path):
+        # the file changed on disk, decode it again next time
+        with self._lock:
+            cached = self._sounds.pop(path, None)
+            if cached:
+                self.size -= cached[1]
+
+    def clear(self):
+        with self._lock:
+            self._sounds.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'clips': len(self._sounds),
+                'bytes': self.size,
+                'budget': self.budget,
+            }
+
+    def close(self):
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker = None
@@ -0,0 +1,38 @@
+import time
+
+# Startup phase timings for --startup-profile. Marks are cheap so they're
+# always recorded; report() only prints when profiling was asked for.
+
+_start = None
+_marks = []
+_enabled = False
+_reported = False
+_waiting = set()
+
+
+def begin(start, enabled, wait_for=()):
+    global _start, _enabled
+    _start = start
+    _enabled = enabled
+    _waiting.update(wait_for)
+
+
+def mark(name):
+    if _start is None:
+        return
+    _marks.append((name, time.perf_counter()))
+    _waiting.discard(name)
+    if not _waiting:
+        report()
+
+
+def report():
+    global _reported
+    if not _enabled or _reported:
+        return
+    _reported = True
+    print("Startup profile:")
+    last = _start
+    for name, t in _marks:
+        print(f"  {name:<28} +{(t - last) * 1000:8.1f} ms  {(t - _start) * 1000:8.1f} ms")
+        last = t
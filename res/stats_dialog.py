@@ -0,0 +1,75 @@
+import wx
+from res.lexicon import get_lexicon, SIMPLIFIED, PINYIN, MEANING
+
+TYPE_LABELS = {'char': 'Characters', 'vocab': 'Vocabulary'}
+
+
+class StatsDialog(wx.Dialog):
+    def __init__(self, parent, history):
+        super().__init__(parent, title="Statistics", size=(640, 480),
+                         style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+        self.lexicon = get_lexicon()
+        panel = wx.Panel(self)
+        vbox = wx.BoxSizer(wx.VERTICAL)
+
+        self.summary = wx.StaticText(panel, label="Loading...")
+        notebook = wx.Notebook(panel)
+        self.weakest = self._make_list(notebook, (("Word", 100), ("Pinyin", 110), ("Meaning", 200),
+                                                  ("Seen", 50), ("Right", 60), ("Avg s", 60)))
+        self.bands = self._make_list(notebook, (("Band", 60), ("Content", 100), ("Answered", 80),
+                                                ("First try", 80), ("Wrong picks", 90), ("Avg s", 60)))
+        self.confusions = self._make_list(notebook, (("Answer", 160), ("Picked instead", 160), ("Times", 60)))
+        notebook.AddPage(self.weakest, "Weakest words")
+        notebook.AddPage(self.bands, "Accuracy by band")
+        notebook.AddPage(self.confusions, "Confused readings")
+
+        vbox.Add(self.summary, 0, wx.ALL, 10)
+        vbox.Add(notebook, 1, wx.EXPAND|wx.LEFT|wx.RIGHT, 10)
+        vbox.Add(wx.Button(panel, wx.ID_CLOSE), 0, wx.ALIGN_RIGHT|wx.ALL, 10)
+        panel.SetSizer(vbox)
+        self.Bind(wx.EVT_BUTTON, lambda event: self.Close(), id=wx.ID_CLOSE)
+        self.Center()
+
+        # The query runs on the history thread, after any answers still queued
+        history.request_stats(lambda stats: wx.CallAfter(self.fill, stats))
+
+    def _make_list(self, parent, columns):
+        ctrl = wx.ListCtrl(parent, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
+        for i, (label, width) in enumerate(columns):
+            ctrl.InsertColumn(i, label, width=width)
+        return ctrl
+
+    def _add_rows(self, ctrl, rows):
+        ctrl.Freeze()
+        for i, row in enumerate(rows):
+            ctrl.InsertItem(i, row[0])
+            for col, value in enumerate(row[1:], 1):
+                ctrl.SetItem(i, col, value)
+        ctrl.Thaw()
+
+    def fill(self, stats):
+        if not self:
+            return
+        total = stats['total']
+        first_try = sum(row[3] for row in stats['bands'])
+        if total:
+            self.summary.SetLabel(f"{total} answers, {first_try / total:.0%} right first time")
+        else:
+            self.summary.SetLabel("Nothing answered yet")
+
+        entries = self.lexicon.entries
+        weakest = []
+        for entry_id, band, content_type, seen, correct, wrong, seconds in stats['weakest']:
+            row = entries[entry_id] if entry_id < len(entries) else None
+            if row is None:
+                continue
+            weakest.append((row[SIMPLIFIED], row[PINYIN], row[MEANING], str(seen), f"{correct / seen:.0%}",
+                            f"{seconds / seen:.1f}"))
+        self._add_rows(self.weakest, weakest)
+
+        self._add_rows(self.bands, [
+            (str(band), TYPE_LABELS.get(content_type, content_type), str(seen), f"{correct / seen:.0%}",
+             str(wrong), f"{seconds / seen:.1f}")
+            for band, content_type, seen, correct, wrong, seconds in stats['bands'] if seen
+        ])
+        self._add_rows(self.confusions, [(answer, picked, str(n)) for answer, picked, n in stats['confusions']])
@@ -0,0 +1,217 @@
+import argparse
+import base64
+import json
+import os
+import re
+import time
+from res import resources
+from res.bitset import Bitset
+from res.lexicon import get_lexicon, parse_band, SIMPLIFIED, PINYIN, MEANING
+
+# Named study sets: bitsets over lexicon entry ids (which survive csv edits
+# and cache rebuilds), so a set of a few thousand words is a few hundred
+# bytes on disk. Sets can be built from expressions like
+#   band3:vocab - correct>=5
+#   (mine | band7-9:char) & seen>=1
+# evaluated left to right, with parentheses for grouping. Operators need
+# spaces around them since band ranges have dashes in.
+
+STUDY_SETS_PATH = 'study_sets.json'     # under the user dir
+FORMAT_VERSION = 1
+
+TOKEN_RE = re.compile(r'"[^"]*"|[()]|[^\s()]+')
+POOL_RE = re.compile(r'^(?:bands?)?(.+):(char|vocab)$')
+HISTORY_RE = re.compile(r'^(seen|correct|wrong)>=(\d+)$')
+OPERATORS = {'|': '__or__', '+': '__or__', '&': '__and__', '-': '__sub__'}
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+class StudySets:
+    def __init__(self, path=STUDY_SETS_PATH, lexicon=None, history=None):
+        self.path = resources.user_path(path)
+        self.lexicon = lexicon or get_lexicon()
+        self.history = history
+        self.sets = {}      # name -> {'size', 'bits' (base64), 'expression', 'created'}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == FORMAT_VERSION:
+                self.sets = data['sets']
+        except FileNotFoundError:
+            self.sets = {}
+        except Exception as e:
+            print(f"Error loading study sets: {e}")
+            self.sets = {}
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': FORMAT_VERSION, 'sets': self.sets}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+            return True
+        except Exception as e:
+            print(f"Error saving study sets: {e}")
+            return False
+
+    def names(self):
+        return sorted(self.sets)
+
+    def __contains__(self, name):
+        return name in self.sets
+
+    def get(self, name):
+        saved = self.sets[name]
+        return Bitset.from_int(saved['size'], int.from_bytes(base64.b64decode(saved['bits']), 'little'))
+
+    def info(self, name):
+        saved = self.sets[name]
+        return saved.get('expression'), saved.get('count', 0), saved.get('created')
+
+    def put(self, name, bitset, expression=None):
+        name = name.strip()
+        if not name:
+            raise ValueError("study sets need a name")
+        self.sets[name] = {
+            'size': bitset.size,
+            'count': len(bitset),
+            'bits': base64.b64encode(bytes(bitset.bits)).decode('ascii'),
+            'expression': expression,
+            'created': time.time(),
+        }
+        return self.save()
+
+    def delete(self, name):
+        if self.sets.pop(name, None) is not None:
+            self.save()
+
+    def rows(self, bitset):
+        # Ids from an older lexicon may point at rows since deleted
+        entries = self.lexicon.entries
+        return [row for row in (entries[i] for i in bitset if i < len(entries)) if row is not None]
+
+    def request_history(self, expression, callback):
+        # Look up the seen/correct/wrong>=N terms of an expression without
+        # waiting on the history: callback(found) runs on its writer thread
+        # once they're all in (straight away if there are none), found then
+        # goes to evaluate(). GUI callers wrap it in wx.CallAfter.
+        queries = set()
+        for token in TOKEN_RE.findall(expression):
+            token = token.strip('"')
+            m = HISTORY_RE.match(token)
+            if m and token not in self.sets:
+                queries.add((m.group(1), int(m.group(2))))
+        if not queries or self.history is None:
+            callback({})
+            return
+        found = {}
+
+        def got(query, ids):
+            # the writer thread runs these one at a time
+            found[query] = ids
+            if len(found) == len(queries):
+                callback(found)
+
+        for query in queries:
+            self.history.request_entries(*query, lambda ids, query=query: got(query, ids))
+
+    def evaluate(self, expression, found=None):
+        # found: history lookups from request_history, anything missing from
+        # it is asked for (and waited on) as needed
+        tokens = TOKEN_RE.findall(expression)
+        if not tokens:
+            raise ExpressionError("empty expression")
+        result, pos = self._expression(tokens, 0, found or {})
+        if pos != len(tokens):
+            raise ExpressionError(f"unexpected {tokens[pos]!r}")
+        return result
+
+    def _expression(self, tokens, pos, found):
+        result, pos = self._term(tokens, pos, found)
+        while pos < len(tokens) and tokens[pos] in OPERATORS:
+            operator = OPERATORS[tokens[pos]]
+            other, pos = self._term(tokens, pos + 1, found)
+            result = getattr(result, operator)(other)
+        return result, pos
+
+    def _term(self, tokens, pos, found):
+        if pos >= len(tokens):
+            raise ExpressionError("expression ends too early")
+        token = tokens[pos]
+        if token == '(':
+            result, pos = self._expression(tokens, pos + 1, found)
+            if pos >= len(tokens) or tokens[pos] != ')':
+                raise ExpressionError("missing )")
+            return result, pos + 1
+        return self.term(token.strip('"'), found), pos + 1
+
+    def term(self, token, found=None):
+        size = len(self.lexicon.entries)
+        if token in self.sets:
+            return self.get(token)
+        m = HISTORY_RE.match(token)
+        if m:
+            query = (m.group(1), int(m.group(2)))
+            if found and query in found:
+                return Bitset(size, found[query])
+            if self.history is None:
+                raise ExpressionError(f"{token} needs the answer history")
+            return Bitset(size, self.history.entries_where(*query))
+        m = POOL_RE.match(token)
+        if m:
+            try:
+                band = parse_band(m.group(1))
+            except ValueError:
+                raise ExpressionError(f"unknown band in {token!r}")
+            return Bitset(size, self.lexicon.ids(band, m.group(2)))
+        raise ExpressionError(f"no study set called {token!r} (bands look like band3:vocab)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage named study sets")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list')
+    show = sub.add_parser('show')
+    show.add_argument('name')
+    save = sub.add_parser('save', help="save the result of an expression, e.g. 'band3:vocab - correct>=5'")
+    save.add_argument('name')
+    save.add_argument('expression')
+    delete = sub.add_parser('delete')
+    delete.add_argument('name')
+    args = parser.parse_args(argv)
+
+    # the history thread only starts if an expression asks it something
+    from res.history import History
+    history = History()
+    sets = StudySets(history=history)
+    try:
+        if args.command == 'list':
+            for name in sets.names():
+                expression, count, _ = sets.info(name)
+                print(f"{name:<24} {count:>6}  {expression or ''}")
+        elif args.command == 'show':
+            if args.name not in sets:
+                raise SystemExit(f"no study set called {args.name!r}")
+            for row in sets.rows(sets.get(args.name)):
+                print(f"{row[SIMPLIFIED]}\t{row[PINYIN]}\t{row[MEANING]}")
+        elif args.command == 'save':
+            try:
+                bitset = sets.evaluate(args.expression)
+            except ExpressionError as e:
+                raise SystemExit(str(e))
+            sets.put(args.name, bitset, args.expression)
+            print(f"{args.name}: {len(bitset)} entries")
+        elif args.command == 'delete':
+            sets.delete(args.name)
+    finally:
+        history.close()
+
+
+if __name__ == "__main__":
+    main()
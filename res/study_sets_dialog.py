@@ -0,0 +1,112 @@
+import time
+import wx
+from res.study_sets import StudySets, ExpressionError
+
+
+class StudySetsDialog(wx.Dialog):
+    # Saved sets to start from, and a line to build new ones out of bands,
+    # other sets and the answer history
+    def __init__(self, parent, history):
+        super().__init__(parent, title="Study Sets", size=(600, 420),
+                         style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+        self.sets = StudySets(history=history)
+        self.selected_vocab = []
+        panel = wx.Panel(self)
+        vbox = wx.BoxSizer(wx.VERTICAL)
+
+        self.list = wx.ListCtrl(panel, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
+        for i, (label, width) in enumerate((("Name", 150), ("Words", 60), ("Built from", 230), ("Saved", 110))):
+            self.list.InsertColumn(i, label, width=width)
+        self.list.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.on_start)
+
+        # New set from an expression
+        build_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        self.name_ctrl = wx.TextCtrl(panel, size=(120, -1))
+        self.name_ctrl.SetHint("Name")
+        self.expr_ctrl = wx.TextCtrl(panel, style=wx.TE_PROCESS_ENTER)
+        self.expr_ctrl.SetHint("e.g. band3:vocab - correct>=5")
+        self.expr_ctrl.Bind(wx.EVT_TEXT_ENTER, self.on_save)
+        save_btn = self.save_btn = wx.Button(panel, label="Save")
+        save_btn.Bind(wx.EVT_BUTTON, self.on_save)
+        build_sizer.Add(self.name_ctrl, 0, wx.RIGHT, 5)
+        build_sizer.Add(self.expr_ctrl, 1, wx.RIGHT, 5)
+        build_sizer.Add(save_btn, 0)
+        help_text = wx.StaticText(panel, label="Combine bands (band3:vocab, band7-9:char), saved sets and "
+                                               "seen/correct/wrong>=N with | & - and brackets")
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        delete_btn = wx.Button(panel, label="Delete")
+        delete_btn.Bind(wx.EVT_BUTTON, self.on_delete)
+        start_btn = wx.Button(panel, wx.ID_OK, "Start Study")
+        start_btn.Bind(wx.EVT_BUTTON, self.on_start)
+        button_sizer.Add(delete_btn, 0, wx.ALL, 5)
+        button_sizer.AddStretchSpacer(1)
+        button_sizer.Add(start_btn, 0, wx.ALL, 5)
+        button_sizer.Add(wx.Button(panel, wx.ID_CANCEL, "Close"), 0, wx.ALL, 5)
+
+        vbox.Add(self.list, 1, wx.EXPAND | wx.ALL, 10)
+        vbox.Add(build_sizer, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 10)
+        vbox.Add(help_text, 0, wx.ALL, 10)
+        vbox.Add(button_sizer, 0, wx.EXPAND | wx.ALL, 5)
+        panel.SetSizer(vbox)
+        self.fill()
+        self.Center()
+
+    def fill(self):
+        self.list.DeleteAllItems()
+        for i, name in enumerate(self.sets.names()):
+            expression, count, created = self.sets.info(name)
+            self.list.InsertItem(i, name)
+            self.list.SetItem(i, 1, str(count))
+            self.list.SetItem(i, 2, expression or "picked by hand")
+            self.list.SetItem(i, 3, time.strftime('%Y-%m-%d %H:%M', time.localtime(created)) if created else "")
+
+    def selected_name(self):
+        index = self.list.GetFirstSelected()
+        return self.list.GetItemText(index) if index >= 0 else None
+
+    def on_save(self, event):
+        if not self.save_btn.IsEnabled():
+            # Enter while the last one is still being worked out
+            return
+        name = self.name_ctrl.GetValue().strip()
+        expression = self.expr_ctrl.GetValue().strip()
+        if not name or not expression:
+            wx.MessageBox("Give the set a name and say what's in it.", "Info", wx.OK | wx.ICON_INFORMATION)
+            return
+        # history terms are looked up on the history thread, after any
+        # answers still queued, and the set saved once they're back
+        self.save_btn.Disable()
+        self.sets.request_history(expression, lambda found: wx.CallAfter(self.save_set, name, expression, found))
+
+    def save_set(self, name, expression, found):
+        if not self:
+            return
+        self.save_btn.Enable()
+        try:
+            bitset = self.sets.evaluate(expression, found)
+        except ExpressionError as e:
+            wx.MessageBox(str(e), "Error", wx.OK | wx.ICON_ERROR)
+            return
+        self.sets.put(name, bitset, expression)
+        self.fill()
+
+    def on_delete(self, event):
+        name = self.selected_name()
+        if name is not None:
+            self.sets.delete(name)
+            self.fill()
+
+    def on_start(self, event):
+        name = self.selected_name()
+        if name is None:
+            wx.MessageBox("Pick a set to study.", "Info", wx.OK | wx.ICON_INFORMATION)
+            return
+        self.selected_vocab = self.sets.rows(self.sets.get(name))
+        if not self.selected_vocab:
+            wx.MessageBox(f"{name} is empty.", "Info", wx.OK | wx.ICON_INFORMATION)
+            return
+        self.EndModal(wx.ID_OK)
+
+    def GetSelectedVocab(self):
+        return self.selected_vocab
@@ -0,0 +1,195 @@
+import unicodedata
+from bisect import bisect_right
+from res.pinyin import TONE_MARKS, is_zhuyin, split_tone, pinyin_syllables, zhuyin_syllables
+
+# Checking a typed reading. Every entry reading is boiled down once to its
+# bare letters plus one tone per syllable; input is boiled down the same way
+# on each keystroke, so a check is a string compare and a few tone compares.
+# Tones in the input can be marks (hǎo), digits (hao3) or missing (hao).
+
+EXACT = 'exact'
+TONELESS = 'toneless'       # right syllables, tones left out: partial credit
+NEAR = 'near'               # within a typo or two
+WRONG_TONE = 'wrong_tone'
+WRONG = 'wrong'
+ACCEPTED = (EXACT, TONELESS, NEAR)
+PARTIAL = (TONELESS, NEAR)
+
+# live feedback while typing
+EMPTY = 'empty'
+ON_TRACK = 'on_track'
+OFF_TRACK = 'off_track'
+COMPLETE = 'complete'
+
+
+class Form:
+    # letters: syllables run together, bounds: where each syllable ends
+    __slots__ = ('letters', 'bounds', 'tones')
+
+    def __init__(self, letters, bounds, tones):
+        self.letters = letters
+        self.bounds = bounds
+        self.tones = tones
+
+
+class ReadingForms:
+    # One entry reading, typed either way. readings keeps the original text.
+    __slots__ = ('readings', 'pinyin', 'zhuyin')
+
+    def __init__(self, pinyin, zhuyin):
+        self.readings = (pinyin, zhuyin)
+        self.pinyin = pinyin_form(pinyin)
+        self.zhuyin = zhuyin_form(zhuyin)
+
+
+def _form(parts):
+    letters = []
+    bounds = []
+    tones = []
+    end = 0
+    for text, tone in parts:
+        letters.append(text)
+        end += len(text)
+        bounds.append(end)
+        tones.append(tone)
+    return Form(''.join(letters), tuple(bounds), tuple(tones))
+
+
+def pinyin_form(reading):
+    return _form(split_tone(s.lower()) for s in pinyin_syllables(reading))
+
+
+def zhuyin_form(reading):
+    return _form((initial + final, tone) for initial, final, tone in zhuyin_syllables(reading))
+
+
+_forms = {}
+
+
+def reading_forms(pinyin, zhuyin):
+    # Memoised, entries with the same reading share one
+    key = (pinyin, zhuyin)
+    forms = _forms.get(key)
+    if forms is None:
+        forms = _forms[key] = ReadingForms(pinyin, zhuyin)
+    return forms
+
+
+def parse_input(text):
+    # -> (is zhuyin, letters, [(letter index, tone), ...])
+    text = unicodedata.normalize('NFC', text.strip().lower())
+    if is_zhuyin(text):
+        form = zhuyin_form(text)
+        # zhuyin has no mark for tone 1, so every syllable carries a tone
+        marks = [(end - 1, tone) for end, tone in zip(form.bounds, form.tones)]
+        return True, form.letters, marks
+    text = text.replace('u:', 'ü').replace('v', 'ü')
+    letters = []
+    marks = []
+    for ch in text:
+        if ch in '12345':
+            if letters:
+                marks.append((len(letters) - 1, int(ch)))
+            continue
+        mark = TONE_MARKS.get(ch)
+        if mark:
+            ch, tone = mark
+            marks.append((len(letters), tone))
+        if ch.isalpha():
+            letters.append(ch)
+    return False, ''.join(letters), marks
+
+
+def max_typos(length):
+    if length < 4:
+        return 0
+    return 1 if length < 8 else 2
+
+
+def edit_distance(a, b, limit):
+    # Levenshtein plus swapped neighbours (ai/ia) as one edit, giving up as
+    # soon as every path is over limit
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        best = i
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+            if cost < best:
+                best = cost
+        if best > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+def _tones_by_syllable(form, marks):
+    tones = [0] * len(form.tones)   # 0 = not given
+    for index, tone in marks:
+        syllable = bisect_right(form.bounds, index)
+        if syllable < len(tones):
+            tones[syllable] = tone
+    return tones
+
+
+def _grade_tones(form, marks, zhuyin):
+    given = _tones_by_syllable(form, marks)
+    if zhuyin:
+        if given == list(form.tones):
+            return EXACT
+        # no marks at all reads as all first tone
+        return TONELESS if all(t == 1 for t in given) else WRONG_TONE
+    missing = False
+    for got, expected in zip(given, form.tones):
+        if got == 0:
+            if expected != 5:
+                missing = True
+        elif got != expected:
+            return WRONG_TONE
+    return TONELESS if missing else EXACT
+
+
+def check(text, candidates):
+    # -> (verdict, ReadingForms it matched or None); the best verdict wins
+    zhuyin, letters, marks = parse_input(text)
+    if not letters:
+        return WRONG, None
+    best = (WRONG, None)
+    rank = (EXACT, TONELESS, NEAR, WRONG_TONE, WRONG)
+    for forms in candidates:
+        form = forms.zhuyin if zhuyin else forms.pinyin
+        if letters == form.letters:
+            verdict = _grade_tones(form, marks, zhuyin)
+        elif edit_distance(letters, form.letters, max_typos(len(form.letters))) <= max_typos(len(form.letters)):
+            verdict = NEAR
+        else:
+            continue
+        if rank.index(verdict) < rank.index(best[0]):
+            best = (verdict, forms)
+            if verdict == EXACT:
+                break
+    return best
+
+
+def progress(text, candidates):
+    # Live feedback: could what's typed so far still turn into the answer?
+    zhuyin, letters, marks = parse_input(text)
+    if not letters:
+        return EMPTY
+    for forms in candidates:
+        form = forms.zhuyin if zhuyin else forms.pinyin
+        if not form.letters.startswith(letters):
+            continue
+        if letters == form.letters and _grade_tones(form, marks, zhuyin) == EXACT:
+            return COMPLETE
+        # tones typed so far have to agree with the syllables they sit on
+        tones = _tones_by_syllable(form, marks)
+        if all(got in (0, expected) or (zhuyin and got == 1) for got, expected in zip(tones, form.tones)):
+            return ON_TRACK
+    return OFF_TRACK
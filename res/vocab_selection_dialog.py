@@ -1,21 +1,102 @@
 import wx
 import wx.grid
-import csv
-import os
+from res.lexicon import get_lexicon, band_choices, band_name, SIMPLIFIED, TRADITIONAL, PINYIN, ZHUYIN, MEANING
+from res.bitset import Bitset
+from res.search_index import get_search_index
+from res.config import get_config
+
+COLUMN_LABELS = ["", "Simplified", "Traditional", "Reading", "Meaning"]
+
+
+class VocabTable(wx.grid.GridTableBase):
+    # Virtual table over lexicon entry ids, the grid only asks for the
+    # cells it is actually painting
+    def __init__(self, lexicon, reading_col):
+        super().__init__()
+        self.lexicon = lexicon
+        self.reading_col = reading_col
+        self.ids = []
+        self.shown = None
+        self.selected = Bitset(len(lexicon.entries))
+
+    def set_ids(self, ids, shown=None):
+        # shown: ids as a Bitset, if there's one already
+        grid = self.GetView()
+        old_rows = len(self.ids)
+        self.ids = ids
+        self.shown = shown
+        if grid is None:
+            return
+
+        # let the grid know the row count changed
+        grid.BeginBatch()
+        if len(ids) < old_rows:
+            msg = wx.grid.GridTableMessage(self, wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED, len(ids), old_rows - len(ids))
+            grid.ProcessTableMessage(msg)
+        elif len(ids) > old_rows:
+            msg = wx.grid.GridTableMessage(self, wx.grid.GRIDTABLE_NOTIFY_ROWS_APPENDED, len(ids) - old_rows)
+            grid.ProcessTableMessage(msg)
+        grid.EndBatch()
+        grid.ForceRefresh()
+
+    def GetNumberRows(self):
+        return len(self.ids)
+
+    def GetNumberCols(self):
+        return len(COLUMN_LABELS)
+
+    def GetColLabelValue(self, col):
+        return COLUMN_LABELS[col]
+
+    def GetTypeName(self, row, col):
+        return wx.grid.GRID_VALUE_BOOL if col == 0 else wx.grid.GRID_VALUE_STRING
+
+    def CanGetValueAs(self, row, col, type_name):
+        return type_name == self.GetTypeName(row, col)
+
+    def GetValueAsBool(self, row, col):
+        return self.ids[row] in self.selected
+
+    def GetValue(self, row, col):
+        entry_id = self.ids[row]
+        if col == 0:
+            return "1" if entry_id in self.selected else ""
+        entry = self.lexicon.entry(entry_id)
+        if col == 1:
+            return entry[SIMPLIFIED]
+        if col == 2:
+            return entry[TRADITIONAL]
+        if col == 3:
+            return entry[self.reading_col]
+        return entry[MEANING]
+
+    def SetValue(self, row, col, value):
+        pass
+
+    def toggle(self, row):
+        self.selected.toggle(self.ids[row])
+
+    def select_shown(self, selected):
+        # one pass over two bytearrays, however many rows the view has
+        if self.shown is None:
+            # search results, only ever as many as matched
+            self.shown = Bitset(len(self.lexicon.entries), self.ids)
+        if selected:
+            self.selected |= self.shown
+        else:
+            self.selected -= self.shown
+
 
 class VocabSelectionDialog(wx.Dialog):
     def __init__(self, parent, initial_band, initial_content_type):
         super().__init__(parent, title="Select Vocabulary for Study", size=(800, 350),
                          style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
         self.selected_vocab = []
-        self.data = []
         self.initial_band = initial_band
         self.initial_content_type = initial_content_type
-        self.config = {
-            'characters': 'simplified',
-            'readings': 'pinyin'
-        }
-        self.load_config()
+        self.config = get_config()
+        # (band, type) -> its ids as a Bitset, for select/deselect all
+        self.shown = {}
 
         self.init_ui()
         self.load_data_for_display()
@@ -27,8 +108,14 @@ class VocabSelectionDialog(wx.Dialog):
         control_panel = wx.Panel(self)
         control_sizer = wx.BoxSizer(wx.HORIZONTAL)
 
-        self.band_choice = wx.Choice(control_panel, choices=[str(i) for i in range(1, 7)])
-        self.band_choice.SetSelection(self.initial_band - 1)
+        # single bands, the cumulative pools and everything
+        choices = band_choices()
+        self.band_values = [band for _, band in choices]
+        self.band_choice = wx.Choice(control_panel, choices=[label for label, _ in choices])
+        if self.initial_band in self.band_values:
+            self.band_choice.SetSelection(self.band_values.index(self.initial_band))
+        else:
+            self.band_choice.SetSelection(0)
         self.band_choice.Bind(wx.EVT_CHOICE, self.on_selection_change)
 
         self.type_choice = wx.Choice(control_panel, choices=['Characters', 'Vocabulary'])
@@ -39,18 +126,31 @@ class VocabSelectionDialog(wx.Dialog):
         control_sizer.Add(self.band_choice, 0, wx.RIGHT, 10)
         control_sizer.Add(wx.StaticText(control_panel, label="Content:"), 0, wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, 5)
         control_sizer.Add(self.type_choice, 0, wx.RIGHT, 10)
+
+        # Search box, filters every band as you type
+        self.search_ctrl = wx.SearchCtrl(control_panel, style=wx.TE_PROCESS_ENTER)
+        self.search_ctrl.SetDescriptiveText("Hanzi, pinyin, zhuyin or meaning")
+        self.search_ctrl.ShowCancelButton(True)
+        self.search_ctrl.Bind(wx.EVT_TEXT, self.on_search)
+        self.search_ctrl.Bind(wx.EVT_SEARCHCTRL_CANCEL_BTN, self.on_search_cancel)
+        control_sizer.AddStretchSpacer(1)
+        control_sizer.Add(self.search_ctrl, 1, wx.ALIGN_CENTER_VERTICAL)
         control_panel.SetSizer(control_sizer)
         main_sizer.Add(control_panel, 0, wx.EXPAND | wx.ALL, 5)
 
         # Grid for displaying vocabulary :^)
+        reading_col = PINYIN if self.config['readings'] == 'pinyin' else ZHUYIN
+        self.table = VocabTable(get_lexicon(), reading_col)
         self.grid = wx.grid.Grid(self, -1)
-        self.grid.CreateGrid(0, 5)
+        self.grid.SetTable(self.table, True)
         self.grid.EnableEditing(False)
-        self.grid.SetColLabelValue(0, "")
-        self.grid.SetColLabelValue(1, "Simplified")
-        self.grid.SetColLabelValue(2, "Traditional")
-        self.grid.SetColLabelValue(3, "Reading")
-        self.grid.SetColLabelValue(4, "Meaning")
+
+        # One shared checkbox attr for the whole column instead of a
+        # renderer/editor pair per row
+        check_attr = wx.grid.GridCellAttr()
+        check_attr.SetRenderer(wx.grid.GridCellBoolRenderer())
+        check_attr.SetEditor(wx.grid.GridCellBoolEditor())
+        self.grid.SetColAttr(0, check_attr)
 
         # Set column sizes
         self.grid.SetColSize(0, 30)
@@ -69,14 +169,17 @@ class VocabSelectionDialog(wx.Dialog):
         button_sizer = wx.BoxSizer(wx.HORIZONTAL)
         self.select_all_btn = wx.Button(self, label="Select All")
         self.deselect_all_btn = wx.Button(self, label="Deselect All")
+        self.save_set_btn = wx.Button(self, label="Save as Set...")
         ok_button = wx.Button(self, wx.ID_OK, "Start Study")
         cancel_button = wx.Button(self, wx.ID_CANCEL, "Cancel")
 
         self.select_all_btn.Bind(wx.EVT_BUTTON, self.on_select_all)
         self.deselect_all_btn.Bind(wx.EVT_BUTTON, self.on_deselect_all)
+        self.save_set_btn.Bind(wx.EVT_BUTTON, self.on_save_set)
 
         button_sizer.Add(self.select_all_btn, 0, wx.ALL, 5)
         button_sizer.Add(self.deselect_all_btn, 0, wx.ALL, 5)
+        button_sizer.Add(self.save_set_btn, 0, wx.ALL, 5)
         button_sizer.AddStretchSpacer(1)
         button_sizer.Add(ok_button, 0, wx.ALL, 5)
         button_sizer.Add(cancel_button, 0, wx.ALL, 5)
@@ -87,100 +190,76 @@ class VocabSelectionDialog(wx.Dialog):
         self.SetClientSize(wx.Size(750, 450)) 
         self.CenterOnScreen()
 
-    def load_config(self):
-        config_path = 'res/config.txt'
-        try:
-            with open(config_path, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line.startswith('#') or not line:
-                        continue
-                    if '=' in line:
-                        key, value = line.split('=', 1)
-                        key = key.strip().lower()
-                        value = value.strip().strip('"\'')
-                        if key in self.config:
-                            self.config[key] = value.lower()
-        except Exception as e:
-            print(f"Error loading config in VocabSelectionDialog: {e}, using defaults")
-
     def load_data_for_display(self):
-        current_band = int(self.band_choice.GetStringSelection())
         current_content_type = 'char' if self.type_choice.GetSelection() == 0 else 'vocab'
-        filename = os.path.join('res', f'band{current_band}_{current_content_type}.csv')
-
-        self.data = []
-        try:
-            with open(filename, newline='', encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                for row in reader:
-                    self.data.append(row)
-            self.populate_grid()
-        except FileNotFoundError:
-            wx.MessageBox(f"Data file '{filename}' not found!", "Error", wx.OK | wx.ICON_ERROR)
-            self.data = []
-            self.populate_grid()
-
-    def populate_grid(self):
-        if self.grid.GetNumberRows() > 0:
-            self.grid.DeleteRows(0, self.grid.GetNumberRows())
-
-        self.grid.AppendRows(len(self.data))
-        self.checkbox_states = [False] * len(self.data)
-
-        char_col = 0 if self.config['characters'] == 'simplified' else 1
-        reading_col = 2 if self.config['readings'] == 'pinyin' else 3
-
-        for i, row_data in enumerate(self.data):
-            self.grid.SetCellRenderer(i, 0, wx.grid.GridCellBoolRenderer())
-            self.grid.SetCellEditor(i, 0, wx.grid.GridCellBoolEditor())
-            self.grid.SetCellValue(i, 0, "1" if self.checkbox_states[i] else "0")
-
-            self.grid.SetCellValue(i, 1, row_data[0])
-            self.grid.SetCellValue(i, 2, row_data[1])
-            self.grid.SetCellValue(i, 3, row_data[reading_col])
-            self.grid.SetCellValue(i, 4, row_data[4])
-
-        self.grid.AutoSizeColumns()
-        self.grid.Refresh()
+        lexicon = get_lexicon()
+
+        query = self.search_ctrl.GetValue().strip()
+        self.band_choice.Enable(not query)
+        self.select_all_btn.SetLabel("Select All Matches" if query else "Select All")
+        if query:
+            self.table.set_ids(get_search_index(current_content_type).search(query))
+            return
+
+        # pools come back merged and deduped from the lexicon, nothing reparsed
+        current_band = self.band_values[self.band_choice.GetSelection()]
+        if not lexicon.has(current_band, current_content_type):
+            wx.MessageBox(f"No {current_content_type} data for {band_name(current_band)}!", "Error", wx.OK | wx.ICON_ERROR)
+        key = (current_band, current_content_type)
+        ids = lexicon.ids(*key)
+        shown = self.shown.get(key)
+        if shown is None:
+            shown = self.shown[key] = Bitset(len(lexicon.entries), ids)
+        self.table.set_ids(ids, shown)
+
+    def apply_change(self, change):
+        # csv edited while the dialog's open: ticks on rows that went go too
+        selected = self.table.selected
+        selected.difference_update(change.removed)
+        if selected.size < len(get_lexicon().entries):
+            selected.resize(len(get_lexicon().entries))
+        self.shown = {}
+        self.load_data_for_display()
 
     def on_selection_change(self, event):
         self.load_data_for_display()
 
+    def on_search(self, event):
+        self.load_data_for_display()
+
+    def on_search_cancel(self, event):
+        self.search_ctrl.ChangeValue("")
+        self.load_data_for_display()
+
     def on_grid_cell_click(self, event):
         col = event.GetCol()
         row = event.GetRow()
 
         if col == 0:
-            self.checkbox_states[row] = not self.checkbox_states[row]
-            self.grid.SetCellValue(row, 0, "1" if self.checkbox_states[row] else "0")
-            self.grid.Refresh()
+            self.table.toggle(row)
+            self.grid.RefreshBlock(row, 0, row, 0)
         event.Skip()
 
     def on_select_all(self, event):
-        for i in range(len(self.checkbox_states)):
-            self.checkbox_states[i] = True
-            self.grid.SetCellValue(i, 0, "1")
-        self.grid.Refresh()
+        self.table.select_shown(True)
+        self.grid.ForceRefresh()
 
     def on_deselect_all(self, event):
-        for i in range(len(self.checkbox_states)):
-            self.checkbox_states[i] = False
-            self.grid.SetCellValue(i, 0, "0")
-        self.grid.Refresh()
+        self.table.select_shown(False)
+        self.grid.ForceRefresh()
+
+    def on_save_set(self, event):
+        # Keep the ticked entries under a name for next time (Study Sets)
+        if not self.table.selected:
+            wx.MessageBox("Nothing selected to save.", "Info", wx.OK | wx.ICON_INFORMATION)
+            return
+        dlg = wx.TextEntryDialog(self, "Name for this study set:", "Save as Set")
+        if dlg.ShowModal() == wx.ID_OK and dlg.GetValue().strip():
+            from res.study_sets import StudySets
+            StudySets().put(dlg.GetValue(), self.table.selected.copy())
+        dlg.Destroy()
 
     def GetSelectedVocab(self):
-        selected = []
-        char_col = 0 if self.config['characters'] == 'simplified' else 1
-        reading_col = 2 if self.config['readings'] == 'pinyin' else 3
-
-        for i, is_selected in enumerate(self.checkbox_states):
-            if is_selected:
-                row_data = self.data[i]
-                selected.append((
-                    row_data[char_col],
-                    row_data[reading_col],
-                    row_data[5],
-                    row_data[4]
-                ))
-        return selected
+        # Full lexicon rows, the panel decides which columns to show
+        lexicon = get_lexicon()
+        return [lexicon.entry(entry_id) for entry_id in self.table.selected]
@@ -0,0 +1,139 @@
+import base64
+import hashlib
+import os
+import struct
+
+# Just enough RFC 6455 for the quiz server and the load generator: text
+# frames, ping/pong and close, no extensions.
+
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OP_CONT = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+MAX_MESSAGE = 1 << 20
+
+
+class ConnectionClosed(Exception):
+    pass
+
+
+def accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + GUID).encode('ascii')).digest()).decode('ascii')
+
+
+def new_key():
+    return base64.b64encode(os.urandom(16)).decode('ascii')
+
+
+def _mask(data, key):
+    # xor the whole payload as one big int instead of byte by byte
+    n = len(data)
+    if not n:
+        return data
+    repeated = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(data, 'little') ^ int.from_bytes(repeated, 'little')).to_bytes(n, 'little')
+
+
+def encode_frame(opcode, payload, mask=False):
+    header = bytearray([0x80 | opcode])
+    n = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if n < 126:
+        header.append(mask_bit | n)
+    elif n < 65536:
+        header.append(mask_bit | 126)
+        header += struct.pack('!H', n)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack('!Q', n)
+    if mask:
+        key = os.urandom(4)
+        return bytes(header) + key + _mask(payload, key)
+    return bytes(header) + payload
+
+
+class WebSocket:
+    # Wraps an asyncio reader/writer pair once the handshake is done.
+    # Clients must mask what they send, servers must not.
+    def __init__(self, reader, writer, client=False):
+        self.reader = reader
+        self.writer = writer
+        self.client = client
+        self.closed = False
+
+    async def _read_frame(self):
+        try:
+            head = await self.reader.readexactly(2)
+            fin = head[0] & 0x80
+            opcode = head[0] & 0x0F
+            n = head[1] & 0x7F
+            if n == 126:
+                (n,) = struct.unpack('!H', await self.reader.readexactly(2))
+            elif n == 127:
+                (n,) = struct.unpack('!Q', await self.reader.readexactly(8))
+            if n > MAX_MESSAGE:
+                raise ConnectionClosed("frame too large")
+            key = await self.reader.readexactly(4) if head[1] & 0x80 else None
+            payload = await self.reader.readexactly(n)
+        except (ConnectionError, EOFError) as e:
+            self.closed = True
+            raise ConnectionClosed(str(e))
+        if key:
+            payload = _mask(payload, key)
+        return fin, opcode, payload
+
+    async def recv(self):
+        # Returns the next text message, answering pings on the way
+        parts = []
+        while True:
+            fin, opcode, payload = await self._read_frame()
+            if opcode == OP_PING:
+                await self._send(OP_PONG, payload)
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                if not self.closed:
+                    await self.close()
+                raise ConnectionClosed("closed by peer")
+            parts.append(payload)
+            if fin:
+                return b''.join(parts).decode('utf-8')
+
+    async def _send(self, opcode, payload):
+        if self.closed:
+            raise ConnectionClosed("already closed")
+        self.writer.write(encode_frame(opcode, payload, mask=self.client))
+        await self.writer.drain()
+
+    async def send(self, text):
+        await self._send(OP_TEXT, text.encode('utf-8'))
+
+    async def close(self, code=1000):
+        if self.closed:
+            return
+        try:
+            await self._send(OP_CLOSE, struct.pack('!H', code))
+        except (ConnectionError, ConnectionClosed):
+            pass
+        self.closed = True
+        self.writer.close()
+
+
+async def connect(host, port, path='/ws'):
+    import asyncio
+    reader, writer = await asyncio.open_connection(host, port)
+    key = new_key()
+    writer.write((f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\n"
+                  f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode('ascii'))
+    await writer.drain()
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+    if ' 101 ' not in head.split('\r\n', 1)[0] or accept_key(key) not in head:
+        writer.close()
+        raise ConnectionClosed(f"handshake failed: {head.splitlines()[0] if head else 'no reply'}")
+    return WebSocket(reader, writer, client=True)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+# nothing a test does should end up in res/
+os.environ.setdefault('HSK_USER_DIR', os.path.join(REPO_ROOT, 'build', 'test-user'))
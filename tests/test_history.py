@@ -0,0 +1,109 @@
+import random
+import sqlite3
+import pytest
+from res.history import History, BATCH_SIZE
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = History(str(tmp_path / 'history.db'))
+    yield history
+    history.close()
+
+
+def stats(history, limit=1000):
+    got = []
+    history.request_stats(got.append, limit)
+    history.flush()
+    return got[0]
+
+
+def tables(history):
+    conn = sqlite3.connect(history.path)
+    try:
+        return {table: sorted(conn.execute(f"SELECT * FROM {table}").fetchall())
+                for table in ('entry_stats', 'band_stats', 'confusions')}
+    finally:
+        conn.close()
+
+
+def record_many(history, count, seed=1):
+    # -> the events, as recorded
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        entry_id = rng.randrange(40)
+        band, content_type = (entry_id % 3 + 1, 'char' if entry_id % 2 else 'vocab')
+        answer = f'a{entry_id}'
+        wrong_picks = [f'a{rng.randrange(40)}' for _ in range(rng.choice((0, 0, 0, 1, 2)))]
+        seconds = rng.choice((0.5, 1.25, 3.0, 8.5))
+        events.append((entry_id, band, content_type, answer, wrong_picks, seconds, 1000.0 + i))
+        history.record(entry_id, band, content_type, 'random', answer, wrong_picks, seconds, ts=1000.0 + i)
+    history.flush()
+    return events
+
+
+def test_aggregates_follow_the_log(history):
+    # enough for several batches, so the same rows get upserted more than once
+    events = record_many(history, BATCH_SIZE * 2 + 123)
+    entries = {}
+    bands = {}
+    confusions = {}
+    for entry_id, band, content_type, answer, wrong_picks, seconds, ts in events:
+        seen, correct, wrong, total, last = entries.get(entry_id, (0, 0, 0, 0.0, 0.0))
+        entries[entry_id] = (seen + 1, correct + (not wrong_picks), wrong + len(wrong_picks), total + seconds,
+                             max(last, ts))
+        seen, correct, wrong, total = bands.get((band, content_type), (0, 0, 0, 0.0))
+        bands[(band, content_type)] = (seen + 1, correct + (not wrong_picks), wrong + len(wrong_picks),
+                                       total + seconds)
+        for picked in wrong_picks:
+            confusions[(answer, picked)] = confusions.get((answer, picked), 0) + 1
+
+    got = tables(history)
+    assert got['entry_stats'] == sorted(
+        (entry_id, entry_id % 3 + 1, 'char' if entry_id % 2 else 'vocab') + stat for entry_id, stat in entries.items())
+    assert got['band_stats'] == sorted(key + stat for key, stat in bands.items())
+    assert got['confusions'] == sorted(pair + (n,) for pair, n in confusions.items())
+
+    before = stats(history)
+    assert before['total'] == len(events)
+    history.rebuild()
+    assert tables(history) == got
+    assert stats(history) == before
+
+
+def test_stats(history):
+    history.record(1, 1, 'char', 'random', 'ài', [], 2.0)
+    history.record(1, 1, 'char', 'random', 'ài', ['bā'], 4.0)
+    history.record(2, 1, 'char', 'random', 'bā', ['ài', 'ài'], 6.0)
+    history.record(2, 1, 'char', 'random', 'bā', ['ài'], 6.0)
+    history.record(3, 2, 'vocab', 'srs', 'hǎo', [], 1.0)
+    got = stats(history)
+    assert got['total'] == 5
+    assert got['bands'] == [(1, 'char', 4, 1, 4, 18.0), (2, 'vocab', 1, 1, 0, 1.0)]
+    # worst first, and only entries seen often enough
+    assert [row[0] for row in got['weakest']] == [2, 1]
+    assert got['confusions'] == [('bā', 'ài', 3), ('ài', 'bā', 1)]
+
+
+def test_entries_where(history):
+    history.record(1, 1, 'char', 'random', 'a', [], 1.0)
+    history.record(1, 1, 'char', 'random', 'a', [], 1.0)
+    history.record(2, 1, 'char', 'random', 'b', ['x'], 1.0)
+    history.record(2, 1, 'char', 'random', 'b', [], 1.0)
+    history.record(3, 1, 'char', 'random', 'c', ['x', 'y'], 1.0)
+    assert sorted(history.entries_where('seen', 1)) == [1, 2, 3]
+    assert sorted(history.entries_where('seen', 2)) == [1, 2]
+    assert sorted(history.entries_where('seen', 3)) == []
+    assert sorted(history.entries_where('correct', 1)) == [1, 2]
+    assert sorted(history.entries_where('correct', 2)) == [1]
+    assert sorted(history.entries_where('wrong', 1)) == [2, 3]
+    assert sorted(history.entries_where('wrong', 2)) == [3]
+    assert sorted(history.entries_where('correct', 0)) == [1, 2, 3]
+    with pytest.raises(ValueError):
+        history.entries_where('seconds', 1)
+
+
+def test_empty(history):
+    assert stats(history) == {'total': 0, 'bands': [], 'weakest': [], 'confusions': []}
+    assert history.entries_where('seen', 1) == []
@@ -0,0 +1,172 @@
+import os
+import pytest
+from res.lexicon import Lexicon, MEANING, ENTRY_ID
+
+ROWS = [
+    ('爱', '愛', 'ài', 'ㄞˋ', 'to love', 'audio/ㄞˋ.wav'),
+    ('八', '八', 'bā', 'ㄅㄚ', 'eight', 'audio/ㄅㄚ.wav'),
+    ('白', '白', 'bái', 'ㄅㄞˊ', 'white', 'audio/ㄅㄞˊ.wav'),
+    ('百', '百', 'bǎi', 'ㄅㄞˇ', 'hundred', 'audio/ㄅㄞˇ.wav'),
+]
+
+
+class Data:
+    def __init__(self, directory):
+        self.directory = directory
+        self.mtime = 1_000_000_000 * 10**9
+
+    def write(self, name, rows):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.writelines(','.join(row) + '\n' for row in rows)
+        # two writes inside one mtime tick would look unchanged
+        self.mtime += 10**9
+        os.utime(path, ns=(self.mtime, self.mtime))
+
+    def remove(self, name):
+        os.remove(os.path.join(self.directory, name))
+
+
+@pytest.fixture
+def data(tmp_path):
+    directory = tmp_path / 'data'
+    directory.mkdir()
+    data = Data(str(directory))
+    data.write('band1_char.csv', ROWS)
+    return data
+
+
+def load(data):
+    return Lexicon(data_dir=data.directory, cache_path=os.path.join(data.directory, '..', 'lexicon.cache'))
+
+
+def ids(lexicon, band=1, content_type='char'):
+    return list(lexicon.ids(band, content_type))
+
+
+def words(lexicon, band=1, content_type='char'):
+    return [row[0] for row in lexicon.rows(band, content_type)]
+
+
+def test_nothing_changed(data):
+    lexicon = load(data)
+    assert not lexicon.refresh()
+    # touched but the same content
+    data.write('band1_char.csv', ROWS)
+    change = lexicon.refresh()
+    assert not change and len(change) == 0
+
+
+def test_update_keeps_the_id(data):
+    lexicon = load(data)
+    before = ids(lexicon)
+    rows = list(ROWS)
+    rows[2] = rows[2][:MEANING] + ('white, plain', rows[2][MEANING + 1])
+    data.write('band1_char.csv', rows)
+    change = lexicon.refresh()
+    assert list(change.updated) == [before[2]]
+    assert not change.added and not change.removed
+    assert change.files == ['band1_char.csv']
+    assert ids(lexicon) == before
+    assert lexicon.entry(before[2])[MEANING] == 'white, plain'
+
+
+def test_insert_and_delete(data):
+    lexicon = load(data)
+    before = ids(lexicon)
+    rows = list(ROWS)
+    del rows[1]
+    rows.insert(2, ('半', '半', 'bàn', 'ㄅㄢˋ', 'half', 'audio/ㄅㄢˋ.wav'))
+    data.write('band1_char.csv', rows)
+    change = lexicon.refresh()
+    assert list(change.removed) == [before[1]]
+    assert len(change.added) == 1 and not change.updated
+    new_id = change.added[0]
+    assert new_id not in before
+    assert ids(lexicon) == [before[0], before[2], new_id, before[3]]
+    assert words(lexicon) == ['爱', '白', '半', '百']
+    assert lexicon.entry(before[1]) is None
+    assert lexicon.entry(new_id)[ENTRY_ID] == new_id
+
+
+def test_moved_rows_keep_their_ids(data):
+    lexicon = load(data)
+    before = ids(lexicon)
+    data.write('band1_char.csv', [ROWS[3], ROWS[1], ROWS[2], ROWS[0]])
+    change = lexicon.refresh()
+    assert not change
+    assert ids(lexicon) == [before[3], before[1], before[2], before[0]]
+
+
+def test_deleted_row_gets_its_id_back(data):
+    lexicon = load(data)
+    before = ids(lexicon)
+    data.write('band1_char.csv', ROWS[:1] + ROWS[2:])
+    assert list(lexicon.refresh().removed) == [before[1]]
+    data.write('band1_char.csv', ROWS)
+    change = lexicon.refresh()
+    assert list(change.added) == [before[1]]
+    assert ids(lexicon) == before
+
+
+def test_duplicate_rows_pair_in_order(data):
+    # same hanzi + reading twice: the first of them stays the first
+    twice = ROWS[:2] + [ROWS[1][:MEANING] + ('eight (again)', ROWS[1][MEANING + 1])] + ROWS[2:]
+    data.write('band1_char.csv', twice)
+    lexicon = load(data)
+    before = ids(lexicon)
+    edited = list(twice)
+    edited[2] = edited[2][:MEANING] + ('8', edited[2][MEANING + 1])
+    data.write('band1_char.csv', edited)
+    change = lexicon.refresh()
+    assert list(change.updated) == [before[2]]
+    assert lexicon.entry(before[1])[MEANING] == 'eight'
+
+    # dropping the first of the two keeps the second's id
+    data.write('band1_char.csv', edited[:1] + edited[2:])
+    change = lexicon.refresh()
+    assert list(change.removed) == [before[1]] and not change.updated
+    assert ids(lexicon) == before[:1] + before[2:]
+
+
+def test_files_coming_and_going(data):
+    lexicon = load(data)
+    char_ids = ids(lexicon)
+    data.write('band2_vocab.csv', [('朋友', '朋友', 'péng you', 'ㄆㄥˊ ˙ㄧㄡ', 'friend', 'audio/péng you.wav')])
+    change = lexicon.refresh()
+    assert len(change.added) == 1 and change.files == ['band2_vocab.csv']
+    assert lexicon.has(2, 'vocab') and words(lexicon, 2, 'vocab') == ['朋友']
+    assert lexicon.location(change.added[0]) == (2, 'vocab')
+
+    data.remove('band1_char.csv')
+    change = lexicon.refresh()
+    assert sorted(change.removed) == sorted(char_ids)
+    assert not lexicon.has(1, 'char')
+    assert all(lexicon.entry(i) is None for i in char_ids)
+
+
+def test_ids_survive_a_restart(data):
+    lexicon = load(data)
+    rows = list(ROWS)
+    rows.insert(0, ('半', '半', 'bàn', 'ㄅㄢˋ', 'half', 'audio/ㄅㄢˋ.wav'))
+    data.write('band1_char.csv', rows)
+    lexicon.refresh()
+    lexicon.save()
+    expected = ids(lexicon)
+    assert ids(load(data)) == expected
+
+
+def test_edited_stretch_pairs_duplicates_first_come_first_served(data):
+    twice = ROWS[:2] + [ROWS[1][:MEANING] + ('8', ROWS[1][MEANING + 1])] + ROWS[2:]
+    data.write('band1_char.csv', twice)
+    lexicon = load(data)
+    before = ids(lexicon)
+    # drop the first 八 and edit the last row, so nothing after the edit is
+    # skipped: the 八 left over takes the first 八's id
+    rows = twice[:1] + twice[2:4] + [ROWS[3][:MEANING] + ('a hundred', ROWS[3][MEANING + 1])]
+    data.write('band1_char.csv', rows)
+    change = lexicon.refresh()
+    assert sorted(change.updated) == sorted([before[1], before[4]])
+    assert list(change.removed) == [before[2]]
+    assert ids(lexicon) == [before[0], before[1], before[3], before[4]]
+    assert lexicon.entry(before[1])[MEANING] == '8'
@@ -0,0 +1,146 @@
+import json
+import pytest
+from res.scheduler import Scheduler, answer_quality, card_key, migrate_cards, DAY, RELEARN_DELAY, MIN_EASE
+
+NOW = 1_800_000_000.0
+
+
+def row(entry_id, meaning='m', audio='audio/x.wav'):
+    return ('字', '字', 'zì', 'ㄗˋ', meaning, audio, entry_id)
+
+
+def deck(n):
+    return [row(i, meaning=f'm{i}', audio=f'audio/{i}.wav') for i in range(n)]
+
+
+@pytest.fixture
+def scheduler():
+    return Scheduler(path=None)
+
+
+def test_answer_quality():
+    assert answer_quality(0, 2) == 5
+    assert answer_quality(0, 5) == 4
+    assert answer_quality(0, 12) == 3
+    assert answer_quality(0, 2, partial=True) == 3
+    assert answer_quality(1, 2) == 2
+    assert answer_quality(3, 2) == 1
+
+
+def test_sm2_intervals(scheduler):
+    card = row(1)
+    intervals = [scheduler.review(card, 0, 2, now=NOW)['interval'] for _ in range(4)]
+    assert intervals[:3] == [1, 6, round(6 * 2.7)]
+    assert scheduler.cards[card_key(card)]['due'] == NOW + intervals[-1] * DAY
+
+    lapsed = scheduler.review(card, 2, 2, now=NOW)
+    assert lapsed['reps'] == 0 and lapsed['lapses'] == 1 and lapsed['interval'] == 0
+    assert lapsed['due'] == NOW + RELEARN_DELAY
+    for _ in range(20):
+        scheduler.review(card, 3, 2, now=NOW)
+    assert scheduler.cards[card_key(card)]['ease'] == MIN_EASE
+
+
+def test_cards_are_per_entry(scheduler):
+    # same audio and meaning, different entries (the char and vocab row of a word)
+    char, vocab = row(1), row(2)
+    scheduler.review(char, 0, 2, now=NOW)
+    assert card_key(vocab) not in scheduler.cards
+
+
+def test_unseen_in_deck_order_then_by_due(scheduler):
+    rows = deck(4)
+    scheduler.set_deck(rows)
+    assert scheduler.next() is rows[0]
+    scheduler.review(rows[0], 0, 2, now=NOW)          # a day away
+    assert scheduler.next() is rows[1]
+    scheduler.review(rows[1], 2, 2, now=NOW)          # back in a minute
+    assert scheduler.next() is rows[2]
+    scheduler.review(rows[2], 0, 2, now=NOW)
+    assert scheduler.next() is rows[3]
+    scheduler.review(rows[3], 0, 2, now=NOW)
+    # all seen: the relearn one is due first, then the rest by due time
+    assert scheduler.next() is rows[1]
+
+
+def test_never_the_same_card_twice_in_a_row(scheduler):
+    rows = deck(2)
+    scheduler.set_deck(rows)
+    first = scheduler.next()
+    scheduler.review(first, 2, 2, now=0)        # due long ago, still goes second
+    assert scheduler.next() is not first
+
+
+def test_unanswered_card_goes_back(scheduler):
+    rows = deck(3)
+    scheduler.set_deck(rows)
+    assert scheduler.next() is rows[0]
+    # skipped without an answer: still due, comes back after the next one
+    assert scheduler.next() is rows[1]
+    assert scheduler.next() is rows[0]
+
+
+def test_removed_and_added_rows(scheduler):
+    rows = deck(3)
+    scheduler.set_deck(rows)
+    rows[0] = None
+    rows.append(row(7))
+    scheduler.add(3)
+    seen = []
+    for _ in range(3):
+        seen.append(scheduler.next())
+        scheduler.review(seen[-1], 0, 2, now=NOW)
+    assert [r[6] for r in seen] == [1, 2, 7]
+
+
+def test_only_usable_positions(scheduler):
+    rows = deck(4)
+    scheduler.set_deck(rows)
+    usable = {1, 3}
+    assert {scheduler.next(usable)[6] for _ in range(4)} == {1, 3}
+    # another set of positions brings the parked ones back
+    assert scheduler.next(None)[6] in (0, 2)
+
+
+def test_state_round_trip(tmp_path):
+    path = str(tmp_path / 'srs.json')
+    scheduler = Scheduler(path)
+    rows = deck(3)
+    scheduler.set_deck(rows)
+    scheduler.review(rows[0], 0, 2, now=NOW)
+    scheduler.review(rows[1], 1, 2, now=NOW)
+    scheduler.save()
+    loaded = Scheduler(path)
+    assert loaded.cards == scheduler.cards
+    loaded.set_deck(rows)
+    # reviewed cards are due later than the unseen one
+    assert loaded.next() is rows[2]
+
+
+def test_old_state_files_are_migrated(tmp_path):
+    class Lexicon:
+        entries = [row(0, 'to love', 'audio/ai.wav'), None, row(2, 'to love', 'audio/ai.wav'),
+                   row(3, 'eight', 'audio/ba.wav')]
+
+    card = {'ease': 2.0, 'interval': 6, 'reps': 2, 'lapses': 0, 'due': NOW}
+    old = {'audio/ai.wav|to love': card, 'audio/gone.wav|gone': dict(card, reps=9), '3': dict(card, reps=1)}
+    migrated = migrate_cards(old, Lexicon())
+    # both rows the old key matched get it, the gone one is dropped, new keys stay
+    assert migrated == {'0': card, '2': card, '3': dict(card, reps=1)}
+    assert migrated['0'] is not migrated['2']
+    assert migrate_cards(migrated, Lexicon()) is migrated
+
+    path = tmp_path / 'srs.json'
+    path.write_text(json.dumps({'3': card}))
+    assert Scheduler(str(path)).cards == {'3': card}
+
+
+def test_rows_added_once_the_heap_is_built(scheduler):
+    rows = deck(2)
+    scheduler.set_deck(rows)
+    scheduler.review(scheduler.next(), 0, 2, now=NOW)
+    rows.append(row(9))
+    scheduler.add(2)
+    assert scheduler.next() is rows[1]
+    scheduler.review(rows[1], 0, 2, now=NOW)
+    assert scheduler.next() is rows[2]
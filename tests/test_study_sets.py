@@ -0,0 +1,145 @@
+import pytest
+from res.bitset import Bitset
+from res.study_sets import StudySets, ExpressionError
+
+
+class FakeLexicon:
+    # 20 entries: band 1 is 0-9, band 2 is 5-14 (overlapping), band 3 is 15-19
+    entries = [None] * 20
+    lists = {1: range(0, 10), 2: range(5, 15), 3: range(15, 20)}
+
+    def ids(self, band, content_type):
+        if isinstance(band, tuple):
+            return sorted({i for b in range(band[0], band[1] + 1) for i in self.lists.get(b, ())})
+        return list(self.lists.get(band, ()))
+
+
+class FakeHistory:
+    def entries_where(self, what, count):
+        return {'seen': [0, 1, 2, 6, 16], 'correct': [1, 6], 'wrong': [2]}[what] if count >= 1 else []
+
+
+@pytest.fixture
+def sets(tmp_path):
+    return StudySets(str(tmp_path / 'sets.json'), lexicon=FakeLexicon(), history=FakeHistory())
+
+
+def ids(bitset):
+    return list(bitset)
+
+
+def test_bitset_basics():
+    b = Bitset(20, [1, 3, 19])
+    assert ids(b) == [1, 3, 19] and len(b) == 3 and b
+    assert 3 in b and 2 not in b and 25 not in b and -1 not in b
+    b.toggle(3)
+    b.discard(19)
+    b.add(0)
+    assert ids(b) == [0, 1]
+    b.clear()
+    assert not b and len(b) == 0
+
+
+def test_bitset_algebra():
+    a = Bitset(10, [1, 2, 3])
+    b = Bitset(20, [3, 4, 15])
+    assert ids(a | b) == [1, 2, 3, 4, 15]
+    assert ids(a & b) == [3]
+    assert ids(a - b) == [1, 2]
+    assert ids(b - a) == [4, 15]
+    # sets from a smaller lexicon grow to fit
+    assert (a | b).size == 20
+    assert a == Bitset(16, [1, 2, 3])
+
+
+def test_bitset_in_place():
+    selected = Bitset(10, [1, 2])
+    same = selected
+    selected |= Bitset(20, [2, 3, 15])
+    assert selected is same and ids(selected) == [1, 2, 3, 15] and selected.size == 20
+    selected -= Bitset(8, [1, 3])
+    assert selected is same and ids(selected) == [2, 15] and selected.size == 20
+    selected -= Bitset(30, [15, 29])
+    assert ids(selected) == [2] and selected.size == 20
+
+
+def test_bitset_resize_drops_ids_past_the_end():
+    b = Bitset(20, [2, 9, 10, 19])
+    b.resize(10)
+    assert ids(b) == [2, 9]
+    b.resize(30)
+    assert ids(b) == [2, 9]
+
+
+def test_terms(sets):
+    assert ids(sets.evaluate('band1:char')) == list(range(10))
+    assert ids(sets.evaluate('bands1-2:vocab')) == list(range(15))
+    assert ids(sets.evaluate('correct>=1')) == [1, 6]
+
+
+def test_operators(sets):
+    assert ids(sets.evaluate('band1:char | band3:char')) == list(range(10)) + list(range(15, 20))
+    assert ids(sets.evaluate('band1:char + band3:char')) == ids(sets.evaluate('band1:char | band3:char'))
+    assert ids(sets.evaluate('band1:char & band2:char')) == list(range(5, 10))
+    assert ids(sets.evaluate('band2:char - seen>=1')) == [5, 7, 8, 9, 10, 11, 12, 13, 14]
+
+
+def test_left_to_right_without_precedence(sets):
+    # no operator binds tighter than another, parentheses group
+    assert ids(sets.evaluate('band1:char | band3:char & seen>=1')) == [0, 1, 2, 6, 16]
+    assert ids(sets.evaluate('band1:char | (band3:char & seen>=1)')) == list(range(10)) + [16]
+    assert ids(sets.evaluate('band2:char - band1:char - band3:char')) == list(range(10, 15))
+    assert ids(sets.evaluate('band2:char - (band1:char - seen>=1)')) == [6] + list(range(10, 15))
+
+
+def test_saved_sets_and_quoted_names(sets):
+    assert sets.put('my words', sets.evaluate('seen>=1 - correct>=1'), 'seen>=1 - correct>=1')
+    assert ids(sets.evaluate('"my words" & band1:char')) == [0, 2]
+    reloaded = StudySets(sets.path, lexicon=FakeLexicon())
+    assert ids(reloaded.get('my words')) == [0, 2, 16]
+    assert reloaded.info('my words')[:2] == ('seen>=1 - correct>=1', 3)
+
+
+@pytest.mark.parametrize('expression, message', [
+    ('', 'empty'),
+    ('band1:char |', 'ends too early'),
+    ('(band1:char | band3:char', 'missing )'),
+    ('band1:char band3:char', 'unexpected'),
+    ('band1:char)', 'unexpected'),
+    ('nonsense', 'no study set called'),
+    ('bandx:char', 'unknown band'),
+])
+def test_bad_expressions(sets, expression, message):
+    with pytest.raises(ExpressionError, match=message.replace(')', r'\)')):
+        sets.evaluate(expression)
+
+
+def test_history_terms_need_history(tmp_path):
+    sets = StudySets(str(tmp_path / 'sets.json'), lexicon=FakeLexicon())
+    with pytest.raises(ExpressionError, match='answer history'):
+        sets.evaluate('seen>=1')
+
+
+def test_history_looked_up_without_waiting(tmp_path):
+    from res.history import History
+    history = History(str(tmp_path / 'history.db'))
+    try:
+        for entry_id, wrong_picks in ((1, []), (6, []), (6, ['x']), (16, ['y'])):
+            history.record(entry_id, 1, 'char', 'random', 'a', wrong_picks, 1.0)
+        sets = StudySets(str(tmp_path / 'sets.json'), lexicon=FakeLexicon(), history=history)
+        expression = '(seen>=2 | correct>=1) - wrong>=1'
+        results = []
+        sets.request_history(expression, results.append)
+        history.flush()
+        found, = results
+        assert found == {('seen', 2): [6], ('correct', 1): [1, 6], ('wrong', 1): [6, 16]}
+        assert ids(sets.evaluate(expression, found)) == [1]
+        assert ids(sets.evaluate(expression)) == [1]     # the blocking way, for the CLI
+    finally:
+        history.close()
+
+
+def test_nothing_to_look_up(sets):
+    results = []
+    sets.request_history('band1:char - band2:char', results.append)
+    assert results == [{}]
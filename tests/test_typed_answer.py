@@ -0,0 +1,80 @@
+import pytest
+from res.typed_answer import (reading_forms, check, progress, edit_distance, max_typos,
+                              EXACT, TONELESS, NEAR, WRONG_TONE, WRONG,
+                              EMPTY, ON_TRACK, OFF_TRACK, COMPLETE)
+
+NI_HAO = [reading_forms('nǐ hǎo', 'ㄋㄧˇ ㄏㄠˇ')]
+PENG_YOU = [reading_forms('péng you', 'ㄆㄥˊ ˙ㄧㄡ')]
+
+
+@pytest.mark.parametrize('text, verdict', [
+    ('nǐ hǎo', EXACT),
+    ('ni3 hao3', EXACT),
+    ('ni3hao3', EXACT),
+    ('  NI3 HAO3 ', EXACT),
+    ('nihao', TONELESS),
+    ('nǐhao', TONELESS),
+    ('ni2 hao3', WRONG_TONE),
+    ('ㄋㄧˇㄏㄠˇ', EXACT),
+    ('ㄋㄧㄏㄠ', TONELESS),      # no marks reads as all first tone
+    ('ㄋㄧˊㄏㄠˇ', WRONG_TONE),
+    ('hao3', WRONG),
+    ('', WRONG),
+])
+def test_tones(text, verdict):
+    assert check(text, NI_HAO)[0] == verdict
+
+
+@pytest.mark.parametrize('text, verdict', [
+    ('peng2you', EXACT),        # neutral tone needn't be typed
+    ('peng2you5', EXACT),
+    ('peng2you3', WRONG_TONE),
+    ('pengyou', TONELESS),
+    ('pengyuo', NEAR),          # swapped neighbours are one typo
+    ('pengyoo', NEAR),
+    ('pongyuo', WRONG),         # two typos is too many for 7 letters
+])
+def test_neutral_tone_and_typos(text, verdict):
+    assert check(text, PENG_YOU)[0] == verdict
+
+
+@pytest.mark.parametrize('text', ['lv4', 'lu:4', 'lü4'])
+def test_u_umlaut_spellings(text):
+    assert check(text, [reading_forms('lǜ', 'ㄌㄩˋ')])[0] == EXACT
+
+
+def test_short_readings_allow_no_typos():
+    assert check('lu4', [reading_forms('lǜ', 'ㄌㄩˋ')])[0] == WRONG
+
+
+def test_best_matching_reading_wins():
+    candidates = [reading_forms('háng', 'ㄏㄤˊ'), reading_forms('xíng', 'ㄒㄧㄥˊ')]
+    verdict, forms = check('xing2', candidates)
+    assert verdict == EXACT
+    assert forms.readings == ('xíng', 'ㄒㄧㄥˊ')
+    assert check('nope', candidates) == (WRONG, None)
+
+
+@pytest.mark.parametrize('text, state', [
+    ('', EMPTY),
+    ('ni3', ON_TRACK),
+    ('nih', ON_TRACK),
+    ('ni2', OFF_TRACK),
+    ('ha', OFF_TRACK),
+    ('ni3hao3', COMPLETE),
+    ('nihao', ON_TRACK),
+])
+def test_progress(text, state):
+    assert progress(text, NI_HAO) == state
+
+
+def test_edit_distance():
+    assert edit_distance('zhongguo', 'zhongguo', 2) == 0
+    assert edit_distance('zhongguo', 'zhonggou', 2) == 1
+    assert edit_distance('zhongguo', 'zhongguoo', 2) == 1
+    assert edit_distance('abc', 'xyz', 1) == 2     # gives up past the limit
+    assert edit_distance('a', 'abcd', 1) == 2
+
+
+def test_max_typos():
+    assert [max_typos(n) for n in (3, 4, 7, 8)] == [0, 1, 1, 2]